@@ -295,7 +295,9 @@ export const createCustomer = async (req, res) => {
       const validFields = [
         'name', 'phone', 'gender', 'source', 'purpose', 'department', 'metadata', 'createdBy', 'updatedBy',
         'serialNumber', 'totalSpent', 'orderCount', 'type', 'referredTo', 'referredById',
-        'schoolId', 'ownerId', 'pipelineStageId', 'createdAt', 'updatedAt', 'deletedAt', 'userId', 'branchId'
+        'schoolId', 'ownerId', 'pipelineStageId', 'createdAt', 'updatedAt', 'deletedAt', 'userId', 'branchId',
+        // Importers send a stable uuid so a re-run finds (or collides with) the customer it created before
+        'uuid'
       ];
       const filteredCustomerData = {};
       for (const key of Object.keys(customerData)) {
@@ -404,6 +406,9 @@ export const createCustomer = async (req, res) => {
         event: convertBigInts(event)
       });
     } catch (error) {
+      if (error?.code === 'P2002') {
+        return res.status(409).json({ success: false, message: 'Customer with this uuid already exists' });
+      }
       return respondWithScopedError(res, error, 'Failed to create customer');
     }
 };
@@ -846,6 +846,7 @@ class StudentController {
         search = '',
         classId,
         sectionId,
+        parentId,
         status,
         gender,
         includeInactive,
@@ -877,6 +878,7 @@ class StudentController {
         search,
         classId,
         sectionId,
+        parentId,
         status,
         gender,
         includeInactive,
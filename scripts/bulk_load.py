@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Direct bulk-load output for the student importers (BULK_OUTPUT=sql|tsv).
+
+Instead of one POST /students per row, the API payloads built by
+import_students_from_sql.py / import_students_from_excel.py are turned into
+rows of the `users`, `parents` and `students` tables of prisma/schema.prisma
+and written out for a database bulk load:
+
+- sql: multi-row INSERT batches (BULK_ROWS_PER_INSERT rows each) in one
+  transaction, in MySQL or SQLite quoting (BULK_SQL_DIALECT)
+- tsv: one LOAD DATA-ready file per table plus load.sql with the
+  LOAD DATA LOCAL INFILE statements
+
+IDs are assigned here, starting at BULK_FIRST_USER_ID / BULK_FIRST_PARENT_ID
+/ BULK_FIRST_STUDENT_ID (set them above the current MAX(id) of each table),
+so students point at their user and their family's parent without a round
+trip. The rows are filled the way the student controller and
+ParentService.createParentWithUser fill them: role, status (ACTIVE with a
+class), address metadata, the default password hashed with bcrypt.
+
+`python3 scripts/bulk_load.py --check-sqlite students-bulk.sql` loads a
+generated SQL file into a SQLite stand-in of the three tables and checks
+counts, unique keys and foreign keys.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import uuid
+import datetime as dt
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import bcrypt
+except ImportError:  # only needed when BULK_PASSWORD_HASH is not set
+    bcrypt = None
+
+
+# Configuration
+BULK_OUTPUT = os.environ.get('BULK_OUTPUT', '').lower()
+BULK_OUTPUT_DIR = os.environ.get('BULK_OUTPUT_DIR', './scripts/bulk-load')
+BULK_SQL_DIALECT = os.environ.get('BULK_SQL_DIALECT', 'mysql').lower()
+BULK_ROWS_PER_INSERT = int(os.environ.get('BULK_ROWS_PER_INSERT', '1000'))
+BULK_FIRST_IDS = {
+    'users': int(os.environ.get('BULK_FIRST_USER_ID', '1')),
+    'parents': int(os.environ.get('BULK_FIRST_PARENT_ID', '1')),
+    'students': int(os.environ.get('BULK_FIRST_STUDENT_ID', '1')),
+}
+# The school's owner: createdByOwnerId of every user and createdBy of every row
+BULK_OWNER_ID = int(os.environ.get('BULK_OWNER_ID', '1'))
+BULK_ADMISSION_PREFIX = os.environ.get('BULK_ADMISSION_PREFIX', f"MIG{dt.date.today():%y}")
+# A bcrypt hash of the default password; hashed here with `bcrypt` when unset
+BULK_PASSWORD_HASH = os.environ.get('BULK_PASSWORD_HASH', '')
+DEFAULT_PASSWORD = 'password123'  # what the student controller gives new students and parents
+
+OUTPUT_FORMATS = ('sql', 'tsv')
+
+# Columns written per table, in load order (users before the rows that reference them)
+TABLE_COLUMNS = {
+    'users': [
+        'id', 'uuid', 'username', 'tazkiraNo', 'phone', 'password', 'salt', 'firstName', 'middleName',
+        'lastName', 'displayName', 'gender', 'birthDate', 'avatar', 'bio', 'role', 'status', 'timezone',
+        'locale', 'metadata', 'schoolId', 'createdByOwnerId', 'createdBy', 'createdAt', 'updatedAt',
+    ],
+    'parents': [
+        'id', 'uuid', 'userId', 'occupation', 'annualIncome', 'education', 'schoolId', 'createdBy',
+        'createdAt', 'updatedAt',
+    ],
+    'students': [
+        'id', 'uuid', 'userId', 'admissionNo', 'classId', 'parentId', 'admissionDate', 'bloodGroup',
+        'nationality', 'religion', 'caste', 'tazkiraNo', 'bankAccountNo', 'bankName', 'previousSchool',
+        'originAddress', 'originCity', 'originState', 'originProvince', 'originCountry', 'originPostalCode',
+        'currentAddress', 'currentCity', 'currentState', 'currentProvince', 'currentCountry',
+        'currentPostalCode', 'schoolId', 'createdBy', 'createdAt', 'updatedAt',
+    ],
+}
+# Student columns copied straight from the payload
+PAYLOAD_STUDENT_FIELDS = [column for column in TABLE_COLUMNS['students'] if column not in {
+    'id', 'uuid', 'userId', 'admissionNo', 'classId', 'parentId', 'admissionDate',
+    'schoolId', 'createdBy', 'createdAt', 'updatedAt'}]
+# Columns without a database default in the Prisma schema
+REQUIRED_COLUMNS = {
+    'users': {'uuid', 'username', 'firstName', 'lastName', 'role', 'status', 'timezone', 'locale',
+              'createdByOwnerId', 'createdAt', 'updatedAt'},
+    'parents': {'uuid', 'userId', 'schoolId', 'createdBy', 'createdAt', 'updatedAt'},
+    'students': {'uuid', 'userId', 'admissionNo', 'schoolId', 'createdBy', 'createdAt', 'updatedAt'},
+}
+UNIQUE_COLUMNS = {'users': ('uuid', 'username'), 'parents': ('uuid', 'userId'),
+                  'students': ('uuid', 'userId', 'admissionNo')}
+FOREIGN_KEYS = {'parents': {'userId': 'users'}, 'students': {'userId': 'users', 'parentId': 'parents'}}
+
+
+def log_print(message: str):
+    timestamp = dt.datetime.now(dt.timezone.utc).isoformat()
+    print(f"[{timestamp}] {message}")
+
+
+def password_hash() -> Tuple[str, str]:
+    """(hash, salt) of the default password; bcrypt keeps the salt in the first 29 characters."""
+    hashed = BULK_PASSWORD_HASH
+    if not hashed:
+        if bcrypt is None:
+            sys.exit("❌ Set BULK_PASSWORD_HASH to a bcrypt hash of the default password, "
+                     "or install bcrypt: pip install bcrypt")
+        hashed = bcrypt.hashpw(DEFAULT_PASSWORD.encode(), bcrypt.gensalt(10)).decode()
+    return hashed, hashed[:29]
+
+
+def to_datetime(value: Any) -> Optional[str]:
+    """'2024-01-31' / ISO strings -> 'YYYY-MM-DD HH:MM:SS' for DATETIME columns."""
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip().replace('T', ' ').rstrip('Z')
+    return text if len(text) > 10 else f"{text[:10]} 00:00:00"
+
+
+def address_metadata(user: Dict[str, Any]) -> Optional[str]:
+    """The user's address fields as the JSON the API stores in `metadata`."""
+    address = {key: user.get(field) for key, field in
+               (('street', 'address'), ('city', 'city'), ('state', 'state'),
+                ('country', 'country'), ('postalCode', 'postalCode'))
+               if user.get(field)}
+    return json.dumps({'address': address}) if address else None
+
+
+def clean(value: Any) -> Any:
+    """None for NaN/NA cells that reach a payload from pandas."""
+    try:
+        return None if value is None or value != value else value
+    except (TypeError, ValueError):
+        return value
+
+
+def build_tables(payloads: Sequence[Dict[str, Any]], roots: Sequence[int],
+                 first_ids: Optional[Dict[str, int]] = None) -> Tuple[Dict[str, List[tuple]], List[Dict[str, int]]]:
+    """Table rows for `payloads` and the IDs assigned to each payload.
+
+    `roots[i]` identifies payload i's family (the root position from
+    families.family_roots); the family's first payload creates the parent
+    and every sibling gets its `parentId`.
+    """
+    next_ids = dict(first_ids or BULK_FIRST_IDS)
+    now = dt.datetime.now(dt.timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    hashed, salt = password_hash()
+    tables: Dict[str, List[Dict[str, Any]]] = {table: [] for table in TABLE_COLUMNS}
+    ids: List[Dict[str, int]] = []
+    family_parent: Dict[int, int] = {}
+    usernames: set = set()
+
+    def take_id(table: str) -> int:
+        next_ids[table] += 1
+        return next_ids[table] - 1
+
+    def add_user(user: Dict[str, Any], role: str, status: str, school_id: int, student: bool) -> int:
+        user_id = take_id('users')
+        first_name = clean(user.get('firstName')) or ('Student' if student else 'Parent')
+        username = clean(user.get('username')) or f"{first_name.lower()}_{user_id}"
+        if username in usernames:
+            username = f"{username}_{user_id}"
+        usernames.add(username)
+        row = {
+            'id': user_id, 'uuid': str(uuid.uuid4()), 'username': username,
+            'tazkiraNo': clean(user.get('tazkiraNo')), 'phone': clean(user.get('phone')),
+            'password': hashed, 'salt': salt,
+            'firstName': first_name, 'middleName': clean(user.get('middleName')) if student else None,
+            'lastName': clean(user.get('lastName')) or ('User' if student else 'Guardian'),
+            'displayName': clean(user.get('displayName')), 'gender': clean(user.get('gender')),
+            'birthDate': to_datetime(user.get('dateOfBirth') if student else user.get('birthDate')),
+            'avatar': clean(user.get('avatar')), 'bio': clean(user.get('bio')) if student else None,
+            'role': role, 'status': status,
+            # Parents get the schema defaults, as ParentService does not pass these on
+            'timezone': (clean(user.get('timezone')) if student else None) or 'UTC',
+            'locale': (clean(user.get('locale')) if student else None) or 'en-US',
+            'metadata': address_metadata(user),
+            'schoolId': school_id, 'createdByOwnerId': BULK_OWNER_ID, 'createdBy': BULK_OWNER_ID,
+            'createdAt': now, 'updatedAt': now,
+        }
+        tables['users'].append(row)
+        return user_id
+
+    for position, payload in enumerate(payloads):
+        school_id = int(payload.get('schoolId') or 1)
+        root = int(roots[position])
+        parent_id = family_parent.get(root)
+        if parent_id is None and payload.get('parent') and payload['parent'].get('user'):
+            parent = payload['parent']
+            parent_user_id = add_user(parent['user'], 'PARENT', 'ACTIVE', school_id, student=False)
+            parent_id = take_id('parents')
+            tables['parents'].append({
+                'id': parent_id, 'uuid': str(uuid.uuid4()), 'userId': parent_user_id,
+                'occupation': clean(parent.get('occupation')),
+                'annualIncome': float(parent['annualIncome']) if clean(parent.get('annualIncome')) else None,
+                'education': clean(parent.get('education')),
+                'schoolId': school_id, 'createdBy': BULK_OWNER_ID, 'createdAt': now, 'updatedAt': now,
+            })
+            family_parent[root] = parent_id
+
+        class_id = clean(payload.get('classId'))
+        user_id = add_user(payload.get('user') or {}, 'STUDENT', 'ACTIVE' if class_id else 'INACTIVE',
+                           school_id, student=True)
+        student_id = take_id('students')
+        student = {field: clean(payload.get(field)) for field in PAYLOAD_STUDENT_FIELDS}
+        student.update({
+            'id': student_id, 'uuid': str(uuid.uuid4()), 'userId': user_id,
+            'admissionNo': clean(payload.get('admissionNo')) or f"{BULK_ADMISSION_PREFIX}{student_id:06d}",
+            'classId': int(class_id) if class_id else None, 'parentId': parent_id,
+            'admissionDate': to_datetime(payload.get('admissionDate')),
+            'schoolId': school_id, 'createdBy': BULK_OWNER_ID, 'createdAt': now, 'updatedAt': now,
+        })
+        tables['students'].append(student)
+        ids.append({'studentId': student_id, 'userId': user_id, 'parentId': parent_id})
+
+    rows = {table: [tuple(row[column] for column in TABLE_COLUMNS[table]) for row in table_rows]
+            for table, table_rows in tables.items()}
+    return rows, ids
+
+
+def sql_literal(value: Any, dialect: str = 'mysql') -> str:
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value).replace("'", "''")
+    if dialect == 'mysql':
+        # MySQL also treats backslashes in string literals as escapes
+        text = text.replace('\\', '\\\\')
+    return f"'{text}'"
+
+
+def insert_statements(table: str, rows: Iterable[tuple], dialect: str = 'mysql',
+                      rows_per_insert: int = BULK_ROWS_PER_INSERT) -> Iterable[str]:
+    """Multi-row INSERT statements for `rows`, `rows_per_insert` rows each."""
+    header = f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in TABLE_COLUMNS[table])}) VALUES\n"
+    batch: List[str] = []
+    for row in rows:
+        batch.append('(' + ', '.join(sql_literal(value, dialect) for value in row) + ')')
+        if len(batch) == rows_per_insert:
+            yield header + ',\n'.join(batch) + ';\n'
+            batch = []
+    if batch:
+        yield header + ',\n'.join(batch) + ';\n'
+
+
+def write_sql(tables: Dict[str, List[tuple]], path: str, dialect: str = BULK_SQL_DIALECT) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"-- Bulk load generated {dt.datetime.now(dt.timezone.utc).isoformat()}\n")
+        if dialect == 'mysql':
+            f.write("SET NAMES utf8mb4;\n")
+        f.write("BEGIN;\n")
+        for table in TABLE_COLUMNS:
+            for statement in insert_statements(table, tables[table], dialect):
+                f.write(statement)
+        f.write("COMMIT;\n")
+    return path
+
+
+def tsv_field(value: Any) -> str:
+    """A value in LOAD DATA's default format: \\N for NULL, backslash-escaped tab/newline."""
+    if value is None:
+        return '\\N'
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def write_tsv(tables: Dict[str, List[tuple]], output_dir: str) -> str:
+    """One <table>.tsv per table (header line first) and load.sql to load them in order."""
+    statements = ["SET NAMES utf8mb4;", "BEGIN;"]
+    for table, columns in TABLE_COLUMNS.items():
+        with open(os.path.join(output_dir, f"{table}.tsv"), 'w', encoding='utf-8', newline='') as f:
+            f.write('\t'.join(columns) + '\n')
+            for row in tables[table]:
+                f.write('\t'.join(tsv_field(value) for value in row) + '\n')
+        statements.append(
+            f"LOAD DATA LOCAL INFILE '{table}.tsv' INTO TABLE `{table}` CHARACTER SET utf8mb4\n"
+            f"  FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' IGNORE 1 LINES\n"
+            f"  ({', '.join(f'`{c}`' for c in columns)});")
+    statements.append("COMMIT;")
+    path = os.path.join(output_dir, 'load.sql')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(statements) + '\n')
+    return path
+
+
+def write_bulk_load(payloads: Sequence[Dict[str, Any]], roots: Sequence[int], name: str,
+                    output_format: str = BULK_OUTPUT, output_dir: str = BULK_OUTPUT_DIR) -> List[Dict[str, int]]:
+    """Write the bulk-load files for `payloads`; returns the IDs assigned to each payload."""
+    if output_format not in OUTPUT_FORMATS:
+        sys.exit(f"❌ BULK_OUTPUT must be one of {', '.join(OUTPUT_FORMATS)}, not {output_format!r}")
+    tables, ids = build_tables(payloads, roots)
+    os.makedirs(output_dir, exist_ok=True)
+    if output_format == 'sql':
+        path = write_sql(tables, os.path.join(output_dir, f"{name}.sql"))
+        hint = f"mysql --default-character-set=utf8mb4 <db> < {path}"
+    else:
+        path = write_tsv(tables, output_dir)
+        hint = f"cd {output_dir} && mysql --local-infile=1 <db> < load.sql"
+    counts = ', '.join(f"{len(rows)} {table}" for table, rows in tables.items())
+    log_print(f"🗄️ Bulk load written: {counts} -> {path}")
+    log_print(f"   Load it with: {hint}")
+    return ids
+
+
+def stand_in_schema() -> str:
+    """CREATE TABLE statements for a SQLite stand-in of the three tables."""
+    statements = []
+    for table, columns in TABLE_COLUMNS.items():
+        definitions = []
+        for column in columns:
+            if column == 'id':
+                definitions.append('`id` INTEGER PRIMARY KEY')
+                continue
+            kind = 'INTEGER' if column.endswith('Id') or column == 'createdBy' else 'TEXT'
+            not_null = ' NOT NULL' if column in REQUIRED_COLUMNS[table] else ''
+            unique = ' UNIQUE' if column in UNIQUE_COLUMNS[table] else ''
+            target = FOREIGN_KEYS.get(table, {}).get(column)
+            reference = f' REFERENCES `{target}`(`id`)' if target else ''
+            definitions.append(f'`{column}` {kind}{not_null}{unique}{reference}')
+        statements.append(f"CREATE TABLE IF NOT EXISTS `{table}` ({', '.join(definitions)});")
+    return '\n'.join(statements)
+
+
+def check_sqlite(sql_path: str, db_path: str = ':memory:') -> Dict[str, int]:
+    """Load a generated SQL file (BULK_SQL_DIALECT=sqlite) into a SQLite stand-in and verify it."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.executescript(stand_in_schema())
+        with open(sql_path, 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM `{table}`').fetchone()[0] for table in TABLE_COLUMNS}
+        counts['foreignKeyErrors'] = len(conn.execute('PRAGMA foreign_key_check').fetchall())
+        counts['studentsWithoutParent'] = conn.execute(
+            'SELECT COUNT(*) FROM `students` WHERE `parentId` IS NULL').fetchone()[0]
+        return counts
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a generated bulk-load SQL file against a SQLite stand-in.')
+    parser.add_argument('--check-sqlite', required=True, metavar='SQL_FILE',
+                        help='SQL written with BULK_OUTPUT=sql BULK_SQL_DIALECT=sqlite')
+    parser.add_argument('--db', default=':memory:', help='SQLite database file to load into (default: in memory)')
+    args = parser.parse_args()
+    try:
+        counts = check_sqlite(args.check_sqlite, args.db)
+    except sqlite3.Error as e:
+        log_print(f"❌ Load failed: {e}")
+        sys.exit(1)
+    log_print(f"✅ Loaded: {counts['users']} users, {counts['parents']} parents, {counts['students']} students; "
+              f"{counts['foreignKeyErrors']} foreign key errors, "
+              f"{counts['studentsWithoutParent']} students without a parent")
+    if counts['foreignKeyErrors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
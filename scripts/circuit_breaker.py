@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Fail-fast helpers for the importers.
+
+`error_signature` reduces an error to its shape (status plus message with
+numbers and quoted values masked), so 478 copies of the same "Internal
+server error" count as one signature. `ErrorSignatures` keeps the count and
+affected rows per signature instead of a message per row.
+
+`CircuitBreaker` watches those signatures. After BREAKER_THRESHOLD
+consecutive server errors (5xx or no response) with the same signature it
+opens: the importer pauses BREAKER_PAUSE_S seconds and sends a single probe
+request. A probe that gets through closes the breaker and the run resumes;
+after BREAKER_PROBES failed probes (the pause doubling each time) the run
+is aborted with CircuitOpenError instead of sending every remaining row.
+BREAKER_THRESHOLD=0 turns it off.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Configuration
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', '10'))
+BREAKER_PAUSE_S = float(os.environ.get('BREAKER_PAUSE_S', '30'))
+BREAKER_PROBES = int(os.environ.get('BREAKER_PROBES', '3'))
+# Rows kept per signature in the log (the count is always exact)
+SIGNATURE_SAMPLE_ROWS = 20
+
+_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+_NUMBER = re.compile(r'\d+')
+
+
+class CircuitOpenError(Exception):
+    """The server kept failing the same way after every probe; the run should stop."""
+
+
+def error_signature(status: Optional[int], message: Any) -> str:
+    """'HTTP 500: Internal server error'; numbers and quoted values become # and '…'."""
+    text = _NUMBER.sub('#', _QUOTED.sub("'…'", str(message or '')))
+    text = ' '.join(text.split())[:200]
+    return f"HTTP {status}: {text}" if status else text
+
+
+def is_server_error(status: Optional[int]) -> bool:
+    """5xx, or no HTTP status at all (connection error, timeout)."""
+    return status is None or status >= 500
+
+
+class ErrorSignatures:
+    """Failure counts per signature, with the first rows that hit each one; safe to share between threads."""
+
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, status: Optional[int], message: Any, row: Optional[int] = None) -> str:
+        signature = error_signature(status, message)
+        with self._lock:
+            group = self.groups.setdefault(signature, {'signature': signature, 'status': status, 'count': 0,
+                                                       'example': str(message)[:500], 'rows': []})
+            group['count'] += 1
+            if row is not None and len(group['rows']) < SIGNATURE_SAMPLE_ROWS:
+                group['rows'].append(row)
+        return signature
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Groups, most frequent first."""
+        return sorted(self.groups.values(), key=lambda group: -group['count'])
+
+
+class CircuitBreaker:
+    """Opens after `threshold` identical server errors in a row; see the module docstring."""
+
+    def __init__(self, log: Callable[[str], None], threshold: int = BREAKER_THRESHOLD,
+                 pause_s: float = BREAKER_PAUSE_S, probes: int = BREAKER_PROBES):
+        self.log = log
+        self.threshold = threshold
+        self.pause_s = pause_s
+        self.probes = probes
+        self.signature: Optional[str] = None
+        self.streak = 0
+        self.failed_probes = 0
+        self.probing = False
+
+    @property
+    def open(self) -> bool:
+        return 0 < self.threshold <= self.streak
+
+    def before_request(self) -> None:
+        """Call before each request; pauses while open, raises CircuitOpenError once probing has failed."""
+        if not self.open:
+            return
+        if self.failed_probes >= self.probes:
+            raise CircuitOpenError(f"{self.streak} consecutive '{self.signature}' and "
+                                   f"{self.failed_probes} failed probes")
+        pause = self.pause_s * (2 ** self.failed_probes)
+        self.log(f"🛑 Circuit open after {self.streak} × '{self.signature}'; "
+                 f"pausing {pause:g}s, then probing with one request "
+                 f"({self.failed_probes + 1}/{self.probes})")
+        time.sleep(pause)
+        self.probing = True
+
+    def record(self, status: Optional[int], signature: Optional[str] = None) -> None:
+        """Outcome of a request: its HTTP status (None if it never got one) and its error signature if it failed."""
+        probing, self.probing = self.probing, False
+        if signature is None or not is_server_error(status):
+            # Anything the server answered normally (even a 4xx for bad data) closes the circuit
+            if probing:
+                self.log('✅ Probe got through; circuit closed, resuming')
+            self.signature, self.streak, self.failed_probes = None, 0, 0
+            return
+        if signature != self.signature:
+            self.signature, self.streak, self.failed_probes = signature, 0, 0
+        self.streak += 1
+        if probing:
+            self.failed_probes += 1
@@ -8,9 +8,20 @@ import pandas as pd
 import numpy as np
 import os
 import sys
+import time
+import tracemalloc
+from collections import OrderedDict
 from datetime import datetime
 import logging
 
+import near_duplicates
+import row_hashes
+import validation_rules
+from compact_dtypes import compact_frame, export_frame, format_bytes
+from date_parsing import normalise_dates
+from transliteration import fold_series
+from usernames import build_usernames, fill_usernames
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,20 +33,256 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Cell strings pd.read_excel treats as missing by default
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+class StreamingTableWriter:
+    """Append-only writer for cleaned chunks.
+
+    The format follows the output extension: .xlsx goes through openpyxl's
+    write-only workbook (rows are streamed to disk, not kept as cell
+    objects), .csv is appended to directly and .parquet uses pyarrow.
+    """
+    
+    def __init__(self, output_file, sheet_name='Student_Data_Cleaned'):
+        self.output_file = output_file
+        self.sheet_name = sheet_name
+        self.format = os.path.splitext(output_file)[1].lower().lstrip('.')
+        self.columns = None
+        self.rows_written = 0
+        self._workbook = None
+        self._sheet = None
+        self._parquet_writer = None
+        
+        if self.format not in ('xlsx', 'csv', 'parquet'):
+            raise ValueError(f"Unsupported output format: .{self.format} (use .xlsx, .csv or .parquet)")
+    
+    def write(self, chunk):
+        """Append one cleaned chunk to the output"""
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self._open()
+        chunk = export_frame(chunk.reindex(columns=self.columns))
+        
+        if self.format == 'xlsx':
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                self._sheet.append(row)
+        elif self.format == 'csv':
+            chunk.to_csv(self.output_file, mode='a', header=False, index=False, encoding='utf-8')
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(chunk.astype('string'), preserve_index=False,
+                                         schema=self._parquet_writer.schema)
+            self._parquet_writer.write_table(table)
+        
+        self.rows_written += len(chunk)
+    
+    def _open(self):
+        """Create the output and write the header"""
+        if self.format == 'xlsx':
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet(self.sheet_name)
+            self._sheet.append(self.columns)
+        elif self.format == 'csv':
+            pd.DataFrame(columns=self.columns).to_csv(self.output_file, index=False, encoding='utf-8')
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+            schema = pa.schema([(str(col), pa.string()) for col in self.columns])
+            self._parquet_writer = pq.ParquetWriter(self.output_file, schema)
+    
+    def close(self, summary_rows=None):
+        """Finish the output; xlsx files also get a Summary sheet"""
+        if self.columns is None:
+            self.columns = []
+            self._open()
+        
+        if self.format == 'xlsx':
+            if summary_rows:
+                summary = self._workbook.create_sheet('Summary')
+                summary.append(['Metric', 'Value'])
+                for metric, value in summary_rows:
+                    summary.append([metric, value])
+            self._workbook.save(self.output_file)
+        elif self.format == 'parquet':
+            self._parquet_writer.close()
+
+
 class ExcelDataCleaner:
-    def __init__(self, input_file='Student_Data_Template.xlsx', output_file='Student_Data_Cleaned.xlsx'):
+    # Registered cleanup steps: name -> (method name or callable, description).
+    # Registration order is the default pipeline order.
+    STEP_REGISTRY = OrderedDict([
+        ('load', ('load_data', 'Load data from the input file')),
+        ('incremental_filter', ('filter_changed_rows', 'Keep only rows new or changed since the last run')),
+        ('remove_empty_columns', ('remove_empty_columns', 'Drop columns without any data')),
+        ('remove_duplicates', ('remove_duplicates', 'Drop exact duplicate rows')),
+        ('clean', ('clean_data', 'Normalise names, phones, dates and gender')),
+        ('near_duplicates', ('detect_near_duplicates', 'Report/merge near-duplicate students')),
+        ('validate', ('validate_data', 'Check required fields and fill defaults')),
+        ('compact_dtypes', ('compact_dtypes', 'Use categorical, nullable int and date dtypes')),
+        ('save', ('save_cleaned_data', 'Write the cleaned workbook')),
+        ('save_row_hashes', ('save_row_hashes', 'Record row hashes for the next incremental run')),
+        ('report', ('generate_report', 'Write the cleanup report (excel-cleanup-report.txt)')),
+    ])
+    
+    # Steps that are only part of the pipeline when explicitly asked for
+    OPTIONAL_STEPS = {'near_duplicates', 'incremental_filter', 'save_row_hashes'}
+    
+    # Steps the chunked driver performs itself instead of once per chunk
+    CHUNK_DRIVER_STEPS = {'load', 'remove_empty_columns', 'save', 'report'}
+    
+    # Steps that only make sense on the whole sheet and are skipped in chunked mode
+    WHOLE_SHEET_STEPS = {'near_duplicates', 'compact_dtypes', 'incremental_filter', 'save_row_hashes'}
+    
+    # Fields used to detect exact duplicate rows
+    DUPLICATE_FIELDS = [
+        'Student_First_Name*',
+        'Parent_First_Name*', 
+        'Student_Phone*',
+        'Parent_Phone*'
+    ]
+    
+    def __init__(self, input_file='Student_Data_Template.xlsx', output_file='Student_Data_Cleaned.xlsx',
+                 chunk_size=None, near_duplicates=None, near_duplicate_report='near-duplicates-report.csv',
+                 steps=None, skip_steps=None, trace_memory=True, report_file='excel-cleanup-report.txt',
+                 incremental=False, state_file=None, issues_file='validation-issues.csv',
+                 drop_invalid=True, classes_file=None, date_calendar='auto'):
         self.input_file = input_file
         self.output_file = output_file
+        self.chunk_size = chunk_size
+        enabled_optional = set()
+        if near_duplicates:
+            enabled_optional.add('near_duplicates')
+        if incremental:
+            enabled_optional.update({'incremental_filter', 'save_row_hashes'})
+        self.steps = self._resolve_steps(steps, skip_steps, enabled_optional)
+        self.trace_memory = trace_memory
+        self.step_stats = OrderedDict()
+        self.near_duplicates = near_duplicates  # None, 'report' or 'merge'
+        self.near_duplicate_report = near_duplicate_report
+        self.report_file = report_file
+        self.state_file = state_file or os.path.splitext(output_file)[0] + '.row-hashes.json'
+        self.row_state = {}
+        self.row_hashes = None
+        self.removed_row_keys = []
+        self.incremental_stats = None
+        self.source_column_counts = None
+        self.date_calendar = date_calendar  # 'auto', 'jalali' or 'gregorian'
+        self.issues_file = issues_file
+        self.drop_invalid = drop_invalid
+        self.known_classes = validation_rules.load_known_classes(classes_file) if classes_file else None
+        self.validation_issues = []
+        self.invalid_rows_dropped = 0
+        self.invalid_row_keys = set()
+        self.near_duplicate_summary = None
+        self.near_duplicate_rows = 0
+        self.memory_stats = None
         self.original_data = None
         self.cleaned_data = None
         
+        # State that has to survive across chunks in chunked mode
+        self.taken_usernames = set()
+        self.seen_duplicate_keys = set() if chunk_size else None
+        self.chunk_stats = {'chunks': 0, 'rows_in': 0, 'rows_out': 0, 'duplicates_removed': 0}
+        
+    @classmethod
+    def register_step(cls, name, step, description='', after=None):
+        """Register an extra cleanup step.
+        
+        `step` is a method name or a callable taking the cleaner; it returns
+        False to abort the run. The step is enabled by default and runs after
+        `after` (or at the end of the pipeline).
+        """
+        cls.STEP_REGISTRY[name] = (step, description)
+        if after is not None:
+            names = list(cls.STEP_REGISTRY)
+            names.remove(name)
+            names.insert(names.index(after) + 1, name)
+            for step_name in names:
+                cls.STEP_REGISTRY.move_to_end(step_name)
+    
+    def _resolve_steps(self, steps, skip_steps, enabled_optional=()):
+        """Ordered list of step names this run should execute"""
+        if steps:
+            selected = list(steps)
+        else:
+            selected = [name for name in self.STEP_REGISTRY
+                        if name not in self.OPTIONAL_STEPS or name in enabled_optional]
+        
+        unknown = [name for name in list(selected) + list(skip_steps or []) if name not in self.STEP_REGISTRY]
+        if unknown:
+            raise ValueError(f"Unknown cleanup steps: {unknown} (available: {list(self.STEP_REGISTRY)})")
+        
+        return [name for name in selected if name not in set(skip_steps or [])]
+    
+    def _current_rows(self):
+        """Rows in the frame the pipeline is currently working on"""
+        if self.cleaned_data is not None:
+            return len(self.cleaned_data)
+        if self.original_data is not None:
+            return len(self.original_data)
+        return 0
+    
+    def _run_step(self, name):
+        """Run one registered step, recording wall time, rows in/out and peak memory"""
+        step, _ = self.STEP_REGISTRY[name]
+        func = getattr(self, step) if isinstance(step, str) else (lambda: step(self))
+        
+        rows_in = self._current_rows()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        
+        result = func()
+        
+        elapsed = time.perf_counter() - started
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if tracemalloc.is_tracing() else None
+        
+        # Chunked runs call the same step once per chunk; accumulate
+        stats = self.step_stats.setdefault(name, {
+            'calls': 0, 'seconds': 0.0, 'rows_in': 0, 'rows_out': 0, 'peak_memory_mb': None
+        })
+        stats['calls'] += 1
+        stats['seconds'] += elapsed
+        stats['rows_in'] += rows_in
+        stats['rows_out'] += self._current_rows()
+        if peak_mb is not None:
+            stats['peak_memory_mb'] = max(stats['peak_memory_mb'] or 0.0, peak_mb)
+        
+        logger.info(f"Step '{name}' finished in {elapsed:.2f}s ({rows_in} -> {self._current_rows()} rows"
+                    + (f", peak {peak_mb:.1f} MB)" if peak_mb is not None else ")"))
+        
+        # Steps without a return value (e.g. generate_report) count as successful
+        return result is not False
+    
+    def _step_stats_rows(self):
+        """One line per executed step for the Summary sheet and the report"""
+        lines = []
+        for name, stats in self.step_stats.items():
+            memory = f", peak {stats['peak_memory_mb']:.1f} MB" if stats['peak_memory_mb'] is not None else ''
+            calls = f" over {stats['calls']} chunks" if stats['calls'] > 1 else ''
+            lines.append((f"Step: {name}",
+                          f"{stats['seconds']:.2f}s{calls}, rows {stats['rows_in']} -> {stats['rows_out']}{memory}"))
+        return lines
+    
     def load_data(self):
         """Load data from Excel file"""
         try:
             logger.info(f"Loading data from {self.input_file}")
             
-            # Read the first sheet (Student_Data)
-            self.original_data = pd.read_excel(self.input_file, sheet_name=0)
+            if self.input_file.lower().endswith('.csv'):
+                self.original_data = pd.read_csv(self.input_file)
+            else:
+                # Read the first sheet (Student_Data)
+                self.original_data = pd.read_excel(self.input_file, sheet_name=0)
             
             logger.info(f"Loaded {len(self.original_data)} rows and {len(self.original_data.columns)} columns")
             logger.info(f"Columns: {list(self.original_data.columns)}")
@@ -46,6 +293,101 @@ class ExcelDataCleaner:
             logger.error(f"Error loading Excel file: {e}")
             return False
     
+    def filter_changed_rows(self):
+        """Keep only rows that are new or changed since the last incremental run"""
+        if self.original_data is None:
+            logger.error("No data loaded")
+            return False
+        
+        logger.info(f"Comparing rows with the last run ({self.state_file})...")
+        try:
+            state = row_hashes.load_state(self.state_file)
+        except ValueError as e:
+            logger.error(str(e))
+            return False
+        keys = row_hashes.row_keys(self.original_data)
+        hashes = row_hashes.content_hashes(self.original_data)
+        change, self.removed_row_keys = row_hashes.diff_rows(keys, hashes, state)
+        
+        self.row_state = state
+        self.row_hashes = pd.DataFrame({'key': keys, 'hash': hashes})
+        counts = change.value_counts()
+        self.incremental_stats = {
+            'new': int(counts.get('new', 0)),
+            'changed': int(counts.get('changed', 0)),
+            'unchanged': int(counts.get('unchanged', 0)),
+            'removed': len(self.removed_row_keys),
+        }
+        logger.info(f"Rows: {self.incremental_stats['new']} new, {self.incremental_stats['changed']} changed, "
+                    f"{self.incremental_stats['unchanged']} unchanged, {self.incremental_stats['removed']} removed")
+        
+        # Usernames handed out by earlier runs stay reserved for good
+        for entry in state.values():
+            self.taken_usernames.update(
+                name for name in (entry.get('student_username'), entry.get('parent_username')) if name
+            )
+        
+        pending = change != 'unchanged'
+        data = self.original_data[pending].copy()
+        data['Row_Key'] = keys[pending]
+        data['Change_Type'] = change[pending]
+        
+        # Changed rows keep the usernames they were first imported with
+        for col, field in (('Student_Username*', 'student_username'), ('Parent_Username*', 'parent_username')):
+            stored = data['Row_Key'].map(lambda key: state.get(key, {}).get(field))
+            if stored.notna().any():
+                data[col] = data[col].where(data[col].notna(), stored) if col in data.columns else stored
+        
+        # Judge empty columns on the whole sheet (plus the injected usernames);
+        # the delta columns always stay, even when nothing changed
+        self.source_column_counts = self.original_data.count().combine(data.count(), max, fill_value=0)
+        self.source_column_counts['Row_Key'] = self.source_column_counts['Change_Type'] = len(self.original_data)
+        
+        self.original_data = data
+        return True
+    
+    def save_row_hashes(self):
+        """Record this run's row hashes (and usernames) for the next incremental run
+
+        They are written next to the state as pending; the importer makes them
+        the state once the delta imported without failures, so until then the
+        next run diffs against the last imported state and resends the delta.
+        """
+        if self.row_hashes is None:
+            logger.error("No row hashes computed; run the incremental_filter step first")
+            return False
+        
+        removed = set(self.removed_row_keys)
+        rows = {key: entry for key, entry in self.row_state.items() if key not in removed}
+        for key, content_hash in zip(self.row_hashes['key'], self.row_hashes['hash']):
+            if key in self.invalid_row_keys:
+                continue
+            rows[key] = dict(rows.get(key, {}), hash=content_hash)
+        
+        if self.cleaned_data is not None and 'Row_Key' in self.cleaned_data.columns:
+            for col, field in (('Student_Username*', 'student_username'), ('Parent_Username*', 'parent_username')):
+                if col in self.cleaned_data.columns:
+                    for key, name in zip(self.cleaned_data['Row_Key'], self.cleaned_data[col]):
+                        if pd.notna(name) and key in rows:
+                            rows[key][field] = name
+        
+        if self.removed_row_keys:
+            removed_file = os.path.splitext(self.output_file)[0] + '.removed.csv'
+            removed = pd.DataFrame([
+                {'Row_Key': key,
+                 'Student_Username*': self.row_state[key].get('student_username'),
+                 'Parent_Username*': self.row_state[key].get('parent_username')}
+                for key in self.removed_row_keys
+            ])
+            removed.to_csv(removed_file, index=False, encoding='utf-8')
+            logger.info(f"Rows missing from this submission listed in {removed_file}")
+        
+        pending = row_hashes.pending_path(self.state_file)
+        row_hashes.save_state(pending, rows, source=self.input_file)
+        logger.info(f"Saved {len(rows)} row hashes to {pending}; they replace {self.state_file} "
+                    f"once the delta is imported")
+        return True
+    
     def remove_empty_columns(self):
         """Remove columns that have no data or only empty values"""
         if self.original_data is None:
@@ -54,8 +396,13 @@ class ExcelDataCleaner:
             
         logger.info("Removing empty columns...")
         
-        # Count non-empty values in each column
-        non_empty_counts = self.original_data.count()
+        # Count non-empty values in each column (over the whole sheet, even when
+        # an incremental run only carries the changed rows forward)
+        if self.source_column_counts is not None:
+            non_empty_counts = self.source_column_counts.reindex(self.original_data.columns).fillna(
+                self.original_data.count())
+        else:
+            non_empty_counts = self.original_data.count()
         
         # Find columns with no data (all empty)
         empty_columns = non_empty_counts[non_empty_counts == 0].index.tolist()
@@ -77,16 +424,8 @@ class ExcelDataCleaner:
             
         logger.info("Removing duplicate rows...")
         
-        # Fields to check for duplicates
-        duplicate_fields = [
-            'Student_First_Name*',
-            'Parent_First_Name*', 
-            'Student_Phone*',
-            'Parent_Phone*'
-        ]
-        
         # Check which fields exist in the data
-        existing_fields = [field for field in duplicate_fields if field in self.original_data.columns]
+        existing_fields = [field for field in self.DUPLICATE_FIELDS if field in self.original_data.columns]
         
         if not existing_fields:
             logger.warning("None of the specified duplicate check fields found in the data")
@@ -97,12 +436,26 @@ class ExcelDataCleaner:
         # Count rows before deduplication
         rows_before = len(self.original_data)
         
-        # Remove duplicates based on the specified fields
-        self.original_data = self.original_data.drop_duplicates(subset=existing_fields, keep='first')
+        # Names are compared by their folded form, so Arabic/Persian letter
+        # variants, ZWNJ and letter case do not hide a duplicate
+        key_frame = self.original_data[existing_fields].copy()
+        for field in existing_fields:
+            if 'Name' in field:
+                key_frame[field] = fold_series(key_frame[field])
+        keys = pd.util.hash_pandas_object(key_frame, index=False)
+        
+        if self.seen_duplicate_keys is None:
+            duplicated = keys.duplicated(keep='first')
+        else:
+            # Chunked mode: compare row-key hashes against every earlier chunk as well
+            duplicated = keys.duplicated(keep='first') | keys.isin(self.seen_duplicate_keys)
+            self.seen_duplicate_keys.update(keys[~duplicated].tolist())
+        self.original_data = self.original_data[~duplicated.values]
         
         # Count rows after deduplication
         rows_after = len(self.original_data)
         removed_duplicates = rows_before - rows_after
+        self.chunk_stats['duplicates_removed'] += removed_duplicates
         
         logger.info(f"Removed {removed_duplicates} duplicate rows")
         logger.info(f"Rows: {rows_before} -> {rows_after}")
@@ -124,13 +477,9 @@ class ExcelDataCleaner:
         string_columns = self.cleaned_data.select_dtypes(include=['object']).columns
         
         for col in string_columns:
-            # Remove leading/trailing whitespace
-            self.cleaned_data[col] = self.cleaned_data[col].astype(str).str.strip()
-            
-            # Replace empty strings with NaN
-            self.cleaned_data[col] = self.cleaned_data[col].replace('', np.nan)
-            self.cleaned_data[col] = self.cleaned_data[col].replace('nan', np.nan)
-            self.cleaned_data[col] = self.cleaned_data[col].replace('None', np.nan)
+            # Remove leading/trailing whitespace, then blank out empty markers in one pass
+            stripped = self.cleaned_data[col].astype(str).str.strip()
+            self.cleaned_data[col] = stripped.mask(stripped.isin(['', 'nan', 'None']), np.nan)
         
         # Clean specific fields
         self._clean_names()
@@ -141,6 +490,45 @@ class ExcelDataCleaner:
         logger.info("Data cleaning completed")
         return True
     
+    def detect_near_duplicates(self):
+        """Find students entered more than once with slightly different data"""
+        if self.cleaned_data is None:
+            logger.error("No cleaned data available")
+            return False
+        
+        logger.info("Detecting near-duplicate students...")
+        clusters = near_duplicates.find_near_duplicates(self.cleaned_data)
+        self.near_duplicate_summary = near_duplicates.summarise(clusters)
+        self.near_duplicate_rows = len(clusters)
+        for line in self.near_duplicate_summary:
+            logger.info(line)
+        
+        if clusters.empty:
+            return True
+        
+        report = near_duplicates.build_cluster_report(self.cleaned_data, clusters)
+        report.to_csv(self.near_duplicate_report, index=False, encoding='utf-8')
+        logger.info(f"Near-duplicate cluster report saved to {self.near_duplicate_report}")
+        
+        if self.near_duplicates == 'merge':
+            rows_before = len(self.cleaned_data)
+            self.cleaned_data = near_duplicates.merge_near_duplicates(self.cleaned_data, clusters)
+            logger.info(f"Merged near-duplicates: {rows_before} -> {len(self.cleaned_data)} rows")
+        
+        return True
+    
+    def compact_dtypes(self):
+        """Store low-cardinality, integer and date columns in compact dtypes"""
+        if self.cleaned_data is None:
+            logger.error("No cleaned data available")
+            return False
+        
+        self.cleaned_data, before, after = compact_frame(self.cleaned_data)
+        self.memory_stats = {'before': before, 'after': after}
+        ratio = before / after if after else 0
+        logger.info(f"Compacted dtypes: {format_bytes(before)} -> {format_bytes(after)} ({ratio:.1f}x smaller)")
+        return True
+    
     def _clean_names(self):
         """Clean name fields"""
         name_fields = [
@@ -160,7 +548,12 @@ class ExcelDataCleaner:
         for field in phone_fields:
             if field in self.cleaned_data.columns:
                 # Remove spaces and special characters except + and digits
-                self.cleaned_data[field] = self.cleaned_data[field].astype(str).str.replace(r'[^\d+]', '', regex=True)
+                # (a trailing .0 comes from numeric cells read as floats and is not a digit)
+                self.cleaned_data[field] = (
+                    self.cleaned_data[field].astype(str)
+                    .str.replace(r'\.0$', '', regex=True)
+                    .str.replace(r'[^\d+]', '', regex=True)
+                )
                 
                 # Ensure it starts with + if it's a phone number
                 def format_phone(phone):
@@ -185,10 +578,9 @@ class ExcelDataCleaner:
         
         for field in date_fields:
             if field in self.cleaned_data.columns:
-                # Convert to datetime and format as YYYY-MM-DD
+                # Mixed cells (dates, years, Excel serials, Jalali dates) -> YYYY-MM-DD
                 try:
-                    self.cleaned_data[field] = pd.to_datetime(self.cleaned_data[field], errors='coerce')
-                    self.cleaned_data[field] = self.cleaned_data[field].dt.strftime('%Y-%m-%d')
+                    self.cleaned_data[field] = normalise_dates(self.cleaned_data[field], self.date_calendar)
                 except Exception as e:
                     logger.warning(f"Could not clean date field {field}: {e}")
     
@@ -254,6 +646,9 @@ class ExcelDataCleaner:
             self.cleaned_data = self.cleaned_data[~critical_missing]
             logger.info(f"Removed {critical_missing_count} completely empty rows")
         
+        # Rules run before defaults are filled in, so gaps are still visible
+        self._apply_validation_rules()
+        
         # Check for rows with some missing required data but keep them
         missing_data = self.cleaned_data[required_fields].isnull().any(axis=1)
         missing_count = missing_data.sum()
@@ -263,9 +658,41 @@ class ExcelDataCleaner:
             # Fill missing required fields with defaults
             self._fill_missing_required_fields()
         
+        if not self.chunk_size:
+            self._write_validation_issues()
+        
         logger.info(f"Validation completed. Final dataset: {len(self.cleaned_data)} rows")
         return True
     
+    def _apply_validation_rules(self):
+        """Evaluate validation_rules over the sheet and hold back rows with errors"""
+        issues = validation_rules.evaluate(self.cleaned_data, context={
+            'source': self.original_data,
+            'known_classes': self.known_classes,
+        })
+        self.validation_issues.append(issues)
+        for line in validation_rules.summarise(issues):
+            logger.info(line)
+        
+        if not self.drop_invalid or issues.empty:
+            return
+        invalid = validation_rules.error_rows(self.cleaned_data, issues)
+        if invalid.any():
+            if 'Row_Key' in self.cleaned_data.columns:
+                # Not recorded as imported, so an incremental run retries them once fixed
+                self.invalid_row_keys.update(self.cleaned_data.loc[invalid, 'Row_Key'])
+            self.cleaned_data = self.cleaned_data[~invalid]
+            self.invalid_rows_dropped += int(invalid.sum())
+            logger.warning(f"Held back {int(invalid.sum())} rows with validation errors (see {self.issues_file})")
+    
+    def _write_validation_issues(self):
+        """Write every issue found so far to the issues file"""
+        if not self.validation_issues or not self.issues_file:
+            return
+        issues = pd.concat(self.validation_issues, ignore_index=True)
+        validation_rules.write_issues(issues, self.issues_file)
+        logger.info(f"Validation issues written to {self.issues_file} ({len(issues)} issues)")
+    
     def _map_column_names(self):
         """Map actual column names to expected format"""
         logger.info("Mapping column names...")
@@ -286,25 +713,37 @@ class ExcelDataCleaner:
         """Generate missing required fields"""
         logger.info("Generating missing fields...")
         
+        # Usernames are built column-wise and resolved against one shared set,
+        # so students and parents (and later chunks) never collide either
+        taken = self.taken_usernames
+        
         # Generate Student_Username* if missing
         if 'Student_Username*' not in self.cleaned_data.columns:
             logger.info("Generating Student_Username* field...")
-            def generate_student_username(row):
-                first_name = str(row['Student_First_Name*']) if pd.notna(row['Student_First_Name*']) else 'student'
-                last_name = str(row['Student_Last_Name*']) if pd.notna(row['Student_Last_Name*']) else 'user'
-                return f"{first_name.lower()}_{last_name.lower()}_{row.name + 1}"
-            
-            self.cleaned_data['Student_Username*'] = self.cleaned_data.apply(generate_student_username, axis=1)
+            self.cleaned_data['Student_Username*'] = build_usernames(
+                self.cleaned_data['Student_First_Name*'], self.cleaned_data['Student_Last_Name*'],
+                'stu', taken, default_first='student'
+            )
+        else:
+            self.cleaned_data['Student_Username*'] = fill_usernames(
+                self.cleaned_data['Student_Username*'],
+                self.cleaned_data['Student_First_Name*'], self.cleaned_data['Student_Last_Name*'],
+                'stu', taken, default_first='student'
+            )
         
         # Generate Parent_Username* if missing
         if 'Parent_Username*' not in self.cleaned_data.columns:
             logger.info("Generating Parent_Username* field...")
-            def generate_parent_username(row):
-                first_name = str(row['Parent_First_Name*']) if pd.notna(row['Parent_First_Name*']) else 'parent'
-                last_name = str(row['Parent_Last_Name*']) if pd.notna(row['Parent_Last_Name*']) else 'user'
-                return f"{first_name.lower()}_{last_name.lower()}_parent_{row.name + 1}"
-            
-            self.cleaned_data['Parent_Username*'] = self.cleaned_data.apply(generate_parent_username, axis=1)
+            self.cleaned_data['Parent_Username*'] = build_usernames(
+                self.cleaned_data['Parent_First_Name*'], self.cleaned_data['Parent_Last_Name*'],
+                'par', taken, default_first='parent'
+            )
+        else:
+            self.cleaned_data['Parent_Username*'] = fill_usernames(
+                self.cleaned_data['Parent_Username*'],
+                self.cleaned_data['Parent_First_Name*'], self.cleaned_data['Parent_Last_Name*'],
+                'par', taken, default_first='parent'
+            )
         
         # Generate Class_ID* if missing (default to 1)
         if 'Class_ID*' not in self.cleaned_data.columns:
@@ -356,10 +795,19 @@ class ExcelDataCleaner:
         try:
             logger.info(f"Saving cleaned data to {self.output_file}")
             
+            if not self.output_file.lower().endswith('.xlsx'):
+                # CSV / Parquet output goes through the same writer as chunked runs
+                writer = StreamingTableWriter(self.output_file)
+                writer.write(self.cleaned_data)
+                writer.close()
+                logger.info(f"Successfully saved cleaned data to {self.output_file}")
+                return True
+            
             # Create a new Excel writer
             with pd.ExcelWriter(self.output_file, engine='openpyxl') as writer:
                 # Write the cleaned data
-                self.cleaned_data.to_excel(writer, sheet_name='Student_Data_Cleaned', index=False)
+                # Dates go out as YYYY-MM-DD text, as the importers expect
+                export_frame(self.cleaned_data).to_excel(writer, sheet_name='Student_Data_Cleaned', index=False)
                 
                 # Create a summary sheet
                 self._create_summary_sheet(writer)
@@ -373,33 +821,25 @@ class ExcelDataCleaner:
     
     def _create_summary_sheet(self, writer):
         """Create a summary sheet with statistics"""
-        summary_data = {
-            'Metric': [
-                'Total Rows',
-                'Total Columns',
-                'Required Fields Present',
-                'Optional Fields Present',
-                'Date Created',
-                'Original File',
-                'Cleaning Actions'
-            ],
-            'Value': [
-                len(self.cleaned_data),
-                len(self.cleaned_data.columns),
-                len([col for col in self.cleaned_data.columns if '*' in col]),
-                len([col for col in self.cleaned_data.columns if '*' not in col]),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                self.input_file,
-                'Removed empty columns, duplicates, cleaned data'
-            ]
-        }
-        
-        summary_df = pd.DataFrame(summary_data)
+        summary_rows = self._summary_rows(len(self.cleaned_data), self.cleaned_data.columns)
+        summary_df = pd.DataFrame(summary_rows, columns=['Metric', 'Value'])
         summary_df.to_excel(writer, sheet_name='Summary', index=False)
     
+    def _summary_rows(self, total_rows, columns):
+        """Metric/value pairs for the Summary sheet"""
+        return [
+            ('Total Rows', total_rows),
+            ('Total Columns', len(columns)),
+            ('Required Fields Present', len([col for col in columns if '*' in col])),
+            ('Optional Fields Present', len([col for col in columns if '*' not in col])),
+            ('Date Created', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            ('Original File', self.input_file),
+            ('Cleaning Actions', ', '.join(self.steps))
+        ] + self._step_stats_rows()
+    
     def generate_report(self):
         """Generate a detailed report of the cleaning process"""
-        report_file = 'excel-cleanup-report.txt'
+        report_file = self.report_file
         
         with open(report_file, 'w') as f:
             f.write("EXCEL DATA CLEANUP REPORT\n")
@@ -424,42 +864,322 @@ class ExcelDataCleaner:
                 f.write("Sample Data (first 3 rows):\n")
                 f.write(self.cleaned_data.head(3).to_string())
                 f.write("\n\n")
+            
+            if self.step_stats:
+                f.write("Step Timings:\n")
+                f.write(f"  {'Step':<22}{'Seconds':>10}{'Rows In':>10}{'Rows Out':>10}{'Peak MB':>10}\n")
+                for name, stats in self.step_stats.items():
+                    peak = f"{stats['peak_memory_mb']:.1f}" if stats['peak_memory_mb'] is not None else '-'
+                    f.write(f"  {name:<22}{stats['seconds']:>10.2f}{stats['rows_in']:>10}"
+                            f"{stats['rows_out']:>10}{peak:>10}\n")
+                f.write("\n")
+            
+            if self.chunk_size:
+                f.write(f"Chunked Run ({self.chunk_size} rows per chunk):\n")
+                f.write(f"  Chunks: {self.chunk_stats['chunks']}\n")
+                f.write(f"  Rows In: {self.chunk_stats['rows_in']}\n")
+                f.write(f"  Rows Out: {self.chunk_stats['rows_out']}\n")
+                f.write(f"  Duplicates Removed: {self.chunk_stats['duplicates_removed']}\n\n")
+            
+            if self.incremental_stats:
+                f.write(f"Incremental Run (state: {self.state_file}):\n")
+                for label, count in self.incremental_stats.items():
+                    f.write(f"  {label.title()}: {count}\n")
+                f.write("\n")
+            
+            if self.memory_stats:
+                f.write("Memory (memory_usage(deep=True)):\n")
+                f.write(f"  Before dtype compaction: {format_bytes(self.memory_stats['before'])}\n")
+                f.write(f"  After dtype compaction: {format_bytes(self.memory_stats['after'])}\n\n")
+            
+            if self.validation_issues:
+                issues = pd.concat(self.validation_issues, ignore_index=True)
+                f.write(f"Validation (issues: {self.issues_file}):\n")
+                for line in validation_rules.summarise(issues):
+                    f.write(f"  {line.strip()}\n")
+                f.write(f"  Rows held back: {self.invalid_rows_dropped}\n\n")
+            
+            if self.near_duplicate_summary:
+                f.write("Near-Duplicate Detection:\n")
+                for line in self.near_duplicate_summary:
+                    f.write(f"  {line.strip()}\n")
+                f.write("\n")
         
         logger.info(f"Report saved to {report_file}")
     
-    def run_cleanup(self):
-        """Run the complete cleanup process"""
-        logger.info("Starting Excel data cleanup process...")
-        
-        # Step 1: Load data
-        if not self.load_data():
-            return False
-        
-        # Step 2: Remove empty columns
-        if not self.remove_empty_columns():
-            return False
-        
-        # Step 3: Remove duplicates
-        if not self.remove_duplicates():
-            return False
+    def _iter_input_chunks(self):
+        """Yield the input sheet as DataFrames of at most chunk_size rows.
+
+        Cells are kept as object columns so every chunk has the same dtypes
+        no matter which values happen to fall into it.
+        """
+        if self.input_file.lower().endswith('.csv'):
+            yield from pd.read_csv(self.input_file, chunksize=self.chunk_size, dtype=object)
+            return
         
-        # Step 4: Clean data
-        if not self.clean_data():
-            return False
+        from openpyxl import load_workbook
+        workbook = load_workbook(self.input_file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = self._normalise_header(next(rows, ()))
+            buffer = []
+            positions = []
+            # The index is the row's position below the header, blank rows
+            # included, so row numbers match the sheet across chunks
+            for position, row in enumerate(rows):
+                if all(value is None for value in row):
+                    continue
+                buffer.append(tuple(self._read_excel_value(value) for value in row[:len(header)]))
+                positions.append(position)
+                if len(buffer) >= self.chunk_size:
+                    yield pd.DataFrame(buffer, columns=header, dtype=object, index=pd.Index(positions))
+                    buffer = []
+                    positions = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header, dtype=object, index=pd.Index(positions))
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _read_excel_value(value):
+        """Convert a raw openpyxl cell value the way pd.read_excel would"""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value in NA_STRINGS:
+            return None
+        return value
+    
+    @staticmethod
+    def _normalise_header(header):
+        """Name columns the way pd.read_excel does (Unnamed: n, duplicate.1)"""
+        columns = []
+        seen = {}
+        for i, name in enumerate(header):
+            name = f"Unnamed: {i}" if name is None else str(name)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        return columns
+    
+    def _scan_empty_columns(self):
+        """First pass over the chunks: find columns that are empty in the whole file"""
+        non_empty_counts = None
+        for chunk in self._iter_input_chunks():
+            counts = chunk.count()
+            non_empty_counts = counts if non_empty_counts is None else non_empty_counts.add(counts, fill_value=0)
+        if non_empty_counts is None:
+            return []
+        return non_empty_counts[non_empty_counts == 0].index.tolist()
+    
+    def run_chunked_cleanup(self):
+        """Clean the input chunk by chunk, streaming results to the output file"""
+        logger.info(f"Starting chunked Excel data cleanup ({self.chunk_size} rows per chunk)...")
+        for name in ('near_duplicates', 'incremental_filter'):
+            if name in self.steps:
+                logger.warning(f"Step '{name}' needs the whole sheet and is skipped in chunked mode")
+        chunk_steps = [name for name in self.steps
+                       if name not in self.CHUNK_DRIVER_STEPS and name not in self.WHOLE_SHEET_STEPS]
         
-        # Step 5: Validate data
-        if not self.validate_data():
+        try:
+            empty_columns = []
+            if 'remove_empty_columns' in self.steps:
+                empty_columns = self._scan_empty_columns()
+                if empty_columns:
+                    logger.info(f"Removing {len(empty_columns)} empty columns: {empty_columns}")
+            
+            writer = StreamingTableWriter(self.output_file)
+            for chunk in self._iter_input_chunks():
+                self.chunk_stats['chunks'] += 1
+                self.chunk_stats['rows_in'] += len(chunk)
+                logger.info(f"Processing chunk {self.chunk_stats['chunks']} ({len(chunk)} rows)")
+                
+                self.original_data = chunk.drop(columns=empty_columns)
+                self.cleaned_data = None
+                for name in chunk_steps:
+                    if not self._run_step(name):
+                        return False
+                
+                # Without the clean step the raw chunk is written as-is
+                output = self.cleaned_data if self.cleaned_data is not None else self.original_data
+                writer.write(output)
+                self.chunk_stats['rows_out'] += len(output)
+            
+            writer.close(self._summary_rows(writer.rows_written, writer.columns or []))
+            self._write_validation_issues()
+        except Exception as e:
+            logger.error(f"Error during chunked cleanup: {e}")
             return False
         
-        # Step 6: Save cleaned data
-        if not self.save_cleaned_data():
-            return False
+        # Only the last chunk is still held; drop it so the report shows run totals
+        self.original_data = None
+        self.cleaned_data = None
         
-        # Step 7: Generate report
-        self.generate_report()
+        logger.info(f"Successfully saved cleaned data to {self.output_file}")
+        if 'report' in self.steps:
+            self.generate_report()
         
         logger.info("Excel data cleanup completed successfully!")
         return True
+    
+    def run_cleanup(self):
+        """Run the complete cleanup process"""
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        
+        try:
+            if self.chunk_size:
+                return self.run_chunked_cleanup()
+            
+            logger.info(f"Starting Excel data cleanup process (steps: {', '.join(self.steps)})...")
+            
+            for name in self.steps:
+                if not self._run_step(name):
+                    logger.error(f"Cleanup step '{name}' failed")
+                    return False
+            
+            logger.info("Excel data cleanup completed successfully!")
+            return True
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+# Spreadsheet types picked up by --input-dir
+BATCH_INPUT_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv')
+
+
+def clean_workbook(job):
+    """Clean one workbook inside a batch worker process.
+    
+    Each workbook gets its own log, report, near-duplicate report and output
+    file, so workers never write to the same path. Returns a summary dict.
+    """
+    input_file = job['input_file']
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    output_dir = job['output_dir']
+    
+    # Swap the shared excel-cleanup.log for a per-workbook log and keep the
+    # console for warnings only, so parallel workers don't interleave output
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.FileHandler):
+            root.removeHandler(handler)
+            handler.close()
+        else:
+            handler.setLevel(logging.WARNING)
+    root.addHandler(logging.FileHandler(os.path.join(output_dir, f"{stem}-cleanup.log")))
+    
+    output_ext = job['output_format'] or 'xlsx'
+    
+    summary = {
+        'file': os.path.basename(input_file),
+        'output': os.path.join(output_dir, f"{stem}_cleaned.{output_ext}"),
+        'success': False,
+        'rows_in': 0,
+        'rows_out': 0,
+        'duplicates_removed': 0,
+        'near_duplicate_rows': 0,
+        'seconds': 0.0,
+        'error': '',
+    }
+    started = time.perf_counter()
+    
+    try:
+        cleaner = ExcelDataCleaner(
+            input_file, summary['output'],
+            chunk_size=job['chunk_size'],
+            near_duplicates=job['near_duplicates'],
+            near_duplicate_report=os.path.join(output_dir, f"{stem}-near-duplicates.csv"),
+            steps=job['steps'],
+            skip_steps=job['skip_steps'],
+            trace_memory=job['trace_memory'],
+            report_file=os.path.join(output_dir, f"{stem}-cleanup-report.txt"),
+            issues_file=os.path.join(output_dir, f"{stem}-validation-issues.csv"),
+            drop_invalid=job['drop_invalid'],
+            classes_file=job['classes_file'],
+            date_calendar=job['date_calendar'],
+            # The row hash state sits next to the output: <name>_cleaned.row-hashes.json
+            incremental=job['incremental'],
+        )
+        summary['success'] = bool(cleaner.run_cleanup())
+        
+        if cleaner.chunk_size:
+            summary['rows_in'] = cleaner.chunk_stats['rows_in']
+            summary['rows_out'] = cleaner.chunk_stats['rows_out']
+        else:
+            summary['rows_in'] = cleaner.step_stats.get('load', {}).get('rows_out', 0)
+            summary['rows_out'] = len(cleaner.cleaned_data) if cleaner.cleaned_data is not None else 0
+        summary['duplicates_removed'] = cleaner.chunk_stats['duplicates_removed']
+        summary['near_duplicate_rows'] = cleaner.near_duplicate_rows
+        if not summary['success']:
+            summary['error'] = f"see {stem}-cleanup.log"
+    except Exception as e:
+        logger.error(f"Error cleaning {input_file}: {e}")
+        summary['error'] = str(e)
+    
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def run_batch(input_dir, output_dir=None, workers=None, output_format=None, **cleaner_options):
+    """Clean every workbook in input_dir on a process pool and write a merged summary"""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    output_dir = output_dir or os.path.join(input_dir, 'cleaned')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    inputs = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(BATCH_INPUT_EXTENSIONS) and not name.startswith('~$')
+        and os.path.isfile(os.path.join(input_dir, name))
+    )
+    if not inputs:
+        logger.error(f"No workbooks found in {input_dir}")
+        return False
+    
+    # Output, log and report names come from the file stem, so a.xlsx and a.csv would write the same files
+    by_stem = {}
+    for path in inputs:
+        by_stem.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(os.path.basename(path))
+    clashes = [names for names in by_stem.values() if len(names) > 1]
+    if clashes:
+        logger.error("Workbooks with the same name would overwrite each other's output; rename or move one of: "
+                     + '; '.join(', '.join(names) for names in clashes))
+        return False
+    
+    workers = workers or min(len(inputs), os.cpu_count() or 1)
+    logger.info(f"Cleaning {len(inputs)} workbooks from {input_dir} with {workers} worker processes")
+    
+    jobs = [dict(cleaner_options, input_file=path, output_dir=output_dir, output_format=output_format)
+            for path in inputs]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(clean_workbook, job): job['input_file'] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                result = {'file': os.path.basename(futures[future]), 'success': False, 'error': str(e)}
+            status = '✅' if result.get('success') else '❌'
+            logger.info(f"{status} {result['file']}: {result.get('rows_in', 0)} -> {result.get('rows_out', 0)} rows "
+                        f"({result.get('duplicates_removed', 0)} duplicates) {result.get('error', '')}".rstrip())
+            results.append(result)
+    
+    summary = pd.DataFrame(results).sort_values('file')
+    summary_file = os.path.join(output_dir, 'batch-cleanup-summary.csv')
+    summary.to_csv(summary_file, index=False, encoding='utf-8')
+    
+    failed = int((~summary['success']).sum())
+    logger.info(f"Batch finished: {len(summary) - failed}/{len(summary)} workbooks cleaned, "
+                f"{int(summary['rows_in'].fillna(0).sum())} rows in, {int(summary['rows_out'].fillna(0).sum())} rows out, "
+                f"{int(summary['duplicates_removed'].fillna(0).sum())} duplicates removed")
+    logger.info(f"Batch summary saved to {summary_file}")
+    return failed == 0
+
 
 def main():
     """Main function"""
@@ -470,16 +1190,96 @@ def main():
                        help='Input Excel file (default: Student_Data_Template.xlsx)')
     parser.add_argument('--output', '-o', default='Student_Data_Cleaned.xlsx',
                        help='Output Excel file (default: Student_Data_Cleaned.xlsx)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                       help='Clean N rows at a time with constant memory; output may be .xlsx, .csv or .parquet')
+    parser.add_argument('--near-duplicates', choices=['report', 'merge'], default=None,
+                       help='Detect near-duplicate students; "merge" also folds each cluster into its first row')
+    parser.add_argument('--near-duplicate-report', default='near-duplicates-report.csv',
+                       help='Cluster report CSV (default: near-duplicates-report.csv)')
+    parser.add_argument('--steps', default=None,
+                       help='Comma-separated steps to run, in order (see --list-steps)')
+    parser.add_argument('--skip-steps', default=None,
+                       help='Comma-separated steps to leave out of the pipeline')
+    parser.add_argument('--list-steps', action='store_true',
+                       help='List the registered cleanup steps and exit')
+    parser.add_argument('--no-memory-trace', action='store_true',
+                       help='Do not record peak memory per step (tracemalloc slows large runs)')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only clean rows that are new or changed since the last run; the output is a delta file')
+    parser.add_argument('--state-file', default=None,
+                       help='Row hash state for --incremental (default: <output>.row-hashes.json)')
+    parser.add_argument('--issues-file', default='validation-issues.csv',
+                       help='Validation issues per row, .csv or .json (default: validation-issues.csv)')
+    parser.add_argument('--keep-invalid', action='store_true',
+                       help='Keep rows with validation errors in the output instead of holding them back')
+    parser.add_argument('--classes-file', default=None,
+                       help='classes.sql dump or list of class IDs; Class_ID* values must exist in it')
+    parser.add_argument('--calendar', choices=['auto', 'jalali', 'gregorian'], default='auto',
+                       help='Calendar of date cells; "auto" reads years 1300-1499 as Solar Hijri (default: auto)')
+    parser.add_argument('--input-dir', default=None,
+                       help='Clean every workbook in this directory in parallel (batch mode)')
+    parser.add_argument('--output-dir', default=None,
+                       help='Batch mode output directory (default: <input-dir>/cleaned)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Batch mode worker processes (default: one per CPU)')
+    parser.add_argument('--output-format', choices=['xlsx', 'csv', 'parquet'], default=None,
+                       help='Batch mode output format (default: xlsx)')
     
     args = parser.parse_args()
     
+    if args.list_steps:
+        for name, (_, description) in ExcelDataCleaner.STEP_REGISTRY.items():
+            optional = ' (optional)' if name in ExcelDataCleaner.OPTIONAL_STEPS else ''
+            print(f"{name:<22} {description}{optional}")
+        return
+    
+    steps = args.steps.split(',') if args.steps else None
+    skip_steps = args.skip_steps.split(',') if args.skip_steps else None
+    
+    if args.input_dir:
+        if not os.path.isdir(args.input_dir):
+            logger.error(f"Input directory not found: {args.input_dir}")
+            sys.exit(1)
+        if args.state_file:
+            logger.error("--state-file names one workbook's state; in batch mode each workbook keeps "
+                         "<name>_cleaned.row-hashes.json in the output directory")
+            sys.exit(1)
+        try:
+            # Validate step names once up front rather than in every worker
+            ExcelDataCleaner(steps=steps, skip_steps=skip_steps, near_duplicates=args.near_duplicates,
+                             incremental=args.incremental)
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        success = run_batch(args.input_dir, args.output_dir, args.workers, args.output_format,
+                            chunk_size=args.chunk_size, near_duplicates=args.near_duplicates,
+                            steps=steps, skip_steps=skip_steps, trace_memory=not args.no_memory_trace,
+                            drop_invalid=not args.keep_invalid, classes_file=args.classes_file,
+                            date_calendar=args.calendar, incremental=args.incremental)
+        sys.exit(0 if success else 1)
+    
     # Check if input file exists
     if not os.path.exists(args.input):
         logger.error(f"Input file not found: {args.input}")
         sys.exit(1)
     
     # Create cleaner and run
-    cleaner = ExcelDataCleaner(args.input, args.output)
+    try:
+        cleaner = ExcelDataCleaner(args.input, args.output, chunk_size=args.chunk_size,
+                                   near_duplicates=args.near_duplicates,
+                                   near_duplicate_report=args.near_duplicate_report,
+                                   steps=steps,
+                                   skip_steps=skip_steps,
+                                   trace_memory=not args.no_memory_trace,
+                                   incremental=args.incremental,
+                                   state_file=args.state_file,
+                                   issues_file=args.issues_file,
+                                   drop_invalid=not args.keep_invalid,
+                                   classes_file=args.classes_file,
+                                   date_calendar=args.calendar)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
     success = cleaner.run_cleanup()
     
     if success:
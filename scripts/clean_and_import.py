@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Fused clean -> import for student workbooks.
+
+Runs ExcelDataCleaner and hands its cleaned DataFrame straight to the Excel
+importer's transform and send stages, so the cleaned workbook is never
+written out and read back in between (and dates/ints keep their dtypes).
+Writing Student_Data_Cleaned.xlsx is optional and happens on a background
+thread while the import is running.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import threading
+
+from import_students_from_excel import (
+    API_BASE_URL, LOG_FILE, SCHOOL_ID, commit_row_hashes, import_dataframe, log_print, prepare_dataframe,
+)
+
+
+def load_cleaner_module():
+    """Import clean-excel-data.py, whose hyphenated name rules out a plain import."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clean-excel-data.py')
+    spec = importlib.util.spec_from_file_location('clean_excel_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_background_save(cleaner) -> threading.Thread:
+    """Write the cleaned workbook on a thread; the import does not wait for it."""
+    def save():
+        if cleaner.save_cleaned_data():
+            log_print(f'💾 Cleaned workbook written to {cleaner.output_file}')
+        else:
+            log_print(f'⚠️ Failed to write {cleaner.output_file}; the import is not affected')
+
+    thread = threading.Thread(target=save, name='save-cleaned-workbook', daemon=False)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean a student workbook and import it without an intermediate file')
+    parser.add_argument('--input', '-i', default='Student_Data_Template.xlsx',
+                        help='Input Excel file (default: Student_Data_Template.xlsx)')
+    parser.add_argument('--output', '-o', default='Student_Data_Cleaned.xlsx',
+                        help='Cleaned workbook written in the background (default: Student_Data_Cleaned.xlsx)')
+    parser.add_argument('--no-write', action='store_true',
+                        help='Do not write the cleaned workbook at all')
+    parser.add_argument('--near-duplicates', choices=['report', 'merge'], default=None,
+                        help='Detect near-duplicate students before importing')
+    parser.add_argument('--skip-steps', default=None,
+                        help='Comma-separated cleanup steps to leave out')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only clean and import rows that are new since the last run')
+    parser.add_argument('--log-file', default=LOG_FILE,
+                        help=f'Import log (default: {LOG_FILE})')
+    args = parser.parse_args()
+
+    cleaner_module = load_cleaner_module()
+
+    # The save step is taken out of the pipeline and run separately below
+    skip_steps = ['save'] + (args.skip_steps.split(',') if args.skip_steps else [])
+    try:
+        cleaner = cleaner_module.ExcelDataCleaner(
+            args.input, args.output,
+            near_duplicates=args.near_duplicates,
+            skip_steps=skip_steps,
+            incremental=args.incremental,
+        )
+    except ValueError as e:
+        log_print(f'❌ {e}')
+        sys.exit(1)
+
+    log_print('🚀 Starting fused clean -> import')
+    log_print(f'📁 Input file: {args.input}')
+    log_print(f'🌐 API URL: {API_BASE_URL}')
+    log_print(f'🏫 School ID: {SCHOOL_ID}')
+
+    if not cleaner.run_cleanup():
+        log_print('❌ Cleanup failed; nothing was imported')
+        sys.exit(1)
+
+    save_thread = None
+    if not args.no_write:
+        save_thread = start_background_save(cleaner)
+
+    df = prepare_dataframe(cleaner.cleaned_data)
+    log_print(f'📊 {len(df)} cleaned rows handed to the importer')
+    log_data = import_dataframe(df, args.log_file)
+    commit_row_hashes(log_data, cleaner.state_file)
+
+    if save_thread is not None:
+        save_thread.join()
+
+    sys.exit(0 if log_data['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Memory-compact dtypes for student sheets.
+
+Low-cardinality template columns become categoricals, integer-like columns
+become nullable integers and date columns become real dates (date32 when
+pyarrow is installed). export_frame() turns dates back into YYYY-MM-DD
+strings so written workbooks keep the format the importers expect.
+"""
+
+from typing import Tuple
+
+import pandas as pd
+
+
+# Template columns (Student_Data_Template.xlsx) holding a handful of distinct values
+CATEGORY_COLUMNS = [
+    'Student_Gender*', 'Parent_Gender*', 'Class_ID*', 'Class',
+    'Origin_Province', 'Origin_City', 'Origin_State', 'Origin_Country',
+    'Current_Province', 'Current_City', 'Current_State', 'Current_Country',
+    'Nationality', 'Religion', 'Caste', 'Blood_Group', 'Relationship',
+    'Occupation', 'Education', 'Is_Guardian', 'Is_Emergency_Contact',
+]
+
+INTEGER_COLUMNS = [
+    'Class_ID*', 'Role number', 'Annual_Income', 'Origin_Postal_Code', 'Current_Postal_Code',
+]
+
+DATE_COLUMNS = ['Student_Date_of_Birth*', 'Parent_Birth_Date*', 'Admission_Date*']
+
+# A column only becomes categorical when it repeats values often enough to pay off
+MAX_CATEGORY_RATIO = 0.5
+
+
+def _date_dtype():
+    try:
+        import pyarrow as pa
+        return pd.ArrowDtype(pa.date32())
+    except ImportError:
+        return 'datetime64[s]'
+
+
+def _to_nullable_int(series: pd.Series):
+    """Smallest nullable integer dtype holding the column, or None if not integral."""
+    numbers = pd.to_numeric(series, errors='coerce')
+    if numbers.notna().sum() != series.notna().sum():
+        return None
+    if not (numbers.dropna() % 1 == 0).all():
+        return None
+    if numbers.isna().all():
+        return None
+    bounds = numbers.min(), numbers.max()
+    for dtype, info in (('Int8', 2 ** 7), ('Int16', 2 ** 15), ('Int32', 2 ** 31)):
+        if -info <= bounds[0] and bounds[1] < info:
+            return numbers.astype(dtype)
+    return numbers.astype('Int64')
+
+
+def _to_category(series: pd.Series):
+    if series.isna().all():
+        return None
+    if series.nunique(dropna=True) > max(1, len(series) * MAX_CATEGORY_RATIO):
+        return None
+    return series.astype('category')
+
+
+def compact_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, int, int]:
+    """Return (compacted frame, bytes before, bytes after) using memory_usage(deep=True)."""
+    before = int(df.memory_usage(deep=True).sum())
+    df = df.copy()
+
+    for col in DATE_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            parsed = pd.to_datetime(df[col], errors='coerce', format='%Y-%m-%d')
+            # Leave columns alone when parsing would throw values away
+            if parsed.notna().sum() == df[col].notna().sum():
+                df[col] = parsed.astype(_date_dtype()) if parsed.notna().any() else parsed
+
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            converted = _to_nullable_int(df[col])
+            if converted is not None:
+                df[col] = converted
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and (df[col].dtype == object or pd.api.types.is_string_dtype(df[col])):
+            converted = _to_category(df[col])
+            if converted is not None:
+                df[col] = converted
+
+    after = int(df.memory_usage(deep=True).sum())
+    return df, before, after
+
+
+def export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of `df` with date columns rendered as YYYY-MM-DD strings for writing."""
+    date_columns = [
+        col for col in df.columns
+        if pd.api.types.is_datetime64_any_dtype(df[col])
+        or (isinstance(df[col].dtype, pd.ArrowDtype) and 'date' in str(df[col].dtype))
+    ]
+    if not date_columns:
+        return df
+    df = df.copy()
+    for col in date_columns:
+        df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+    return df
+
+
+def format_bytes(n: int) -> str:
+    return f"{n / (1024 * 1024):.2f} MB"
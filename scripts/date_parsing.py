@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Date normalisation shared by the Excel cleaner and both student importers.
+
+normalise_dates() turns a whole column of mixed cells into YYYY-MM-DD
+strings in one pass:
+
+- datetime/Timestamp cells and ISO strings (with or without a time part)
+- Excel serial day numbers (45170 -> 2023-09-01)
+- year-only cells (2017 -> 2017-01-01)
+- compact YYYYMMDD cells (20230901, or Jalali 14020512)
+- D/M/Y and M/D/Y strings with '/', '.' or '-' separators
+- Persian and Arabic-Indic digits
+- Afghan Solar Hijri (Jalali) dates such as 1402-05-12
+
+Jalali dates are converted with a precomputed table of the Gregorian day
+each Jalali year starts on, so a column converts with array arithmetic
+instead of a calendar calculation per cell.
+"""
+
+import datetime as dt
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Jalali years covered by the lookup table; years in this range are read as
+# Solar Hijri, years from GREGORIAN_MIN_YEAR up as Gregorian
+JALALI_MIN_YEAR = 1300
+JALALI_MAX_YEAR = 1499
+GREGORIAN_MIN_YEAR = 1800
+GREGORIAN_MAX_YEAR = 2199
+
+# Excel serial day numbers for 1927-05-18 .. 2119-01-09; anything else is not a date
+EXCEL_SERIAL_RANGE = (10000, 80000)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+PERSIAN_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+# Y-M-D, D-M-Y or M-D-Y with '-', '/' or '.', optionally followed by a time
+_DATE_PARTS = r'^(\d{1,4})[-/.](\d{1,2})[-/.](\d{1,4})(?:[ T].*)?$'
+
+_BLANKS = ['', 'nan', 'none', 'nat', '<na>', 'null', '0', '0000-00-00', '0000-00-00 00:00:00']
+
+_UNIX_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def _jalali_new_year(jy: int) -> dt.date:
+    """Gregorian date of 1 Farvardin of Jalali year `jy` (Borkowski's algorithm)."""
+    breaks = [-61, 9, 38, 199, 426, 686, 756, 818, 1111, 1181, 1210,
+              1635, 2060, 2097, 2192, 2262, 2324, 2394, 2456, 3178]
+    gy = jy + 621
+    leap_j = -14
+    jp = breaks[0]
+    jump = 0
+    for jm in breaks[1:]:
+        jump = jm - jp
+        if jy < jm:
+            break
+        leap_j += jump // 33 * 8 + (jump % 33) // 4
+        jp = jm
+    n = jy - jp
+    leap_j += n // 33 * 8 + ((n % 33) + 3) // 4
+    if jump % 33 == 4 and jump - n == 4:
+        leap_j += 1
+    leap_g = gy // 4 - ((gy // 100 + 1) * 3) // 4 - 150
+    return dt.date(gy, 3, 20 + leap_j - leap_g)
+
+
+# Days since 1970-01-01 of 1 Farvardin, for JALALI_MIN_YEAR .. JALALI_MAX_YEAR + 1
+_JALALI_YEAR_START = np.array(
+    [_jalali_new_year(jy).toordinal() - _UNIX_ORDINAL for jy in range(JALALI_MIN_YEAR, JALALI_MAX_YEAR + 2)],
+    dtype='int64',
+)
+# Day of the year each Jalali month starts on: six 31-day months, then 30-day months
+_JALALI_MONTH_START = np.array([0, 0, 31, 62, 93, 124, 155, 186, 216, 246, 276, 306, 336], dtype='int64')
+
+
+def jalali_to_gregorian(years, months, days) -> pd.Series:
+    """Vectorised Jalali -> Gregorian; invalid dates (e.g. 1402-12-30) come back as NaT."""
+    years = pd.Series(years, dtype='float64')
+    months = pd.Series(months, dtype='float64').set_axis(years.index)
+    days = pd.Series(days, dtype='float64').set_axis(years.index)
+
+    valid = (years.between(JALALI_MIN_YEAR, JALALI_MAX_YEAR) & months.between(1, 12) & days.ge(1))
+    y = np.where(valid, years, JALALI_MIN_YEAR).astype('int64') - JALALI_MIN_YEAR
+    m = np.where(valid, months, 1).astype('int64')
+    d = np.where(valid, days, 1).astype('int64')
+
+    year_length = _JALALI_YEAR_START[y + 1] - _JALALI_YEAR_START[y]
+    month_length = np.where(m <= 6, 31, np.where(m <= 11, 30, year_length - 336))
+    valid &= d <= month_length
+
+    epoch_days = _JALALI_YEAR_START[y] + _JALALI_MONTH_START[m] + d - 1
+    result = pd.Series(pd.to_datetime(epoch_days, unit='D'), index=years.index)
+    return result.where(valid)
+
+
+def _text(values: pd.Series) -> pd.Series:
+    text = values.astype('string').str.strip().str.translate(PERSIAN_DIGITS)
+    return text.mask(text.str.lower().isin(_BLANKS))
+
+
+def parse_dates(values: pd.Series, calendar: str = 'auto', dayfirst: bool = True) -> pd.Series:
+    """Parse a column of mixed date cells into datetime64 (NaT where unreadable).
+
+    `calendar` is 'auto' (years 1300-1499 are Jalali), 'jalali' or
+    'gregorian'. `dayfirst` decides ambiguous D/M/Y vs M/D/Y strings.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values) or (
+            isinstance(values.dtype, pd.ArrowDtype) and 'date' in str(values.dtype)):
+        return pd.to_datetime(values, errors='coerce').astype('datetime64[ns]')
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if values.empty:
+        return result
+
+    # Real date cells need no parsing (object columns mixing them with text included)
+    is_date = values.map(lambda v: isinstance(v, (dt.date, pd.Timestamp)) and not pd.isna(v)).astype(bool)
+    if is_date.any():
+        result[is_date] = pd.to_datetime(values[is_date].astype(object), errors='coerce')
+
+    text = _text(values.where(~is_date))
+    pending = text.notna()
+
+    # Numbers: year-only cells and Excel serials (2018.0 from float cells included)
+    numeric = pending & text.str.fullmatch(r'\d+(\.0+)?').fillna(False).astype(bool)
+    numbers = pd.to_numeric(text.where(numeric), errors='coerce').astype('float64')
+    is_year = numbers.between(JALALI_MIN_YEAR, GREGORIAN_MAX_YEAR)
+    is_serial = numbers.between(*EXCEL_SERIAL_RANGE)
+    if is_serial.any():
+        result[is_serial] = EXCEL_EPOCH + pd.to_timedelta(numbers[is_serial], unit='D')
+    parts = pd.DataFrame({
+        'y': numbers.where(is_year), 'm': 1.0, 'd': 1.0,
+    }, index=values.index)
+    # Compact YYYYMMDD cells (20230901, Jalali 14020512) are split like three-part strings
+    compact = numeric & ~is_serial & text.str.fullmatch(r'\d{8}(\.0+)?').fillna(False).astype(bool)
+    if compact.any():
+        parts.loc[compact, 'y'] = numbers[compact] // 10000
+        parts.loc[compact, 'm'] = numbers[compact] // 100 % 100
+        parts.loc[compact, 'd'] = numbers[compact] % 100
+        is_year |= compact
+    pending &= ~is_serial
+
+    # Three-part strings
+    split = text.where(pending & ~is_year).str.extract(_DATE_PARTS).astype('float64')
+    has_parts = split.notna().all(axis=1)
+    year_first = has_parts & (split[0] >= 100)
+    year_last = has_parts & ~year_first & (split[2] >= 100)
+    parts.loc[year_first, ['y', 'm', 'd']] = split.loc[year_first, [0, 1, 2]].to_numpy()
+    if year_last.any():
+        first, second = split.loc[year_last, 0], split.loc[year_last, 1]
+        # Day-first unless that gives a month above 12 (and the other order does not)
+        day_first = (dayfirst & (second <= 12)) | (first > 12)
+        parts.loc[year_last, 'y'] = split.loc[year_last, 2]
+        parts.loc[year_last, 'd'] = first.where(day_first, second)
+        parts.loc[year_last, 'm'] = second.where(day_first, first)
+
+    has_year = parts['y'].notna()
+    if calendar == 'jalali':
+        jalali = has_year
+    elif calendar == 'gregorian':
+        jalali = pd.Series(False, index=values.index)
+    else:
+        jalali = has_year & parts['y'].between(JALALI_MIN_YEAR, JALALI_MAX_YEAR)
+
+    if jalali.any():
+        result[jalali] = jalali_to_gregorian(parts.loc[jalali, 'y'], parts.loc[jalali, 'm'], parts.loc[jalali, 'd'])
+
+    gregorian = has_year & ~jalali & parts['y'].between(GREGORIAN_MIN_YEAR, GREGORIAN_MAX_YEAR)
+    if gregorian.any():
+        assembled = pd.DataFrame({
+            'year': parts.loc[gregorian, 'y'], 'month': parts.loc[gregorian, 'm'], 'day': parts.loc[gregorian, 'd'],
+        })
+        result[gregorian] = pd.to_datetime(assembled, errors='coerce')
+
+    # Whatever is left ("16 Feb 2018", "2018-02-16T07:52:09Z", ...) is parsed one by one
+    leftover = pending & ~has_year
+    if leftover.any():
+        result[leftover] = pd.to_datetime(text[leftover], errors='coerce', format='mixed',
+                                          dayfirst=dayfirst).dt.tz_localize(None)
+    return result
+
+
+def normalise_dates(values: pd.Series, calendar: str = 'auto', dayfirst: bool = True) -> pd.Series:
+    """parse_dates() rendered as YYYY-MM-DD strings (NA where unreadable)."""
+    parsed = parse_dates(values, calendar, dayfirst)
+    return parsed.dt.strftime('%Y-%m-%d').astype(object).where(parsed.notna())
+
+
+_ISO_DATE = re.compile(r'^(19|20|21)\d\d-\d\d-\d\d$')
+
+
+def to_iso_date(value, default: Optional[str] = None, calendar: str = 'auto') -> Optional[str]:
+    """Single-value normalise_dates() for row-by-row code; `default` when unreadable."""
+    if value is None or (isinstance(value, str) and value.strip().lower() in _BLANKS):
+        return default
+    if isinstance(value, str) and _ISO_DATE.match(value.strip()):
+        try:
+            dt.date.fromisoformat(value.strip())
+            return value.strip()
+        except ValueError:
+            return default
+    parsed = normalise_dates(pd.Series([value], dtype=object), calendar).iloc[0]
+    return default if pd.isna(parsed) else parsed
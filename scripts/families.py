@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Family grouping for the student importers, so a parent shared by several
+children is created once.
+
+Every key column (parent phone, parent tazkira, folded parent names, ...)
+is a hash index: rows with the same non-blank value are joined. Explicit
+sibling references (e.g. a `brother` column naming another student's ID)
+are joined too. A union-find over all of these gives each row the position
+of the first row of its family, which is the row that creates the parent;
+the other children are sent with that parent's `parentId`.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from transliteration import fold_series
+
+
+class _UnionFind:
+    """Disjoint sets over row positions; the smallest position is always the root."""
+
+    def __init__(self, size: int):
+        self.parent = np.arange(size)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype='int64')
+
+
+def value_key(values: pd.Series) -> pd.Series:
+    """Stripped text; NA for blanks and '0' placeholders."""
+    text = values.astype('string').str.strip()
+    return text.mask(text.str.lower().isin(['', 'nan', 'none', '0']))
+
+
+def phone_key(phones: pd.Series) -> pd.Series:
+    """Last nine digits, so +93 / 0093 / 0 prefixes match; NA for short numbers."""
+    digits = value_key(phones).str.replace(r'\D', '', regex=True)
+    return digits.str[-9:].where(digits.str.len() >= 9)
+
+
+def tazkira_key(numbers: pd.Series, min_digits: int = 7) -> pd.Series:
+    """Tazkira digits; short values (paper tazkira volume or year) are not unique and are ignored."""
+    digits = value_key(numbers).str.replace(r'\D', '', regex=True)
+    return digits.where(digits.str.len() >= min_digits)
+
+
+def name_key(*parts: pd.Series) -> pd.Series:
+    """Folded names joined with '|'; NA unless every part is present."""
+    folded = [value_key(fold_series(part)) for part in parts]
+    key = folded[0]
+    for part in folded[1:]:
+        key = key + '|' + part
+    return key
+
+
+def reference_links(ids: pd.Series, references: pd.Series) -> List[Tuple[int, int]]:
+    """(row, referenced row) position pairs where `references` names another row's ID."""
+    position = pd.Series(np.arange(len(ids)), index=value_key(ids).to_numpy())
+    position = position[position.index.notna() & ~position.index.duplicated()]
+    refs = value_key(references).reset_index(drop=True)
+    targets = refs.map(position).dropna().astype('int64')
+    return [(int(row), int(target)) for row, target in targets.items() if row != target]
+
+
+def family_roots(keys: pd.DataFrame, links: Iterable[Tuple[int, int]] = ()) -> pd.Series:
+    """Position of the first row of each row's family, aligned with `keys`.
+
+    `keys` holds one column per grouping key (NA where unknown); `links`
+    are extra (position, position) pairs that belong to the same family.
+    """
+    uf = _UnionFind(len(keys))
+    positions = pd.Series(np.arange(len(keys)))
+    for column in keys.columns:
+        values = keys[column].reset_index(drop=True)
+        known = values.notna()
+        # Hash index: join every row to the first row holding the same value
+        first = positions[known].groupby(values[known], sort=False).transform('min')
+        for row, root in first[first.index.to_numpy() != first.to_numpy()].items():
+            uf.union(int(row), int(root))
+    for a, b in links:
+        uf.union(a, b)
+    return pd.Series(uf.roots(), index=keys.index)
+
+
+def summarise(roots: pd.Series) -> Dict[str, int]:
+    sizes = roots.value_counts()
+    return {
+        'students': int(len(roots)),
+        'families': int(len(sizes)),
+        'siblingFamilies': int((sizes > 1).sum()),
+        'parentsSaved': int(len(roots) - len(sizes)),
+    }
+
+
+def parent_id_from_response(body: Any) -> Optional[int]:
+    """Parent ID of a created student from the POST /students response body."""
+    if not isinstance(body, dict):
+        return None
+    student = (body.get('data') or {}).get('student') or {}
+    parent_id = student.get('parentId') or (student.get('parent') or {}).get('id')
+    return int(parent_id) if parent_id else None
+
+
+def link_to_parent(payload: Dict[str, Any], parent_id: int) -> Dict[str, Any]:
+    """Payload that attaches the student to an existing parent instead of creating one."""
+    linked = {key: value for key, value in payload.items() if key != 'parent'}
+    linked['parentId'] = parent_id
+    return linked
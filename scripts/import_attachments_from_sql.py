@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Attachment stage of the SQL migration: the `photo` and `files` columns of
+scripts/students.sql are uploaded for the students created by
+import_students_from_sql.py.
+
+- `photo` goes to POST /students/:id/avatar, every name in `files`
+  (comma/semicolon separated or a JSON list) to POST /students/:id/documents.
+- Files are read from PHOTO_DIR / DOCUMENTS_DIR and sent as multipart
+  uploads by UPLOAD_WORKERS threads; each file is opened only while it is
+  being hashed and sent, so memory stays flat however many there are.
+- Every upload is keyed on (student, kind, SHA-256 of the content). Keys
+  already uploaded, in this run or in an earlier one, are skipped.
+- Results are appended to a JSON-lines run log as they finish, so an
+  interrupted run picks up where it stopped when started again.
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import requests
+
+from import_students_from_sql import (API_BASE_URL, AUTH_TOKEN, LOG_FILE as STUDENT_LOG_FILE, SQL_FILE_PATH,
+                                      log_print, read_sql_insert_rows, student_ids_from_log, to_row_dict)
+
+
+# Configuration
+PHOTO_DIR = os.environ.get('PHOTO_DIR', './scripts/photos')
+DOCUMENTS_DIR = os.environ.get('DOCUMENTS_DIR', PHOTO_DIR)
+ATTACHMENT_LOG_FILE = os.environ.get('ATTACHMENT_LOG_FILE', './scripts/import-attachments-from-sql-log.jsonl')
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '8'))
+DOCUMENT_TYPE = os.environ.get('DOCUMENT_TYPE', 'OTHER')
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# kind -> (URL path under /students/:id, multipart field name)
+UPLOAD_TARGETS = {
+    'avatar': ('avatar', 'avatar'),
+    'document': ('documents', 'document'),
+}
+
+UploadKey = Tuple[int, str, str]
+
+
+def split_file_list(value: Optional[str]) -> List[str]:
+    """File names from a `files` cell: a JSON list or names separated by , ; | or newlines."""
+    text = (value or '').strip()
+    if not text or text in ('0', '[]'):
+        return []
+    if text.startswith('['):
+        try:
+            return [str(name).strip() for name in json.loads(text) if str(name).strip()]
+        except ValueError:
+            pass
+    return [name.strip() for name in re.split(r'[,;|\n]', text) if name.strip()]
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def build_jobs(rows: List[Dict[str, Any]], student_ids: Dict[str, int]) -> List[Dict[str, Any]]:
+    """One upload job per referenced file of an imported student."""
+    jobs = []
+    for row in rows:
+        student_id = student_ids.get(str(row.get('id') or '').strip())
+        if not student_id:
+            continue
+        photo = (row.get('photo') or '').strip()
+        if photo and photo != '0':
+            jobs.append({'sqlId': row['id'], 'studentId': student_id, 'kind': 'avatar',
+                         'path': os.path.join(PHOTO_DIR, os.path.basename(photo))})
+        for name in split_file_list(row.get('files')):
+            jobs.append({'sqlId': row['id'], 'studentId': student_id, 'kind': 'document',
+                         'path': os.path.join(DOCUMENTS_DIR, os.path.basename(name))})
+    return jobs
+
+
+def load_uploaded(log_file: str) -> Set[UploadKey]:
+    """Keys of the uploads a previous run already finished."""
+    done: Set[UploadKey] = set()
+    if not os.path.exists(log_file):
+        return done
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if entry.get('success'):
+                done.add((int(entry['studentId']), entry['kind'], entry['sha256']))
+    return done
+
+
+class Uploader:
+    """Hashes and uploads jobs from worker threads, skipping keys already claimed."""
+
+    def __init__(self, uploaded: Set[UploadKey]):
+        self.claimed = set(uploaded)
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        if AUTH_TOKEN:
+            self.session.headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+
+    def claim(self, key: UploadKey) -> bool:
+        with self.lock:
+            if key in self.claimed:
+                return False
+            self.claimed.add(key)
+            return True
+
+    def release(self, key: UploadKey) -> None:
+        with self.lock:
+            self.claimed.discard(key)
+
+    def run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {key: job[key] for key in ('sqlId', 'studentId', 'kind', 'path')}
+        if not os.path.isfile(job['path']):
+            return {**entry, 'success': False, 'skipped': 'missing', 'message': 'file not found'}
+        try:
+            digest = file_digest(job['path'])
+        except OSError as e:
+            # Unreadable (permissions, removed meanwhile); fail this file, not the whole stage
+            return {**entry, 'success': False, 'message': f'read error - {e}'}
+        entry['sha256'] = digest
+        key = (job['studentId'], job['kind'], digest)
+        if not self.claim(key):
+            return {**entry, 'success': None, 'skipped': 'duplicate'}
+
+        url_part, field = UPLOAD_TARGETS[job['kind']]
+        name = os.path.basename(job['path'])
+        mime = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        data = {'documentType': DOCUMENT_TYPE, 'title': name} if job['kind'] == 'document' else None
+        try:
+            with open(job['path'], 'rb') as f:
+                resp = self.session.post(f"{API_BASE_URL}/students/{job['studentId']}/{url_part}",
+                                         files={field: (name, f, mime)}, data=data, timeout=120)
+            ok = resp.status_code in (200, 201)
+            message = None if ok else f'HTTP {resp.status_code} - {resp.text[:200]}'
+        except Exception as e:
+            ok, message = False, str(e)
+        if not ok:
+            # Let a later run retry this file
+            self.release(key)
+        return {**entry, 'success': ok, 'message': message}
+
+
+def run_attachment_stage(rows: List[Dict[str, Any]], student_details: List[Dict[str, Any]],
+                         log_file: str = ATTACHMENT_LOG_FILE) -> Dict[str, Any]:
+    """Upload every photo/document referenced by `rows`; returns the counts."""
+    jobs = build_jobs(rows, student_ids_from_log(student_details))
+    uploaded = load_uploaded(log_file)
+    log_print(f"📎 {len(jobs)} attachments referenced; {len(uploaded)} already uploaded by earlier runs")
+
+    summary = {'total': len(jobs), 'uploaded': 0, 'failed': 0, 'missing': 0, 'duplicate': 0}
+    uploader = Uploader(uploaded)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool, \
+            open(log_file, 'a', encoding='utf-8') as log:
+        futures = [pool.submit(uploader.run, job) for job in jobs]
+        for future in as_completed(futures):
+            entry = future.result()
+            label = f"{entry['kind']} {os.path.basename(entry['path'])} for {entry['sqlId']}"
+            if entry.get('skipped'):
+                summary[entry['skipped']] += 1
+                if entry['skipped'] == 'missing':
+                    log_print(f"⚠️ Missing file: {label}")
+                continue
+            entry['time'] = dt.datetime.now(dt.timezone.utc).isoformat()
+            log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            log.flush()
+            if entry['success']:
+                summary['uploaded'] += 1
+                log_print(f"✅ Uploaded {label}")
+            else:
+                summary['failed'] += 1
+                log_print(f"❌ Upload failed: {label} -> {entry['message']}")
+
+    log_print(f"Attachments done. Uploaded: {summary['uploaded']}, Failed: {summary['failed']}, "
+              f"Missing: {summary['missing']}, Already uploaded: {summary['duplicate']}. Log -> {log_file}")
+    return summary
+
+
+def main():
+    log_print(f"Reading SQL: {SQL_FILE_PATH}")
+    rows = [to_row_dict(values) for values in read_sql_insert_rows(SQL_FILE_PATH)]
+    log_print(f"Reading student import log: {STUDENT_LOG_FILE}")
+    try:
+        with open(STUDENT_LOG_FILE, 'r', encoding='utf-8') as f:
+            student_log = json.load(f)
+    except (OSError, ValueError) as e:
+        log_print(f"❌ Cannot read the student import log ({e}); run import_students_from_sql.py first")
+        return
+    run_attachment_stage(rows, student_log.get('details', []))
+
+
+if __name__ == '__main__':
+    main()
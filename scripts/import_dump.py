@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Load one or more SQL dumps (classes.sql, students.sql or a full mysqldump)
+into the API in dependency order: classes -> students -> fees/attachments.
+
+Every dump is read once; rows are split per table as they stream past.
+Each stage starts as soon as the stages it depends on have finished, so
+independent stages (fees and attachments) run side by side. The server IDs
+a stage creates are kept in memory and handed to the stages after it: the
+students get the real ID of their class instead of a guess from the
+class code's digits.
+
+Usage:
+  python scripts/import_dump.py                                  # ./classes.sql + scripts/students.sql
+  python scripts/import_dump.py backup.sql                       # one full mysqldump
+  python scripts/import_dump.py classes.sql students.sql --stages classes,students
+  python scripts/import_dump.py backup.sql --dry-run             # show the tables and the plan
+"""
+
+import re
+import os
+import json
+import argparse
+import datetime as dt
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Set
+
+import requests
+
+from import_students_from_sql import (API_BASE_URL, AUTH_TOKEN, SCHOOL_ID, SQL_COLUMNS, SQL_FILE_PATH,
+                                      log_print, run_student_stage, student_ids_from_log)
+from sql_dump import iter_insert_rows
+
+
+# Configuration
+CLASSES_FILE_PATH = os.environ.get('CLASSES_FILE', './classes.sql')
+# Sent as createdBy when creating classes (required unless the token is a SUPER_ADMIN's)
+CREATED_BY = int(os.environ.get('CREATED_BY', '1'))
+REMAP_FILE = os.environ.get('DUMP_REMAP_FILE', './scripts/import-dump-remap.json')
+PAGE_SIZE = 100
+
+# Stage -> the dump table it reads and the stages that must finish first
+STAGES = {
+    'classes': {'table': 'classes', 'after': []},
+    'students': {'table': 'students', 'after': ['classes']},
+    'fees': {'table': 'students', 'after': ['students']},
+    'attachments': {'table': 'students', 'after': ['students']},
+}
+DEFAULT_STAGES = ['classes', 'students', 'fees']
+
+ROOM_NUMBER = re.compile(r'^[A-Z0-9\-_]+$')
+CLASS_GENDERS = {'F': 'girls', 'M': 'boys'}
+
+
+def split_tables(paths: List[str], tables: Set[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows of `tables` from every dump as column -> value dicts, in one pass per file."""
+    rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    skipped: Counter = Counter()
+    for path in paths:
+        log_print(f"Reading SQL: {path}")
+        for table, columns, values in iter_insert_rows(path):
+            name = table.lower()
+            if name not in tables:
+                skipped[name] += 1
+                continue
+            if columns is None and name == 'students':
+                columns = SQL_COLUMNS
+            if columns is None:
+                log_print(f"⚠️ {path}: no column list for `{table}`; its rows are skipped")
+                skipped[name] += 1
+                continue
+            rows[name].append(dict(zip(columns, values)))
+    for name, found in rows.items():
+        log_print(f"Found {len(found)} {name} rows")
+    if skipped:
+        log_print(f"Skipped rows of other tables: {dict(skipped)}")
+    return rows
+
+
+def make_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+    if AUTH_TOKEN:
+        session.headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    return session
+
+
+def fetch_class_codes(session: requests.Session) -> Dict[str, int]:
+    """Code -> ID of the classes the school already has, so a re-run reuses them."""
+    codes: Dict[str, int] = {}
+    page, pages = 1, 1
+    while page <= pages:
+        resp = session.get(f"{API_BASE_URL}/classes",
+                           params={'page': page, 'limit': PAGE_SIZE, 'schoolId': SCHOOL_ID}, timeout=60)
+        resp.raise_for_status()
+        body = resp.json()
+        meta = body.get('meta') or {}
+        pages = int(meta.get('totalPages') or (meta.get('pagination') or {}).get('totalPages') or 1)
+        for cls in body.get('data') or []:
+            if cls.get('code') and cls.get('id'):
+                codes[str(cls['code']).upper()] = int(cls['id'])
+        page += 1
+    return codes
+
+
+def to_int(value: Any) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def class_payload(row: Dict[str, Any], enrolled: int) -> Dict[str, Any]:
+    """POST /classes body for a classes.sql row ('Class 10' + 'A' -> code '10A', 'Prep' + 'A' -> 'PREP-A')."""
+    name = str(row.get('class_name') or '').strip()
+    section = re.sub(r'[^A-Z0-9]', '', str(row.get('class_code') or '').upper())
+    digits = re.search(r'\d+', name)
+    if digits:
+        level = int(digits.group())
+        code = f"{level}{section}"
+    else:
+        # Prep/KG sit below grade 1; the API's lowest level is 1
+        level = 1
+        prefix = re.sub(r'[^A-Z0-9]', '', name.upper()) or 'CLASS'
+        code = f"{prefix}-{section}" if section else prefix
+    capacity = max(to_int(row.get('students_amount')), to_int(row.get('enrolled_students')), enrolled)
+    payload = {
+        'name': name,
+        'code': code[:20],
+        'level': min(max(level, 1), 20),
+        'capacity': min(max(capacity, 1), 1000),
+        'schoolId': SCHOOL_ID,
+        'createdBy': CREATED_BY,
+    }
+    if section:
+        payload['section'] = section[:10]
+    room = str(row.get('room_number') or row.get('room_num') or '').strip().upper()
+    if ROOM_NUMBER.match(room):
+        payload['roomNumber'] = room
+    fee = to_int(row.get('class_fee'))
+    if fee:
+        payload['expectedFees'] = fee
+    gender = CLASS_GENDERS.get(str(row.get('students_type') or '').strip().upper())
+    if gender:
+        payload['gender'] = gender
+    return payload
+
+
+def load_classes(tables: Dict[str, List[Dict[str, Any]]], remap: Dict[str, Any]) -> Dict[str, Any]:
+    """Create the dump's classes (or reuse them by code); remap['classes'] maps dump IDs to server IDs."""
+    rows = tables.get('classes') or []
+    enrolled = Counter(str(row.get('class_id') or '') for row in tables.get('students') or [])
+    session = make_session()
+    existing = fetch_class_codes(session)
+    log_print(f"🏫 {len(rows)} classes in the dump; the school already has {len(existing)}")
+
+    summary = {'total': len(rows), 'created': 0, 'reused': 0, 'failed': 0, 'details': []}
+    class_ids: Dict[str, int] = {}
+    for row in rows:
+        dump_id = str(row.get('id') or '')
+        payload = class_payload(row, enrolled[dump_id])
+        label = f"{payload['name']} {payload.get('section', '')} ({dump_id})".replace('  ', ' ')
+        entry = {'sqlId': dump_id, 'code': payload['code']}
+        if payload['code'] in existing:
+            class_ids[dump_id] = existing[payload['code']]
+            summary['reused'] += 1
+            summary['details'].append({**entry, 'success': True, 'classId': class_ids[dump_id], 'reused': True})
+            log_print(f"↩️ Reusing class {payload['code']} for {label}")
+            continue
+        try:
+            resp = session.post(f"{API_BASE_URL}/classes", data=json.dumps(payload), timeout=30)
+            body = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            resp, body = None, {'message': str(e)}
+        class_id = (body.get('data') or {}).get('id') if isinstance(body, dict) else None
+        if resp is not None and resp.status_code in (200, 201) and class_id:
+            class_ids[dump_id] = existing[payload['code']] = int(class_id)
+            summary['created'] += 1
+            summary['details'].append({**entry, 'success': True, 'classId': int(class_id)})
+            log_print(f"✅ Created class {payload['code']} for {label}")
+        else:
+            summary['failed'] += 1
+            msg = body.get('message') if isinstance(body, dict) else body
+            summary['details'].append({**entry, 'success': False, 'message': str(msg)})
+            log_print(f"❌ Class failed: {label} -> {msg}")
+
+    remap['classes'] = class_ids
+    log_print(f"Classes done. Created: {summary['created']}, Reused: {summary['reused']}, "
+              f"Failed: {summary['failed']}")
+    return summary
+
+
+def load_students(tables: Dict[str, List[Dict[str, Any]]], remap: Dict[str, Any]) -> Dict[str, Any]:
+    # Without a classes stage the student importer falls back to guessing from the class code
+    log = run_student_stage(tables.get('students') or [], class_ids=remap.get('classes'))
+    remap['students'] = student_ids_from_log(log['details'])
+    remap['_studentDetails'] = log['details']
+    return log
+
+
+def load_fees(tables: Dict[str, List[Dict[str, Any]]], remap: Dict[str, Any]) -> Dict[str, Any]:
+    from import_finance_from_sql import run_finance_stage
+    return run_finance_stage(tables.get('students') or [], remap.get('_studentDetails') or [])
+
+
+def load_attachments(tables: Dict[str, List[Dict[str, Any]]], remap: Dict[str, Any]) -> Dict[str, Any]:
+    from import_attachments_from_sql import run_attachment_stage
+    return run_attachment_stage(tables.get('students') or [], remap.get('_studentDetails') or [])
+
+
+STAGE_RUNNERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    'classes': load_classes,
+    'students': load_students,
+    'fees': load_fees,
+    'attachments': load_attachments,
+}
+
+
+def run_stages(stages: List[str], tables: Dict[str, List[Dict[str, Any]]],
+               remap: Dict[str, Any]) -> Dict[str, Any]:
+    """Run `stages` as their dependencies finish; a failed stage skips everything after it.
+
+    A dependency that was not selected, or whose table is not in the dumps,
+    counts as done, so e.g. students.sql alone still loads.
+    """
+    results: Dict[str, Any] = {}
+    pending = [stage for stage in stages if tables.get(STAGES[stage]['table'])]
+    for stage in stages:
+        if stage not in pending:
+            results[stage] = {'skipped': f"no `{STAGES[stage]['table']}` rows in the dumps"}
+            log_print(f"⏭️ {stage}: {results[stage]['skipped']}")
+    failed: Set[str] = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(STAGES)) as pool:
+        while pending or running:
+            for stage in list(pending):
+                deps = [dep for dep in STAGES[stage]['after']
+                        if dep in pending or dep in running.values() or dep in failed]
+                if any(dep in failed for dep in deps):
+                    pending.remove(stage)
+                    failed.add(stage)
+                    results[stage] = {'skipped': f"depends on failed stage {', '.join(d for d in deps if d in failed)}"}
+                    log_print(f"⏭️ {stage}: {results[stage]['skipped']}")
+                elif not deps:
+                    pending.remove(stage)
+                    log_print(f"▶️ Stage {stage}")
+                    running[pool.submit(STAGE_RUNNERS[stage], tables, remap)] = stage
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage] = future.result()
+                except Exception as e:
+                    failed.add(stage)
+                    results[stage] = {'error': str(e)}
+                    log_print(f"❌ Stage {stage} failed: {e}")
+    return results
+
+
+def summarise(result: Any) -> Any:
+    """Stage result without the per-row details, for the remap file."""
+    if not isinstance(result, dict):
+        return result
+    return {key: value for key, value in result.items() if key != 'details'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load classes, students and fees from SQL dumps in dependency order')
+    parser.add_argument('dumps', nargs='*', default=[CLASSES_FILE_PATH, SQL_FILE_PATH],
+                        help='SQL dump files (default: classes.sql and students.sql)')
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f"comma-separated stages to run ({', '.join(STAGES)}); default: %(default)s")
+    parser.add_argument('--dry-run', action='store_true', help='read the dumps and show the plan without posting')
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    stages = [stage for stage in STAGES if stage in stages]
+    if 'classes' in stages and not AUTH_TOKEN and not args.dry_run:
+        log_print('❌ AUTH_TOKEN is required to create classes (or leave the classes stage out)')
+        return
+    dumps = [path for path in args.dumps if os.path.exists(path)]
+    for path in set(args.dumps) - set(dumps):
+        log_print(f"⚠️ Dump not found, skipped: {path}")
+
+    tables = split_tables(dumps, {STAGES[stage]['table'] for stage in stages})
+    if args.dry_run:
+        for stage in stages:
+            spec = STAGES[stage]
+            log_print(f"{stage}: {len(tables.get(spec['table']) or [])} {spec['table']} rows"
+                      + (f", after {', '.join(spec['after'])}" if spec['after'] else ''))
+        if tables.get('classes'):
+            enrolled = Counter(str(row.get('class_id') or '') for row in tables.get('students') or [])
+            for row in tables['classes']:
+                payload = class_payload(row, enrolled[str(row.get('id') or '')])
+                log_print(f"  {row.get('id')} -> {payload['code']} (level {payload['level']}, "
+                          f"capacity {payload['capacity']})")
+        return
+
+    remap: Dict[str, Any] = {}
+    started = dt.datetime.now(dt.timezone.utc).isoformat()
+    results = run_stages(stages, tables, remap)
+    with open(REMAP_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'startTime': started,
+            'endTime': dt.datetime.now(dt.timezone.utc).isoformat(),
+            'dumps': dumps,
+            'stages': {stage: summarise(results.get(stage)) for stage in stages},
+            'classes': remap.get('classes', {}),
+            'students': remap.get('students', {}),
+        }, f, indent=2)
+    log_print(f"Done. ID remap -> {REMAP_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Finance stage of the SQL migration: fees, discounts and dues from
+scripts/students.sql become payment records for the students created by
+import_students_from_sql.py.
+
+Run it after the student import (or set MIGRATE_FINANCE=1 on the student
+import to run it straight away). Student IDs are read from the student
+import log, whose details carry the SQL `id` and the created student's ID.
+
+For every student with a fee, the paid part (fee - discount - dues) becomes
+a PAID payment and the outstanding dues an UNPAID payment due on
+`dus_date`. Records are built for the whole dump at once and posted to
+POST /payments concurrently, FINANCE_BATCH_SIZE at a time.
+"""
+
+import json
+import os
+import time
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import pandas as pd
+import requests
+
+from date_parsing import normalise_dates
+from import_students_from_sql import (API_BASE_URL, AUTH_TOKEN, LOG_FILE as STUDENT_LOG_FILE, SQL_FILE_PATH,
+                                      log_print, read_sql_insert_rows, student_ids_from_log, to_row_dict)
+
+
+# Configuration
+FINANCE_LOG_FILE = os.environ.get('FINANCE_LOG_FILE', './scripts/import-finance-from-sql-log.json')
+FINANCE_BATCH_SIZE = int(os.environ.get('FINANCE_BATCH_SIZE', '50'))
+FINANCE_WORKERS = int(os.environ.get('FINANCE_WORKERS', '8'))
+DELAY_BETWEEN_BATCHES_MS = int(os.environ.get('DELAY_MS', '500'))
+PAYMENT_METHOD = os.environ.get('PAYMENT_METHOD', 'CASH')
+
+# Keywords in `fees_type` -> Payment.type; anything else is tuition
+FEE_TYPES = {
+    'transport': 'TRANSPORT_FEE', 'bus': 'TRANSPORT_FEE', 'library': 'LIBRARY_FEE',
+    'lab': 'LABORATORY_FEE', 'sport': 'SPORTS_FEE', 'exam': 'EXAM_FEE',
+    'uniform': 'UNIFORM_FEE', 'meal': 'MEAL_FEE', 'food': 'MEAL_FEE', 'hostel': 'HOSTEL_FEE',
+}
+
+
+def parse_amounts(values: pd.Series) -> pd.Series:
+    """'1,500', '1500 AFN', '1500.50' -> float; blanks and text -> 0."""
+    text = values.astype('string').str.replace(',', '', regex=False)
+    number = text.str.extract(r'(\d+(?:\.\d+)?)', expand=False)
+    return pd.to_numeric(number, errors='coerce').astype('float64').fillna(0.0)
+
+
+def fee_types(values: pd.Series) -> pd.Series:
+    text = values.astype('string').str.lower().fillna('')
+    result = pd.Series('TUITION_FEE', index=values.index, dtype=object)
+    for keyword, fee_type in FEE_TYPES.items():
+        result = result.mask(text.str.contains(keyword, regex=False) & (result == 'TUITION_FEE'), fee_type)
+    return result
+
+
+def build_payment_records(rows: List[Dict[str, Any]], student_ids: Dict[str, int]) -> pd.DataFrame:
+    """One row per payment to create, with the SQL id and student name for logging."""
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return pd.DataFrame()
+    frame['studentId'] = frame['id'].astype('string').str.strip().map(student_ids)
+    fees = parse_amounts(frame['fees'])
+    # A discount written as '10%' is a share of the fee
+    discount_text = frame['discount'].astype('string').fillna('')
+    discount = parse_amounts(discount_text)
+    discount = discount.where(~discount_text.str.contains('%', regex=False), fees * discount / 100)
+    discount = discount.clip(upper=fees)
+    net = fees - discount
+    dues = parse_amounts(frame['dues']).clip(upper=net)
+    paid = net - dues
+
+    base = pd.DataFrame({
+        'sqlId': frame['id'],
+        'name': (frame['name'].fillna('') + ' ' + frame['lastname'].fillna('')).str.strip(),
+        'studentId': frame['studentId'],
+        'type': fee_types(frame['fees_type']),
+        'paymentDate': normalise_dates(frame['created_at']).fillna(dt.date.today().isoformat()),
+        'dueDate': normalise_dates(frame['dus_date']),
+        'fees': fees, 'feesType': frame['fees_type'].fillna(''), 'dues': dues,
+    })
+    has_fee = (fees > 0) & base['studentId'].notna()
+
+    # The discount goes on the paid record, or on the dues record when nothing was paid
+    paid_part = base[has_fee & (paid > 0)].assign(
+        status='PAID', amount=(paid + discount)[has_fee & (paid > 0)],
+        discount=discount[has_fee & (paid > 0)], total=paid[has_fee & (paid > 0)], dueDate=None,
+    )
+    dues_mask = has_fee & (dues > 0)
+    dues_discount = discount.where(paid <= 0, 0.0)
+    dues_part = base[dues_mask].assign(
+        status='UNPAID', amount=(dues + dues_discount)[dues_mask],
+        discount=dues_discount[dues_mask], total=dues[dues_mask],
+    )
+    records = pd.concat([paid_part, dues_part]).sort_index(kind='stable')
+    return records.reset_index(drop=True)
+
+
+def to_payment_payload(record: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {
+        'studentId': int(record['studentId']),
+        'amount': round(float(record['amount']), 2),
+        'discount': round(float(record['discount']), 2),
+        'fine': 0,
+        'total': round(float(record['total']), 2),
+        'paymentDate': record['paymentDate'],
+        'status': record['status'],
+        'method': PAYMENT_METHOD,
+        'type': record['type'],
+        # Payment has no metadata column; createPayment keeps a JSON remarks string as is (max 255 chars)
+        'remarks': json.dumps({
+            'text': f"Migrated from students.sql ({record['sqlId']})",
+            'sqlId': record['sqlId'],
+            'fees': float(record['fees']),
+            'feesType': str(record['feesType'])[:60],
+            'dues': float(record['dues']),
+        }, ensure_ascii=False, separators=(',', ':')),
+    }
+    if isinstance(record.get('dueDate'), str):
+        payload['dueDate'] = record['dueDate']
+    return payload
+
+
+def post_payment(session: requests.Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    url = f"{API_BASE_URL}/payments"
+    resp = session.post(url, data=json.dumps(payload), timeout=30)
+    if resp.status_code == 429:
+        # Try once more after a short wait, as the student import does
+        time.sleep(2)
+        resp = session.post(url, data=json.dumps(payload), timeout=30)
+    try:
+        data = resp.json()
+    except Exception:
+        data = {'success': False, 'message': f'Non-JSON response: {resp.status_code}'}
+    return {'success': resp.status_code in (200, 201) and bool(data.get('success', True)),
+            'data': data, 'status': resp.status_code, 'message': data.get('message')}
+
+
+def run_finance_stage(rows: List[Dict[str, Any]], student_details: List[Dict[str, Any]],
+                      log_file: str = FINANCE_LOG_FILE) -> Dict[str, Any]:
+    """Build and post the payment records for `rows`; returns the log data."""
+    log = {
+        'startTime': dt.datetime.now(dt.timezone.utc).isoformat(),
+        'totalRecords': 0,
+        'successful': 0,
+        'failed': 0,
+        'details': []
+    }
+    student_ids = student_ids_from_log(student_details)
+    records = build_payment_records(rows, student_ids)
+    log['totalRecords'] = len(records)
+    log_print(f"💰 {len(records)} payment records for {len(student_ids)} imported students")
+
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json'})
+    if AUTH_TOKEN:
+        session.headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+
+    items = records.to_dict('records')
+    with ThreadPoolExecutor(max_workers=FINANCE_WORKERS) as pool:
+        for start in range(0, len(items), FINANCE_BATCH_SIZE):
+            batch = items[start:start + FINANCE_BATCH_SIZE]
+            log_print(f"Processing payment batch {start // FINANCE_BATCH_SIZE + 1} ({len(batch)} records)")
+            payloads = [to_payment_payload(record) for record in batch]
+            futures = [pool.submit(post_payment, session, payload) for payload in payloads]
+            for offset, (record, future) in enumerate(zip(batch, futures)):
+                label = f"{record['status']} {record['total']:.2f} for {record['name']} ({record['sqlId']})"
+                entry = {'index': start + offset + 1, 'sqlId': record['sqlId'],
+                         'studentId': int(record['studentId']), 'status': record['status'],
+                         'total': float(record['total'])}
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'success': False, 'message': str(e)}
+                if result.get('success'):
+                    log['successful'] += 1
+                    payment = (result['data'].get('data') or {}) if isinstance(result.get('data'), dict) else {}
+                    log['details'].append({**entry, 'success': True, 'paymentId': payment.get('id')})
+                    log_print(f"✅ Payment: {label}")
+                else:
+                    log['failed'] += 1
+                    msg = result.get('message') or result
+                    log['details'].append({**entry, 'success': False, 'message': str(msg)})
+                    log_print(f"❌ Payment failed: {label} -> {msg}")
+            if start + FINANCE_BATCH_SIZE < len(items):
+                time.sleep(DELAY_BETWEEN_BATCHES_MS / 1000.0)
+
+    log['endTime'] = dt.datetime.now(dt.timezone.utc).isoformat()
+    with open(log_file, 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=2)
+    log_print(f"Finance done. Success: {log['successful']}, Failed: {log['failed']}. Log -> {log_file}")
+    return log
+
+
+def main():
+    log_print(f"Reading SQL: {SQL_FILE_PATH}")
+    rows = [to_row_dict(values) for values in read_sql_insert_rows(SQL_FILE_PATH)]
+    log_print(f"Reading student import log: {STUDENT_LOG_FILE}")
+    try:
+        with open(STUDENT_LOG_FILE, 'r', encoding='utf-8') as f:
+            student_log = json.load(f)
+    except (OSError, ValueError) as e:
+        log_print(f"❌ Cannot read the student import log ({e}); run import_students_from_sql.py first")
+        return
+    run_finance_stage(rows, student_log.get('details', []))
+
+
+if __name__ == '__main__':
+    main()
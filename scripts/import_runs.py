@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Run ledger for the student importers: every student a run creates is
+appended to RUN_LEDGER_DIR/<run id>.jsonl as soon as the server answers,
+with the IDs the server returned, so rollback_import.py can undo the run
+even if the importer stopped half way.
+
+The first line of a ledger describes the run ({"runId", "source",
+"startTime"}); every other line is one created student:
+{"studentId", "userId", "parentId", "parentUserId", "row", "sqlId", "time"}.
+`parentUserId` is only set when the run created that parent (siblings
+linked to it, or parents that already existed, are not the run's to delete).
+"""
+
+import os
+import json
+import threading
+import datetime as dt
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Configuration
+RUN_LEDGER_DIR = os.environ.get('RUN_LEDGER_DIR', './scripts/import-runs')
+
+
+def _to_id(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def created_ids(body: Any, created_parent: bool) -> Dict[str, Optional[int]]:
+    """Student, user and parent IDs from a POST /students response body."""
+    student = ((body.get('data') or {}).get('student') or {}) if isinstance(body, dict) else {}
+    parent = student.get('parent') or {}
+    ids = {
+        'studentId': _to_id(student.get('id')),
+        'userId': _to_id(student.get('userId') or (student.get('user') or {}).get('id')),
+        'parentId': _to_id(student.get('parentId') or parent.get('id')),
+    }
+    if created_parent:
+        ids['parentUserId'] = _to_id(parent.get('userId') or (parent.get('user') or {}).get('id'))
+    return ids
+
+
+class RunLedger:
+    """Append-only record of what one import run created; safe to share between threads."""
+
+    def __init__(self, source: str, prefix: str = 'students', directory: str = RUN_LEDGER_DIR):
+        started = dt.datetime.now(dt.timezone.utc)
+        self.run_id = f"{prefix}-{started.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.run_id}.jsonl")
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._write({'runId': self.run_id, 'source': source, 'startTime': started.isoformat()})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def record(self, ids: Dict[str, Any], **details: Any) -> None:
+        if ids.get('studentId'):
+            self._write({**ids, **details, 'time': dt.datetime.now(dt.timezone.utc).isoformat()})
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def ledger_path(run: str, directory: str = RUN_LEDGER_DIR) -> str:
+    """Ledger file for a run ID (or a path given as is)."""
+    return run if run.endswith('.jsonl') else os.path.join(directory, f"{run}.jsonl")
+
+
+def read_ledger(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Run header and created-student entries of a ledger; a torn last line is ignored."""
+    header: Dict[str, Any] = {}
+    entries: List[Dict[str, Any]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'runId' in entry:
+                header = entry
+            elif entry.get('studentId'):
+                entries.append(entry)
+    return header, entries
+
+
+def list_runs(directory: str = RUN_LEDGER_DIR) -> List[Dict[str, Any]]:
+    """Header and student count of every ledger, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    runs = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.jsonl'):
+            header, entries = read_ledger(os.path.join(directory, name))
+            runs.append({**header, 'students': len(entries), 'path': os.path.join(directory, name)})
+    return sorted(runs, key=lambda run: run.get('startTime', ''))
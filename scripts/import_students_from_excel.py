@@ -2,11 +2,23 @@
 import os
 import json
 import time
+import threading
 import datetime as dt
 from typing import List, Dict, Any, Optional
 import pandas as pd
 import requests
 
+from bulk_load import BULK_OUTPUT, write_bulk_load
+from circuit_breaker import CircuitBreaker, CircuitOpenError, ErrorSignatures, error_signature
+from compact_dtypes import DATE_COLUMNS, compact_frame, format_bytes
+from date_parsing import normalise_dates, to_iso_date
+from families import (family_roots, link_to_parent, name_key, parent_id_from_response, phone_key,
+                      summarise as summarise_families, tazkira_key)
+from import_runs import RunLedger, created_ids
+from retry_queue import RetryQueue, dead_letter_path, is_retryable
+from row_hashes import commit_pending
+from usernames import fill_usernames
+
 
 # Configuration
 API_BASE_URL = os.environ.get('API_BASE_URL', 'https://khwanzay.school/api')
@@ -15,6 +27,10 @@ BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '1'))
 DELAY_BETWEEN_BATCHES_MS = int(os.environ.get('DELAY_MS', '500'))
 EXCEL_FILE_PATH = os.environ.get('EXCEL_FILE', './Student_Data_Cleaned.xlsx')
 LOG_FILE = os.environ.get('LOG_FILE', './import-students-from-excel-log.json')
+# Set LINK_SIBLINGS=0 to create a separate parent for every student
+LINK_SIBLINGS = os.environ.get('LINK_SIBLINGS', '1') != '0'
+# Row hash state of the cleaner's --incremental runs (its --state-file)
+ROW_HASH_STATE = os.environ.get('ROW_HASH_STATE', os.path.splitext(EXCEL_FILE_PATH)[0] + '.row-hashes.json')
 
 
 def log_print(message: str):
@@ -22,22 +38,30 @@ def log_print(message: str):
     print(f"[{timestamp}] {message}")
 
 
+def cell_text(row: pd.Series, column: str) -> str:
+    """Cell value as stripped text; NaN/NA/NaT and 'nan'/'None' strings become ''.
+
+    Date cells (Timestamp or date32 values from compacted frames) are
+    rendered as YYYY-MM-DD and whole-number floats lose their '.0'.
+    """
+    value = row.get(column)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        if pd.isna(value):
+            return ''
+        if isinstance(value, (dt.date, pd.Timestamp)):
+            return value.strftime('%Y-%m-%d')
+        if isinstance(value, float) and value.is_integer():
+            # Phones and IDs read from numeric cells come back as floats
+            return str(int(value))
+    text = str(value).strip()
+    return '' if text.lower() in ('nan', 'none') else text
+
+
 def safe_date(date_str: str, default: str = None) -> str:
-    """Parse date string and return ISO format, or default if invalid."""
-    if not date_str or str(date_str).strip() in ('', 'None', 'nan'):
-        return default or dt.date.today().isoformat()
-    
-    try:
-        # Handle various date formats
-        date_str = str(date_str).strip()
-        if '-' in date_str:
-            parts = date_str.split('-')
-            if len(parts) == 3:
-                year, month, day = parts
-                return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-        return default or dt.date.today().isoformat()
-    except:
-        return default or dt.date.today().isoformat()
+    """Normalise a date (ISO, Jalali, Excel serial, D/M/Y, ...) to ISO, or default if unreadable."""
+    return to_iso_date(date_str, default or dt.date.today().isoformat())
 
 
 def normalize_gender(gender: str) -> str:
@@ -82,63 +106,78 @@ def generate_phone(index: int) -> str:
     return f"+93{700000000 + index}"
 
 
-def generate_username(first_name: str, last_name: str, prefix: str, index: int) -> str:
-    """Generate a unique username."""
-    first = (first_name or '').lower().replace(' ', '_')
-    last = (last_name or '').lower().replace(' ', '_')
-    return f"{prefix}_{first}_{last}_{index}"
+def assign_usernames(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill Student_Username*/Parent_Username* for the whole sheet in one pass.
+
+    Usernames already in the sheet are kept; generated ones are unique across
+    students and parents of the entire file.
+    """
+    taken: set = set()
+    df = df.copy()
+    df['Student_Username*'] = fill_usernames(
+        df.get('Student_Username*'),
+        df.get('Student_First_Name*', pd.Series(index=df.index, dtype=object)),
+        df.get('Student_Last_Name*', pd.Series(index=df.index, dtype=object)),
+        'stu', taken, default_first='student'
+    )
+    df['Parent_Username*'] = fill_usernames(
+        df.get('Parent_Username*'),
+        df.get('Parent_First_Name*', pd.Series(index=df.index, dtype=object)),
+        df.get('Parent_Last_Name*', pd.Series(index=df.index, dtype=object)),
+        'par', taken, default_first='parent'
+    )
+    return df
 
 
 def transform_excel_row_to_api_payload(row: pd.Series, index: int) -> Dict[str, Any]:
     """Transform Excel row to API payload matching the SQL version exactly."""
     
     # Extract student data
-    student_first = str(row.get('Student_First_Name*', '')).strip() or f"Student{index}"
-    student_last = str(row.get('Student_Last_Name*', '')).strip() or f"Last{index}"
+    student_first = cell_text(row, 'Student_First_Name*') or f"Student{index}"
+    student_last = cell_text(row, 'Student_Last_Name*') or f"Last{index}"
     
     # Extract parent data
-    parent_first = str(row.get('Parent_First_Name*', '')).strip() or f"Parent{index}"
-    parent_last = str(row.get('Parent_Last_Name*', '')).strip() or f"ParentLast{index}"
+    parent_first = cell_text(row, 'Parent_First_Name*') or f"Parent{index}"
+    parent_last = cell_text(row, 'Parent_Last_Name*') or f"ParentLast{index}"
     
     # Phone numbers - use provided or generate
-    student_phone = str(row.get('Student_Phone*', '')).strip()
-    if not student_phone or student_phone.lower() in ('nan', 'none', ''):
-        student_phone = generate_phone(index + 1000)
-    
-    parent_phone = str(row.get('Parent_Phone*', '')).strip()
-    if not parent_phone or parent_phone.lower() in ('nan', 'none', ''):
-        parent_phone = generate_phone(index + 50000)
+    student_phone = cell_text(row, 'Student_Phone*') or generate_phone(index + 1000)
+    parent_phone = cell_text(row, 'Parent_Phone*') or generate_phone(index + 50000)
     
     # Gender
-    student_gender = normalize_gender(row.get('Student_Gender*'))
-    parent_gender = normalize_gender(row.get('Parent_Gender*'))
+    student_gender = normalize_gender(cell_text(row, 'Student_Gender*'))
+    parent_gender = normalize_gender(cell_text(row, 'Parent_Gender*'))
     
     # Dates
-    dob = safe_date(str(row.get('Student_Date_of_Birth*', '')), '2010-01-01')
-    parent_birth_date = safe_date(str(row.get('Parent_Birth_Date*', '')), '1980-01-01')
-    admission_date = safe_date(str(row.get('Admission_Date*', '')), dt.date.today().isoformat())
+    dob = safe_date(cell_text(row, 'Student_Date_of_Birth*'), '2010-01-01')
+    parent_birth_date = safe_date(cell_text(row, 'Parent_Birth_Date*'), '1980-01-01')
+    admission_date = safe_date(cell_text(row, 'Admission_Date*'), dt.date.today().isoformat())
     
     # Class ID
-    class_id = extract_trailing_numeric_id(str(row.get('Class_ID*', '')))
+    class_id = extract_trailing_numeric_id(cell_text(row, 'Class_ID*'))
     
     # Address fields
-    origin_province = str(row.get('Origin_Province', '')).strip() or None
-    origin_city = str(row.get('Origin_City', '')).strip() or None
-    origin_address = str(row.get('Origin_Address', '')).strip() or None
+    origin_province = cell_text(row, 'Origin_Province') or None
+    origin_city = cell_text(row, 'Origin_City') or None
+    origin_address = cell_text(row, 'Origin_Address') or None
     
-    current_province = str(row.get('Current_Province', '')).strip() or None
-    current_city = str(row.get('Current_City', '')).strip() or None
-    current_address = str(row.get('Current_Address', '')).strip() or None
-    current_state = str(row.get('Current_State', '')).strip() or None
+    current_province = cell_text(row, 'Current_Province') or None
+    current_city = cell_text(row, 'Current_City') or None
+    current_address = cell_text(row, 'Current_Address') or None
+    current_state = cell_text(row, 'Current_State') or None
     
     # Other fields
-    tazkira_no = str(row.get('Student_Tazkira_No', '')).strip() or None
-    parent_tazkira_no = str(row.get('Parent_Tazkira_No', '')).strip() or None
-    nationality = str(row.get('Nationality', '')).strip() or 'Afghan'
-    religion = str(row.get('Religion', '')).strip() or 'Islam'
-    occupation = str(row.get('Occupation', '')).strip() or None
-    previous_school = str(row.get('Previous_School', '')).strip() or None
-    caste = str(row.get('Caste', '')).strip() or None
+    tazkira_no = cell_text(row, 'Student_Tazkira_No') or None
+    parent_tazkira_no = cell_text(row, 'Parent_Tazkira_No') or None
+    nationality = cell_text(row, 'Nationality') or 'Afghan'
+    religion = cell_text(row, 'Religion') or 'Islam'
+    occupation = cell_text(row, 'Occupation') or None
+    previous_school = cell_text(row, 'Previous_School') or None
+    caste = cell_text(row, 'Caste') or None
+    
+    # Usernames are precomputed for the whole sheet by assign_usernames()
+    student_username = row.get('Student_Username*')
+    parent_username = row.get('Parent_Username*')
     
     # Build payload matching scripts/bulk-import-students-exact.js exactly
     payload: Dict[str, Any] = {
@@ -185,7 +224,7 @@ def transform_excel_row_to_api_payload(row: pd.Series, index: int) -> Dict[str,
             'timezone': 'Asia/Kabul',
             'locale': 'en-AF',
             'tazkiraNo': tazkira_no,
-            'username': generate_username(student_first, student_last, 'stu', index)
+            'username': student_username
         },
 
         'parent': {
@@ -207,7 +246,7 @@ def transform_excel_row_to_api_payload(row: pd.Series, index: int) -> Dict[str,
                 'timezone': 'Asia/Kabul',
                 'locale': 'en-AF',
                 'tazkiraNo': parent_tazkira_no,
-                'username': generate_username(parent_first, parent_last, 'par', index)
+                'username': parent_username
             },
             'occupation': occupation,
             'annualIncome': None,
@@ -225,8 +264,39 @@ def transform_excel_row_to_api_payload(row: pd.Series, index: int) -> Dict[str,
     return payload
 
 
-def send_batch_to_api(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Send batch of student data to API."""
+def group_families(df: pd.DataFrame) -> pd.Series:
+    """Family root position per row: same parent phone, parent tazkira, or parent and family name."""
+    def column(name):
+        return df[name] if name in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+
+    keys = pd.DataFrame({
+        'phone': phone_key(column('Parent_Phone*')),
+        'tazkira': tazkira_key(column('Parent_Tazkira_No')),
+        'name': name_key(column('Parent_First_Name*'), column('Parent_Last_Name*'), column('Student_Last_Name*')),
+    })
+    return family_roots(keys)
+
+
+def send_batch_to_api(payloads: List[Dict[str, Any]], roots: Optional[List[int]] = None,
+                      parent_ids: Optional[Dict[int, int]] = None,
+                      ledger: Optional[RunLedger] = None,
+                      breaker: Optional[CircuitBreaker] = None,
+                      signatures: Optional[ErrorSignatures] = None,
+                      retries: Optional[RetryQueue] = None) -> Dict[str, Any]:
+    """Send batch of student data to API.
+
+    With `roots` (family root per payload), students whose family parent
+    already exists in `parent_ids` are linked to it instead of creating
+    another parent, and newly created parents are recorded there. With a
+    `ledger`, the IDs of every created student are recorded for rollback.
+    With `signatures`, failures are counted per error signature instead of
+    listed one by one in `errors`; a `breaker` stops the batch early
+    (`aborted` and `notAttempted` are set) when the server keeps failing
+    the same way. With `retries`, timeouts, 429 and gateway errors are
+    handed to the retry queue (counted in `retried`), whose `on_result`
+    reports them later.
+    """
+    parent_ids = parent_ids if parent_ids is not None else {}
     headers = {
         'Content-Type': 'application/json',
         'Accept': 'application/json'
@@ -235,10 +305,45 @@ def send_batch_to_api(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
     results = {
         'successful': 0,
         'failed': 0,
+        'retried': 0,
         'errors': []
     }
+
+    def failed(i: int, status: Optional[int], message: str) -> None:
+        results['failed'] += 1
+        error_msg = f"Student {i+1}: " + (f"HTTP {status} - {message}" if status else f"Exception - {message}")
+        if signatures is not None:
+            signature = signatures.add(status, message)
+        else:
+            signature = error_signature(status, message)
+            results['errors'].append(error_msg)
+        if breaker is not None:
+            breaker.record(status, signature)
+        log_print(f"❌ {error_msg}")
+
+    def queue_retry(i: int, payload: Dict[str, Any], root: Optional[int], name: str, reason: str,
+                    response: Optional[requests.Response] = None) -> None:
+        results['retried'] += 1
+        if breaker is not None:
+            breaker.record(response.status_code if response is not None else None,
+                           error_signature(response.status_code if response is not None else None, reason))
+        retries.submit({'method': 'POST', 'url': f"{API_BASE_URL}/students", 'json': payload},
+                       {'kind': 'student', 'name': name, 'root': root, 'createsParent': 'parent' in payload},
+                       error=reason, response=response)
+        log_print(f"🔁 Student {i+1} queued for retry ({reason})")
     
     for i, payload in enumerate(payloads):
+        if breaker is not None:
+            try:
+                breaker.before_request()
+            except CircuitOpenError as e:
+                results['aborted'] = str(e)
+                results['notAttempted'] = len(payloads) - i
+                break
+        root = roots[i] if roots is not None else None
+        if root in parent_ids:
+            payload = link_to_parent(payload, parent_ids[root])
+        name = f"{payload['user'].get('firstName', '')} {payload['user'].get('lastName', '')}".strip()
         try:
             response = requests.post(
                 f"{API_BASE_URL}/students",
@@ -247,20 +352,38 @@ def send_batch_to_api(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
                 timeout=30
             )
             
-            if response.status_code in [200, 201]:
+            if retries is not None and is_retryable(response.status_code):
+                queue_retry(i, payload, root, name, f"HTTP {response.status_code}", response)
+            elif response.status_code in [200, 201]:
                 results['successful'] += 1
+                if breaker is not None:
+                    breaker.record(response.status_code)
                 log_print(f"✅ Student {i+1} created successfully")
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+                if ledger is not None:
+                    ledger.record(created_ids(body, 'parent' in payload), name=name)
+                if root is not None and 'parent' in payload:
+                    # Later siblings attach to this parent; if this row failed, the next one creates it
+                    parent_id = parent_id_from_response(body)
+                    if parent_id:
+                        parent_ids[root] = parent_id
             else:
-                results['failed'] += 1
-                error_msg = f"Student {i+1}: HTTP {response.status_code} - {response.text}"
-                results['errors'].append(error_msg)
-                log_print(f"❌ {error_msg}")
+                try:
+                    message = response.json().get('message') or response.text
+                except (ValueError, AttributeError):
+                    message = response.text
+                failed(i, response.status_code, message)
                 
+        except requests.RequestException as e:
+            if retries is not None:
+                queue_retry(i, payload, root, name, f"{type(e).__name__}: {e}")
+            else:
+                failed(i, None, str(e))
         except Exception as e:
-            results['failed'] += 1
-            error_msg = f"Student {i+1}: Exception - {str(e)}"
-            results['errors'].append(error_msg)
-            log_print(f"❌ {error_msg}")
+            failed(i, None, str(e))
         
         # Small delay between individual requests
         if i < len(payloads) - 1:
@@ -269,36 +392,178 @@ def send_batch_to_api(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
     return results
 
 
-def main():
-    log_print('🚀 Starting Excel student import')
-    log_print(f'📁 Excel file: {EXCEL_FILE_PATH}')
-    log_print(f'🌐 API URL: {API_BASE_URL}')
-    log_print(f'🏫 School ID: {SCHOOL_ID}')
-    log_print(f'📦 Batch size: {BATCH_SIZE}')
-    
-    # Load Excel file
+def bulk_load_dataframe(df: pd.DataFrame, roots: pd.Series, log_data: Dict[str, Any]) -> None:
+    """Write bulk-load files (BULK_OUTPUT) for every row instead of posting them."""
+    payloads = []
+    payload_roots = []
+    for idx, (_, row) in enumerate(df.iterrows()):
+        try:
+            payloads.append(transform_excel_row_to_api_payload(row, idx))
+            payload_roots.append(int(roots.iloc[idx]))
+        except Exception as e:
+            log_print(f'❌ Error transforming row {idx + 1}: {e}')
+            log_data['failed'] += 1
+            log_data['errors'].append(f"Row {idx + 1}: Transform error - {str(e)}")
+    assigned = write_bulk_load(payloads, payload_roots, 'students-from-excel')
+    log_data['successful'] += len(assigned)
+    log_data['bulkOutput'] = BULK_OUTPUT
+    log_data['assignedIds'] = assigned
+
+
+def prepare_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Assign usernames and compact dtypes before rows are transformed."""
+    df = assign_usernames(df)
+    # Whole date columns are parsed at once; safe_date() then only sees ISO dates
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = normalise_dates(df[col])
+    df, mem_before, mem_after = compact_frame(df)
+    log_print(f'🧮 Memory: {format_bytes(mem_before)} -> {format_bytes(mem_after)} after dtype compaction')
+    return df
+
+
+def update_changed_rows(df: pd.DataFrame, log_data: Dict[str, Any], signatures: ErrorSignatures) -> None:
+    """PUT /students/:id with the fields that differ, for delta rows marked 'changed'.
+
+    The students are matched against a server snapshot the way
+    sync_students.py matches them (tazkira, real phone, then names).
+    """
+    from sync_students import fetch_snapshot, make_session, plan_updates
+
+    def failed(name: str, status: Optional[int], message: str) -> None:
+        signatures.add(status, message)
+        log_data['failed'] += 1
+        log_print(f"❌ {name}: " + (f"HTTP {status} - {message}" if status else message))
+
+    session = make_session()
     try:
-        log_print('📖 Reading Excel file...')
-        df = pd.read_excel(EXCEL_FILE_PATH)
-        log_print(f'📊 Loaded {len(df)} rows from Excel file')
-        log_print(f'📋 Columns: {list(df.columns)}')
-    except Exception as e:
-        log_print(f'❌ Failed to load Excel file: {e}')
-        import traceback
-        traceback.print_exc()
+        server_students = fetch_snapshot(session)
+    except (requests.RequestException, ValueError) as e:
+        log_print(f'❌ Could not load the server students to match {len(df)} changed rows: {e}')
+        log_data['failed'] += len(df)
+        log_data['errors'].append(f"Changed rows: snapshot failed - {e}")
         return
+    payloads = [transform_excel_row_to_api_payload(row, idx) for idx, (_, row) in enumerate(df.iterrows())]
+    updates, unmatched = plan_updates(payloads, server_students)
+    for row in unmatched:
+        failed(payloads[row]['user']['displayName'], None, 'changed row matches no student on the server')
+    for update in updates:
+        name = payloads[update['row']]['user']['displayName']
+        if not update['data']:
+            log_data['updated'] += 1
+            log_print(f"✅ {name} already up to date")
+            continue
+        try:
+            response = session.put(f"{API_BASE_URL}/students/{update['id']}", json=update['data'], timeout=30)
+        except requests.RequestException as e:
+            failed(name, None, str(e))
+            continue
+        if response.status_code == 200:
+            log_data['updated'] += 1
+            log_print(f"✅ {name} updated ({', '.join(update['data'])})")
+        else:
+            try:
+                message = response.json().get('message') or response.text
+            except (ValueError, AttributeError):
+                message = response.text
+            failed(name, response.status_code, message)
+        time.sleep(0.1)
+
+
+def make_retry_queue(log_data: Dict[str, Any], lock: threading.Lock, parent_ids: Dict[int, int],
+                     ledger: Optional[RunLedger], signatures: ErrorSignatures) -> RetryQueue:
+    """Retry queue whose late outcomes are added to `log_data` (under `lock`)."""
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+
+    def relink(context: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+        # A sibling may have created the family's parent while this one waited
+        root = context['root']
+        if context['createsParent'] and root in parent_ids:
+            context['createsParent'] = False
+            return {**request, 'json': link_to_parent(request['json'], parent_ids[root])}
+        return request
+
+    def retried(context: Dict[str, Any], response: Optional[requests.Response], error: Optional[str]) -> None:
+        status = response.status_code if response is not None else None
+        if error is None and status in (200, 201):
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if ledger is not None:
+                ledger.record(created_ids(body, context['createsParent']), name=context['name'])
+            if context['root'] is not None and context['createsParent']:
+                parent_id = parent_id_from_response(body)
+                if parent_id:
+                    parent_ids[context['root']] = parent_id
+            with lock:
+                log_data['successful'] += 1
+            log_print(f"✅ {context['name']} created on retry")
+            return
+        try:
+            message = response.json().get('message') or response.text
+        except (ValueError, AttributeError):
+            message = response.text if response is not None else None
+        message = f"Gave up after retries: {message or error}" if error is not None else message
+        signatures.add(status, message)
+        with lock:
+            log_data['failed'] += 1
+        log_print(f"❌ {context['name']}: " + (f"HTTP {status} - {message}" if status else message))
+
+    return RetryQueue(session, dead_letter_path('students-excel'), on_result=retried, prepare=relink, log=log_print)
+
+
+def import_dataframe(df: pd.DataFrame, log_file: str = LOG_FILE) -> Dict[str, Any]:
+    """Transform and send every row of a prepared DataFrame; returns the log data.
+
+    Used by main() for cleaned workbooks and by clean_and_import.py, which
+    hands over the cleaner's DataFrame directly.
+    """
+    # Incremental deltas from the cleaner (--incremental) mark each row;
+    # new rows are created, changed ones are updated on the server
+    changed = df.iloc[0:0]
+    incremental = 'Change_Type' in df.columns
+    if incremental:
+        change_type = df['Change_Type'].astype('string')
+        changed = df[change_type == 'changed'].reset_index(drop=True)
+        df = df[change_type == 'new'].reset_index(drop=True)
+        log_print(f'🔁 Incremental delta: {len(df)} new rows to create, {len(changed)} changed rows to update')
     
     # Initialize logging
     log_data = {
         'startTime': dt.datetime.now(dt.timezone.utc).isoformat(),
-        'totalRecords': len(df),
+        'totalRecords': len(df) + len(changed),
+        'incremental': incremental,
+        'changedRows': len(changed),
+        'updated': 0,
         'successful': 0,
         'failed': 0,
         'errors': []
     }
     
-    # Process in batches
-    total_batches = (len(df) + BATCH_SIZE - 1) // BATCH_SIZE
+    roots = group_families(df) if LINK_SIBLINGS else pd.Series(range(len(df)), index=df.index)
+    log_data['families'] = summarise_families(roots)
+    log_print(f"👪 {log_data['families']['families']} families; "
+              f"{log_data['families']['parentsSaved']} siblings will reuse an existing parent")
+    parent_ids: Dict[int, int] = {}
+    if BULK_OUTPUT:
+        bulk_load_dataframe(df, roots, log_data)
+
+    # Process in batches (none when bulk-load files were written instead)
+    total_batches = 0 if BULK_OUTPUT else (len(df) + BATCH_SIZE - 1) // BATCH_SIZE
+    ledger = None
+    if total_batches:
+        # Every created student is recorded as it happens, for rollback_import.py
+        ledger = RunLedger(EXCEL_FILE_PATH, 'students-excel')
+        log_data['runId'] = ledger.run_id
+        log_print(f'🧾 Run {ledger.run_id}; created IDs -> {ledger.path}')
+    # Server failures are counted per error signature; the same one over and over stops the run
+    breaker = CircuitBreaker(log_print)
+    signatures = ErrorSignatures()
+    # Retried rows finish on the queue's threads, which update log_data too
+    lock = threading.Lock()
+    retries = make_retry_queue(log_data, lock, parent_ids, ledger, signatures) if total_batches else None
     
     for batch_num in range(total_batches):
         start_idx = batch_num * BATCH_SIZE
@@ -309,10 +574,12 @@ def main():
         
         # Transform batch to API payloads
         payloads = []
+        payload_roots = []
         for idx, (_, row) in enumerate(batch_df.iterrows()):
             try:
                 payload = transform_excel_row_to_api_payload(row, start_idx + idx)
                 payloads.append(payload)
+                payload_roots.append(int(roots.iloc[start_idx + idx]))
             except Exception as e:
                 log_print(f'❌ Error transforming row {start_idx + idx + 1}: {e}')
                 log_data['failed'] += 1
@@ -320,16 +587,40 @@ def main():
         
         # Send batch to API
         if payloads:
-            batch_results = send_batch_to_api(payloads)
-            log_data['successful'] += batch_results['successful']
-            log_data['failed'] += batch_results['failed']
-            log_data['errors'].extend(batch_results['errors'])
+            batch_results = send_batch_to_api(payloads, payload_roots, parent_ids, ledger, breaker, signatures,
+                                              retries)
+            with lock:
+                log_data['successful'] += batch_results['successful']
+                log_data['failed'] += batch_results['failed']
+                log_data['errors'].extend(batch_results['errors'])
+            if batch_results.get('aborted'):
+                not_attempted = batch_results['notAttempted'] + len(df) - end_idx
+                log_data['aborted'] = {'reason': batch_results['aborted'], 'notAttempted': not_attempted}
+                log_print(f"⛔ Aborting: {batch_results['aborted']}. {not_attempted} rows not sent; "
+                          f"rerun once the server is fixed")
+                break
         
         # Delay between batches
         if batch_num < total_batches - 1:
             log_print(f'⏳ Waiting {DELAY_BETWEEN_BATCHES_MS}ms before next batch...')
             time.sleep(DELAY_BETWEEN_BATCHES_MS / 1000.0)
     
+    if retries is not None:
+        log_data['retries'] = retries.drain()
+    if ledger is not None:
+        ledger.close()
+    if len(changed):
+        if BULK_OUTPUT or log_data.get('aborted'):
+            log_print(f'⚠️ {len(changed)} changed rows not updated' + (' (bulk-load mode)' if BULK_OUTPUT else ''))
+            log_data['failed'] += len(changed)
+        else:
+            log_print(f'✏️ Updating {len(changed)} changed students...')
+            update_changed_rows(changed, log_data, signatures)
+            log_data['successful'] += log_data['updated']
+    log_data['errorSignatures'] = signatures.summary()
+    for group in log_data['errorSignatures']:
+        log_print(f"   {group['count']} × {group['signature']}")
+
     # Final summary
     log_data['endTime'] = dt.datetime.now(dt.timezone.utc).isoformat()
     log_data['duration'] = (dt.datetime.fromisoformat(log_data['endTime'].replace('Z', '+00:00')) - 
@@ -340,11 +631,55 @@ def main():
     
     # Save log
     try:
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
+        with open(log_file, 'w', encoding='utf-8') as f:
             json.dump(log_data, f, indent=2, ensure_ascii=False)
-        log_print(f'📝 Log saved to: {LOG_FILE}')
+        log_print(f'📝 Log saved to: {log_file}')
     except Exception as e:
         log_print(f'⚠️ Failed to save log: {e}')
+    
+    return log_data
+
+
+def commit_row_hashes(log_data: Dict[str, Any], state_file: str = ROW_HASH_STATE) -> None:
+    """Make the cleaner's pending row hashes the state once an incremental delta imported cleanly.
+
+    Until then the next --incremental clean diffs against the previous state
+    and hands over the same rows again.
+    """
+    if not log_data.get('incremental'):
+        return
+    if log_data['failed'] or log_data.get('aborted') or log_data.get('bulkOutput'):
+        log_print('⚠️ Row hashes not committed: the delta was not fully imported; '
+                  'the next incremental clean resends it')
+        return
+    if commit_pending(state_file):
+        log_print(f'🔐 Row hashes committed to {state_file}')
+    else:
+        log_print(f'⚠️ No pending row hashes next to {state_file}; set ROW_HASH_STATE to the cleaner\'s --state-file')
+
+
+def main():
+    log_print('🚀 Starting Excel student import')
+    log_print(f'📁 Excel file: {EXCEL_FILE_PATH}')
+    log_print(f'🌐 API URL: {API_BASE_URL}')
+    log_print(f'🏫 School ID: {SCHOOL_ID}')
+    log_print(f'📦 Batch size: {BATCH_SIZE}')
+    
+    # Load Excel file
+    try:
+        log_print('📖 Reading Excel file...')
+        df = pd.read_excel(EXCEL_FILE_PATH)
+        log_print(f'📊 Loaded {len(df)} rows from Excel file')
+        df = prepare_dataframe(df)
+        log_print(f'📋 Columns: {list(df.columns)}')
+    except Exception as e:
+        log_print(f'❌ Failed to load Excel file: {e}')
+        import traceback
+        traceback.print_exc()
+        return
+    
+    log_data = import_dataframe(df)
+    commit_row_hashes(log_data)
 
 
 if __name__ == '__main__':
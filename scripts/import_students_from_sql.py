@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
+import argparse
 import re
 import os
 import json
 import time
+import threading
 import datetime as dt
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
+import pandas as pd
 import requests
 
+from bulk_load import BULK_OUTPUT, write_bulk_load
+from circuit_breaker import CircuitBreaker, CircuitOpenError, ErrorSignatures, error_signature
+from date_parsing import normalise_dates, to_iso_date
+from families import (family_roots, link_to_parent, name_key, parent_id_from_response,
+                      reference_links, summarise as summarise_families, value_key)
+from import_runs import RunLedger, created_ids
+from retry_queue import RetryQueue, dead_letter_path, is_retryable, send_request
+from shards import (LEASE_DIR, Lease, LeaseStore, Shard, chunk_rows, job_name, parse_shard, select_shard,
+                    shard_label, worker_id)
+from sql_dump import read_insert_rows
+from usernames import usernames_for_rows
+
 
 # Configuration
 API_BASE_URL = os.environ.get('API_BASE_URL', 'https://khwanzay.school/api')
@@ -17,6 +32,12 @@ BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '1'))
 DELAY_BETWEEN_BATCHES_MS = int(os.environ.get('DELAY_MS', '500'))
 SQL_FILE_PATH = os.environ.get('SQL_FILE', './scripts/students.sql')
 LOG_FILE = os.environ.get('LOG_FILE', './scripts/import-students-from-sql-log.json')
+# Set LINK_SIBLINGS=0 to create a separate parent for every student
+LINK_SIBLINGS = os.environ.get('LINK_SIBLINGS', '1') != '0'
+# Set MIGRATE_FINANCE=1 to run import_finance_from_sql.py right after the students are created
+MIGRATE_FINANCE = os.environ.get('MIGRATE_FINANCE', '0') == '1'
+# Set MIGRATE_ATTACHMENTS=1 to upload photos/files (import_attachments_from_sql.py) afterwards
+MIGRATE_ATTACHMENTS = os.environ.get('MIGRATE_ATTACHMENTS', '0') == '1'
 
 
 # SQL column order from scripts/students.sql `CREATE TABLE students` definition
@@ -37,102 +58,11 @@ def log_print(message: str):
 
 
 def read_sql_insert_rows(sql_path: str) -> List[List[Any]]:
-    """Parse INSERT INTO `students` ... VALUES (...), (...); into list of row value lists.
-    Robustly handles quoted strings, escaped quotes, NULL, and numbers.
-    """
-    with open(sql_path, 'r', encoding='utf-8') as f:
-        sql = f.read()
-
-    # Find all INSERT statements for students
-    inserts = re.findall(r"INSERT\s+INTO\s+`?students`?\s*\([^)]*\)\s*VALUES\s*(.*?);", sql, flags=re.IGNORECASE | re.DOTALL)
-    if not inserts:
+    """Parse INSERT INTO `students` ... VALUES (...), (...); into list of row value lists."""
+    rows = read_insert_rows(sql_path, 'students')
+    if not rows:
         log_print('No INSERT statements found for `students`.')
-        return []
-
-    tuples_blob = ' '.join(inserts)
-
-    # Split top-level tuples: (...),(...)
-    rows: List[str] = []
-    depth = 0
-    token = []
-    in_string = False
-    escape = False
-    quote_char = ''
-    for ch in tuples_blob:
-        if in_string:
-            token.append(ch)
-            if escape:
-                escape = False
-            elif ch == '\\':
-                escape = True
-            elif ch == quote_char:
-                in_string = False
-            continue
-        if ch in ("'", '"'):
-            in_string = True
-            quote_char = ch
-            token.append(ch)
-            continue
-        if ch == '(':
-            depth += 1
-            token.append(ch)
-            continue
-        if ch == ')':
-            depth -= 1
-            token.append(ch)
-            if depth == 0:
-                rows.append(''.join(token).strip())
-                token = []
-            continue
-        if depth > 0:
-            token.append(ch)
-
-    # Parse each tuple into list of values
-    def parse_tuple(t: str) -> List[Any]:
-        assert t[0] == '(' and t[-1] == ')'
-        inner = t[1:-1]
-        vals: List[str] = []
-        buf: List[str] = []
-        in_str = False
-        esc = False
-        q = ''
-        for c in inner:
-            if in_str:
-                buf.append(c)
-                if esc:
-                    esc = False
-                elif c == '\\':
-                    esc = True
-                elif c == q:
-                    in_str = False
-                continue
-            if c in ("'", '"'):
-                in_str = True
-                q = c
-                buf.append(c)
-                continue
-            if c == ',' and not in_str:
-                vals.append(''.join(buf).strip())
-                buf = []
-            else:
-                buf.append(c)
-        if buf:
-            vals.append(''.join(buf).strip())
-
-        def normalize(v: str) -> Any:
-            if v.upper() == 'NULL':
-                return None
-            if len(v) >= 2 and v[0] in ("'", '"') and v[-1] == v[0]:
-                s = v[1:-1]
-                s = s.replace('\\"', '"').replace("\\'", "'")
-                return s
-            # numbers (keep as string if leading zeros important; here safe to keep string for dates etc.)
-            return v if re.search(r"[^0-9.-]", v) else (int(v) if re.fullmatch(r"-?\d+", v) else float(v))
-
-        return [normalize(v) for v in vals]
-
-    parsed_rows = [parse_tuple(r) for r in rows]
-    return parsed_rows
+    return rows
 
 
 def to_row_dict(values: List[Any]) -> Dict[str, Any]:
@@ -152,14 +82,16 @@ def normalize_gender(g: Optional[str]) -> Optional[str]:
 
 
 def safe_date(s: Optional[str], default: str) -> str:
-    if not s or s in ('0000-00-00', '0'):
-        return default
-    try:
-        # Validate format
-        dt.datetime.strptime(s, '%Y-%m-%d')
-        return s
-    except Exception:
-        return default
+    """Normalise a dump date (ISO, Jalali, D/M/Y, ...) to YYYY-MM-DD, or `default`."""
+    return to_iso_date(s, default)
+
+
+def normalise_row_dates(rows: List[Dict[str, Any]]) -> None:
+    """Normalise the date columns of every row in place, one vectorised pass per column."""
+    for field in ('dob', 'created_at'):
+        dates = normalise_dates(pd.Series([row.get(field) for row in rows], dtype=object))
+        for row, value in zip(rows, dates):
+            row[field] = None if pd.isna(value) else value
 
 
 def generate_phone(seed: int) -> str:
@@ -167,10 +99,32 @@ def generate_phone(seed: int) -> str:
     return f"+93{base}"
 
 
-def generate_username(first: str, last: str, suffix: str, seed: int) -> str:
-    f = (first or 'user').strip().lower().replace(' ', '_')
-    l = (last or 'user').strip().lower().replace(' ', '_')
-    return f"{f}_{l}_{suffix}_{seed % 10000:04d}"
+def assign_usernames(rows: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Build (student, parent) usernames for every row, unique across the dump."""
+    taken: set = set()
+    students = usernames_for_rows(
+        [r.get('name') for r in rows], [r.get('lastname') for r in rows], 'stu', taken,
+        default_first='student'
+    )
+    parents = usernames_for_rows(
+        [r.get('father_name') for r in rows], [r.get('grandfather_name') for r in rows], 'par', taken,
+        default_first='parent'
+    )
+    return list(zip(students, parents))
+
+
+def group_families(rows: List[Dict[str, Any]]) -> pd.Series:
+    """Family root position per row.
+
+    Siblings share father, grandfather and family name, or a non-zero
+    mother_id; a `brother` value naming another student's ID links the two.
+    """
+    frame = pd.DataFrame(rows, columns=SQL_COLUMNS)
+    keys = pd.DataFrame({
+        'father': name_key(frame['father_name'], frame['grandfather_name'], frame['lastname']),
+        'mother': value_key(frame['mother_id']),
+    })
+    return family_roots(keys, reference_links(frame['id'], frame['brother']))
 
 
 def extract_trailing_numeric_id(value: Optional[str]) -> Optional[int]:
@@ -190,7 +144,9 @@ def extract_trailing_numeric_id(value: Optional[str]) -> Optional[int]:
         return None
 
 
-def map_sql_row_to_api(row: Dict[str, Any], index: int) -> Dict[str, Any]:
+def map_sql_row_to_api(row: Dict[str, Any], index: int,
+                       usernames: Optional[Tuple[str, str]] = None,
+                       class_ids: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
     # Derive fields
     student_first = (row.get('name') or '').strip() or 'Student'
     student_last = (row.get('lastname') or '').strip() or 'User'
@@ -209,12 +165,19 @@ def map_sql_row_to_api(row: Dict[str, Any], index: int) -> Dict[str, Any]:
 
     # Map class_id code to numeric id by taking trailing digits (last 2-3 or more -> natural int)
     class_id_raw = (row.get('class_id') or '').strip()
-    class_id = extract_trailing_numeric_id(class_id_raw)
+    if class_ids is not None:
+        # Classes created from the same dump: use the server ID they were given
+        class_id = class_ids.get(class_id_raw)
+    else:
+        class_id = extract_trailing_numeric_id(class_id_raw)
 
     current_address = (row.get('current_Address') or '').strip() or None
     current_city = (row.get('district') or '').strip() or None
     current_province = (row.get('province') or '').strip() or None
 
+    # Usernames should be precomputed for the whole dump via assign_usernames()
+    student_username, parent_username = usernames or assign_usernames([row])[0]
+
     # Build payload matching scripts/bulk-import-students-exact.js
     payload: Dict[str, Any] = {
         'schoolId': SCHOOL_ID,
@@ -260,7 +223,7 @@ def map_sql_row_to_api(row: Dict[str, Any], index: int) -> Dict[str, Any]:
             'timezone': 'Asia/Kabul',
             'locale': 'en-AF',
             'tazkiraNo': str(row.get('tazkira_num') or '') or None,
-            'username': generate_username(student_first, student_last, 'stu', index)
+            'username': student_username
         },
 
         'parent': {
@@ -282,7 +245,7 @@ def map_sql_row_to_api(row: Dict[str, Any], index: int) -> Dict[str, Any]:
                 'timezone': 'Asia/Kabul',
                 'locale': 'en-AF',
                 'tazkiraNo': None,
-                'username': generate_username(parent_first, parent_last, 'par', index)
+                'username': parent_username
             },
             'occupation': row.get('father_job') or None,
             'annualIncome': None,
@@ -300,76 +263,289 @@ def map_sql_row_to_api(row: Dict[str, Any], index: int) -> Dict[str, Any]:
     return payload
 
 
-def post_student(payload: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"{API_BASE_URL}/students"
-    headers = {
-        'Content-Type': 'application/json'
-    }
-    resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+def student_result(resp: requests.Response) -> Dict[str, Any]:
+    """Outcome of a POST /students response."""
     try:
         data = resp.json()
     except Exception:
         data = {'success': False, 'message': f'Non-JSON response: {resp.status_code}'}
-    if resp.status_code == 429:
-        return {'success': False, 'retry': True, 'message': data.get('message', 'rate limited')}
     return {'success': bool(data.get('success')), 'data': data, 'status': resp.status_code, 'message': data.get('message')}
 
 
-def main():
-    # AUTH_TOKEN no longer required since authentication was removed from student creation
-    log_print('🔓 No authentication required for student creation')
+def student_id_from_response(body: Any) -> Optional[int]:
+    """Server ID of the created student from the POST /students response body."""
+    if not isinstance(body, dict):
+        return None
+    student_id = ((body.get('data') or {}).get('student') or {}).get('id')
+    return int(student_id) if student_id else None
+
+
+def student_ids_from_log(details: List[Dict[str, Any]]) -> Dict[str, int]:
+    """SQL id -> created student ID, from the details of a student import log."""
+    return {
+        str(entry['sqlId']): int(entry['studentId'])
+        for entry in details
+        if entry.get('success') and entry.get('sqlId') and entry.get('studentId')
+    }
+
+
+def run_student_stage(rows: List[Dict[str, Any]], class_ids: Optional[Dict[str, int]] = None,
+                      log_file: str = LOG_FILE, shard: Optional[Shard] = None,
+                      lease_dir: str = '') -> Dict[str, Any]:
+    """Create the students of `rows` (SQL row dicts); returns the log data.
 
+    `class_ids` maps the dump's class_id codes to server class IDs (see
+    import_dump.py); without it the ID is guessed from the code's digits.
+    With `shard` only that shard's families are created; with `lease_dir`
+    the rows are claimed chunk by chunk from the other workers (shards.py).
+    """
     log = {
         'startTime': dt.datetime.now(dt.timezone.utc).isoformat(),
-        'totalRows': 0,
+        'totalRows': len(rows),
         'successful': 0,
         'failed': 0,
         'details': []
     }
-
-    log_print(f"Reading SQL: {SQL_FILE_PATH}")
-    parsed = read_sql_insert_rows(SQL_FILE_PATH)
-    log['totalRows'] = len(parsed)
-    log_print(f"Found {len(parsed)} rows in SQL dump")
-
-    for i in range(0, len(parsed), BATCH_SIZE):
-        batch = parsed[i:i+BATCH_SIZE]
-        log_print(f"Processing batch {i//BATCH_SIZE + 1} ({len(batch)} students)")
-        for j, values in enumerate(batch):
-            idx = i + j
+    usernames = assign_usernames(rows)
+    normalise_row_dates(rows)
+
+    roots = group_families(rows) if LINK_SIBLINGS else pd.Series(range(len(rows)))
+    log['families'] = summarise_families(roots)
+    log_print(f"👪 {log['families']['families']} families; "
+              f"{log['families']['parentsSaved']} siblings will reuse an existing parent")
+    parent_ids: Dict[int, int] = {}
+
+    if BULK_OUTPUT:
+        # Write bulk-load files instead of posting; the log records the pre-assigned IDs
+        payloads = [map_sql_row_to_api(row, idx, usernames[idx], class_ids) for idx, row in enumerate(rows)]
+        assigned = write_bulk_load(payloads, roots.tolist(), 'students-from-sql')
+        for idx, (row, payload, ids) in enumerate(zip(rows, payloads, assigned)):
+            student_name = f"{payload['user']['firstName']} {payload['user']['lastName']}".strip()
+            log['details'].append({'index': idx+1, 'name': student_name, 'success': True,
+                                   'sqlId': row.get('id'), **ids})
+        log['successful'] = len(assigned)
+        log['bulkOutput'] = BULK_OUTPUT
+        log['endTime'] = dt.datetime.now(dt.timezone.utc).isoformat()
+        with open(log_file, 'w', encoding='utf-8') as f:
+            json.dump(log, f, indent=2)
+        log_print(f"Log -> {log_file}. Load the files first; the finance and attachment stages "
+                  f"read the student IDs from this log")
+        return log
+
+    # Several processes may share this dump: only this shard's rows, claimed chunk by chunk
+    keys = [str(row.get('id') or f"row-{idx+1}") for idx, row in enumerate(rows)]
+    root_list = roots.tolist()
+    selected = select_shard(keys, root_list, shard) if shard else list(range(len(rows)))
+    if shard:
+        log['shard'] = {'shard': f"{shard[0]}/{shard[1]}", 'rows': len(selected)}
+        log_print(f"🧩 Shard {shard[0]}/{shard[1]}: {len(selected)} of {len(rows)} rows")
+    store = None
+    if lease_dir:
+        chunks = chunk_rows(selected, root_list)
+        chunk_of = {idx: chunk for chunk, positions in chunks.items() for idx in positions}
+        store = LeaseStore(os.path.join(lease_dir, job_name('students', keys, shard)), chunks, log_print)
+        log['leases'] = {'directory': store.directory, 'owner': store.owner, 'chunks': [], 'alreadyCreated': 0}
+        log_print(f"🔐 Claiming {len(store.chunks)} chunks from {store.directory} as {store.owner}")
+    # Each process gets its own ledger and dead-letter file
+    run_name = '-'.join(part for part in ('students-sql', shard_label(shard), store and store.owner) if part)
+
+    # Every created student is recorded as it happens, for rollback_import.py
+    ledger = RunLedger(SQL_FILE_PATH, run_name)
+    log['runId'] = ledger.run_id
+    log_print(f"🧾 Run {ledger.run_id}; created IDs -> {ledger.path}")
+
+    # Same server error over and over: pause, probe, and stop early instead of sending every row
+    breaker = CircuitBreaker(log_print)
+    errors = ErrorSignatures()
+    # Retries and the main loop both record outcomes
+    lock = threading.Lock()
+
+    def created(idx: int, creates_parent: bool, root: int, student_name: str, body: Any) -> None:
+        row = rows[idx]
+        if store is not None:
+            # Whoever takes the chunk over skips this row and links its siblings to the same parent
+            lease = store.held.get(chunk_of[idx])
+            if lease is not None:
+                lease.mark(keys[idx], parent_id_from_response(body))
+        with lock:
+            log['successful'] += 1
+            ledger.record(created_ids(body, creates_parent), row=idx+1, sqlId=row.get('id'))
+            # sqlId/studentId let later stages (finance) find the created student
+            log['details'].append({'index': idx+1, 'name': student_name, 'success': True,
+                                   'sqlId': row.get('id'), 'studentId': student_id_from_response(body)})
+            if creates_parent:
+                # Later siblings attach to this parent; if this row failed, the next one creates it
+                parent_id = parent_id_from_response(body)
+                if parent_id:
+                    parent_ids[root] = parent_id
+        log_print(f"✅ Created: {student_name}")
+
+    def not_created(idx: int, student_name: Optional[str], status: Optional[int], msg: Any) -> str:
+        with lock:
+            signature = errors.add(status, msg, row=idx+1)
+            log['failed'] += 1
+            # The message is kept once per signature in errorSignatures
+            log['details'].append({'index': idx+1, 'name': student_name, 'success': False,
+                                   'sqlId': rows[idx].get('id'), 'signature': signature})
+        log_print(f"❌ Failed: {student_name or f'row {idx+1}'} -> {msg}")
+        return signature
+
+    def relink(context: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+        # A sibling may have created the family's parent while this one waited
+        root = context['root']
+        if context['createsParent'] and root in parent_ids:
+            context['createsParent'] = False
+            return {**request, 'json': link_to_parent(request['json'], parent_ids[root])}
+        return request
+
+    def retried(context: Dict[str, Any], response: Optional[requests.Response], error: Optional[str]) -> None:
+        idx = context['row'] - 1
+        try:
+            record_retry(idx, context, response, error)
+        finally:
+            if store is not None and 'chunk' in context:
+                store.held[context['chunk']].retried()
+
+    def record_retry(idx: int, context: Dict[str, Any], response: Optional[requests.Response],
+                     error: Optional[str]) -> None:
+        if error is not None:
+            # Dead-lettered; `retry_queue.py --replay` sends it again later
+            if response is not None:
+                status, msg = response.status_code, student_result(response)['message'] or error
+            else:
+                status, msg = None, error
+            not_created(idx, context['name'], status, f"Gave up after retries: {msg}")
+            return
+        result = student_result(response)
+        if result['success']:
+            created(idx, context['createsParent'], context['root'], context['name'], result['data'])
+        else:
+            not_created(idx, context['name'], result['status'], result.get('message') or result)
+
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json'})
+    retries = RetryQueue(session, dead_letter_path(run_name), on_result=retried, prepare=relink, log=log_print)
+
+    def claimed_rows() -> Iterator[Tuple[int, Optional[Lease]]]:
+        if store is None:
+            yield from ((idx, None) for idx in selected)
+            return
+        for lease in store.claim_all():
+            log['leases']['chunks'].append(lease.chunk)
+            log['leases']['alreadyCreated'] += len(lease.created)
+            log_print(f"📥 Chunk {lease.chunk}: {len(lease.rows)} rows"
+                      + (f", {len(lease.created)} already created" if lease.created else ''))
+            for idx in lease.rows:
+                if keys[idx] in lease.created and lease.created[keys[idx]]:
+                    parent_ids.setdefault(root_list[idx], lease.created[keys[idx]])
+            for idx in lease.rows:
+                if lease.lost:
+                    break
+                if keys[idx] not in lease.created:
+                    yield idx, lease
+            # Done once its queued retries are through too
+            lease.finish()
+
+    attempted = 0
+    try:
+        for n, (idx, lease) in enumerate(claimed_rows()):
+            if n % BATCH_SIZE == 0:
+                if n:
+                    time.sleep(DELAY_BETWEEN_BATCHES_MS / 500.0)
+                log_print(f"Processing batch {n//BATCH_SIZE + 1}")
+            breaker.before_request()
+            attempted += 1
+            row = rows[idx]
+            student_name = None
             try:
-                row = to_row_dict(values)
-                payload = map_sql_row_to_api(row, idx)
+                payload = map_sql_row_to_api(row, idx, usernames[idx], class_ids)
+                root = int(roots.iloc[idx])
+                if root in parent_ids:
+                    payload = link_to_parent(payload, parent_ids[root])
                 student_name = f"{payload['user']['firstName']} {payload['user']['lastName']}".strip()
                 log_print(f"Creating student {idx+1}: {student_name}")
-                result = post_student(payload)
-                if result.get('retry'):
-                    # Try once more after a short wait
-                    log_print("Retrying after 2s due to 429...")
-                    time.sleep(2)
-                    result = post_student(payload)
-                if result.get('success'):
-                    log['successful'] += 1
-                    log['details'].append({'index': idx+1, 'name': student_name, 'success': True})
-                    log_print(f"✅ Created: {student_name}")
+                request = {'method': 'POST', 'url': f"{API_BASE_URL}/students", 'json': payload}
+                response, error = send_request(session, request)
+                status = response.status_code if response is not None else None
+                if is_retryable(status):
+                    # Timeouts, resets, 429 and gateway errors are retried in the background
+                    reason = error or f"HTTP {status}"
+                    breaker.record(status, error_signature(status, reason))
+                    context = {'kind': 'student', 'row': idx+1, 'sqlId': row.get('id'),
+                               'name': student_name, 'root': root, 'createsParent': 'parent' in payload}
+                    if lease is not None:
+                        context['chunk'] = lease.chunk
+                        lease.retrying()
+                    retries.submit(request, context, error=reason, response=response)
+                    log_print(f"🔁 Queued for retry: {student_name} ({reason})")
                 else:
-                    log['failed'] += 1
-                    msg = result.get('message') or result
-                    log['details'].append({'index': idx+1, 'name': student_name, 'success': False, 'message': str(msg)})
-                    log_print(f"❌ Failed: {student_name} -> {msg}")
+                    result = student_result(response)
+                    if result['success']:
+                        breaker.record(status)
+                        created(idx, 'parent' in payload, root, student_name, result['data'])
+                    else:
+                        signature = not_created(idx, student_name, status, result.get('message') or result)
+                        breaker.record(status, signature)
                 time.sleep(0.2)
             except Exception as e:
-                log['failed'] += 1
-                log['details'].append({'index': idx+1, 'success': False, 'error': str(e)})
-                log_print(f"❌ Error on row {idx+1}: {e}")
-
-        if i + BATCH_SIZE < len(parsed):
-            time.sleep(DELAY_BETWEEN_BATCHES_MS / 500.0)
-
+                not_created(idx, student_name, None, f"{type(e).__name__}: {e}")
+    except CircuitOpenError as e:
+        if store is None:
+            not_sent = f"{len(selected) - attempted} rows not sent"
+            log['aborted'] = {'reason': str(e), 'notAttempted': len(selected) - attempted}
+        else:
+            not_sent = f"chunks {sorted(store.held)} handed back to the other workers"
+            log['aborted'] = {'reason': str(e), 'releasedChunks': sorted(store.held)}
+        log_print(f"⛔ Aborting: {e}. {not_sent}; rerun once the server is fixed")
+    log['retries'] = retries.drain()
+    if store is not None:
+        # Chunks still held after an abort are given back unfinished
+        for lease in list(store.held.values()):
+            store.release(lease)
+        store.close()
+
+    log['errorSignatures'] = errors.summary()
+    for group in log['errorSignatures']:
+        log_print(f"   {group['count']} × {group['signature']}")
+    ledger.close()
     log['endTime'] = dt.datetime.now(dt.timezone.utc).isoformat()
-    with open(LOG_FILE, 'w', encoding='utf-8') as f:
+    with open(log_file, 'w', encoding='utf-8') as f:
         json.dump(log, f, indent=2)
-    log_print(f"Done. Success: {log['successful']}, Failed: {log['failed']}. Log -> {LOG_FILE}")
+    log_print(f"Done. Success: {log['successful']}, Failed: {log['failed']}. Log -> {log_file}")
+    return log
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the students of the SQL dump through the API.')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help='Only create shard i of N (families split by a stable hash of their row ID)')
+    parser.add_argument('--lease-dir', default=LEASE_DIR,
+                        help='Shared directory to claim row chunks from, for several workers on one dump')
+    args = parser.parse_args()
+
+    # AUTH_TOKEN no longer required since authentication was removed from student creation
+    log_print('🔓 No authentication required for student creation')
+
+    log_print(f"Reading SQL: {SQL_FILE_PATH}")
+    parsed = read_sql_insert_rows(SQL_FILE_PATH)
+    log_print(f"Found {len(parsed)} rows in SQL dump")
+    rows = [to_row_dict(values) for values in parsed]
+    log_file = LOG_FILE
+    if args.shard or args.lease_dir:
+        # One log per worker, so processes sharing a directory do not overwrite each other's
+        base, ext = os.path.splitext(LOG_FILE)
+        suffix = '-'.join(part for part in (shard_label(args.shard), args.lease_dir and worker_id()) if part)
+        log_file = f"{base}.{suffix}{ext}"
+    log = run_student_stage(rows, log_file=log_file, shard=args.shard, lease_dir=args.lease_dir)
+    if log.get('bulkOutput'):
+        return
+
+    if MIGRATE_FINANCE:
+        from import_finance_from_sql import run_finance_stage
+        run_finance_stage(rows, log['details'])
+    if MIGRATE_ATTACHMENTS:
+        from import_attachments_from_sql import run_attachment_stage
+        run_attachment_stage(rows, log['details'])
 
 
 if __name__ == '__main__':
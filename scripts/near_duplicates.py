@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate student detection for the Excel cleaner.
+
+Rows are grouped by cheap blocking keys (normalised phone, tazkira number,
+phonetic name key + date of birth) and only rows sharing a block are
+compared, so the cost grows with the number of rows rather than with the
+number of row pairs. Matching pairs are joined into clusters with
+union-find.
+"""
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from transliteration import fold_series, latin_series
+
+
+# Template columns used for matching
+DEFAULT_COLUMNS = {
+    'first_name': 'Student_First_Name*',
+    'last_name': 'Student_Last_Name*',
+    'dob': 'Student_Date_of_Birth*',
+    'phone': 'Student_Phone*',
+    'tazkira': 'Student_Tazkira_No',
+    'parent_first_name': 'Parent_First_Name*',
+    'parent_phone': 'Parent_Phone*',
+}
+
+# Blocks bigger than this are placeholder values (a school's office phone,
+# "0000") rather than real keys, and comparing inside them is quadratic
+MAX_BLOCK_SIZE = 50
+
+NAME_MATCH_THRESHOLD = 0.85
+PARENT_MATCH_THRESHOLD = 0.8
+
+# Letters dropped from the phonetic skeleton (vowels and weak letters) and
+# letters that sound alike; names are transliterated to Latin first
+SKELETON_DROP = set('aeiouhwy')
+SKELETON_MERGE = str.maketrans({'q': 'k', 'c': 'k', 'z': 's'})
+
+
+def fold_names(names: pd.Series) -> pd.Series:
+    """Casefold, fold Arabic letters to Persian and squeeze whitespace."""
+    return fold_series(names)
+
+
+def _skeleton(name: str) -> str:
+    """Consonant skeleton of a Latin name: 'muhammad ali' -> 'mmdl'."""
+    out = []
+    for word in name.translate(SKELETON_MERGE).split():
+        for i, ch in enumerate(word):
+            if i and ch in SKELETON_DROP:
+                continue
+            if out and out[-1] == ch:
+                continue
+            out.append(ch)
+    return ''.join(out)
+
+
+def phonetic_keys(folded: pd.Series) -> pd.Series:
+    """Phonetic key per Latin name; the few distinct names are computed once."""
+    codes, uniques = pd.factorize(folded)
+    keys = pd.Index([_skeleton(name) for name in uniques])
+    return pd.Series(keys.take(codes), index=folded.index).where(codes >= 0, '')
+
+
+def normalise_phones(phones: pd.Series) -> pd.Series:
+    """Reduce phones to their last nine digits so +93/0093/0 prefixes agree."""
+    digits = phones.astype('string').fillna('').str.replace(r'\.0$', '', regex=True)
+    digits = digits.str.replace(r'\D', '', regex=True)
+    return digits.str[-9:].where(digits.str.len() >= 9, '')
+
+
+def normalise_tazkira(numbers: pd.Series) -> pd.Series:
+    """Digits of a tazkira number; short values are treated as missing."""
+    digits = numbers.astype('string').fillna('').str.replace(r'\.0$', '', regex=True)
+    digits = digits.str.replace(r'\D', '', regex=True)
+    return digits.where(digits.str.len() >= 5, '')
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Keep the earliest row as the root so it becomes the survivor
+            if rb < ra:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def find_near_duplicates(df: pd.DataFrame, columns: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Return one row per clustered student: row, cluster, keep flag, reasons and score.
+
+    Rows that do not belong to any cluster are not included.
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+
+    def col(key):
+        name = columns[key]
+        return df[name] if name in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+
+    positions = pd.RangeIndex(len(df))
+    # Names are compared in Latin so 'Ahmad' and 'احمد' can meet in the same block
+    full_name = latin_series(fold_names(col('first_name').astype('string').fillna('') + ' '
+                                        + col('last_name').astype('string').fillna(''))).set_axis(positions)
+    parent_name = latin_series(fold_names(col('parent_first_name'))).set_axis(positions)
+    dob = col('dob').astype('string').fillna('').set_axis(positions)
+    phone = normalise_phones(col('phone')).set_axis(positions)
+    parent_phone = normalise_phones(col('parent_phone')).set_axis(positions)
+    tazkira = normalise_tazkira(col('tazkira')).set_axis(positions)
+    name_key = phonetic_keys(full_name)
+
+    blocks = {
+        'phone': phone,
+        'tazkira': tazkira,
+        'name+dob': (name_key + '|' + dob).where((name_key != '') & (dob != ''), ''),
+    }
+
+    # Plain lists are much faster than Series lookups in the pair loop
+    names, parents = full_name.tolist(), parent_name.tolist()
+    dobs, family_phones = dob.tolist(), parent_phone.tolist()
+
+    union_find = _UnionFind()
+    reasons = defaultdict(set)
+    scores = {}
+
+    for reason, keys in blocks.items():
+        present = keys[keys != '']
+        sizes = present.map(present.value_counts())
+        candidates = present[(sizes > 1) & (sizes <= MAX_BLOCK_SIZE)]
+        for _, members in candidates.groupby(candidates, sort=False):
+            rows = members.index.tolist()
+            for i, a in enumerate(rows):
+                for b in rows[i + 1:]:
+                    name_score = _similarity(names[a], names[b])
+                    parent_score = _similarity(parents[a], parents[b])
+                    same_dob = dobs[a] != '' and dobs[a] == dobs[b]
+                    same_family_phone = family_phones[a] != '' and family_phones[a] == family_phones[b]
+
+                    if reason == 'tazkira':
+                        # Tazkira numbers are personal; only typos in the name should differ
+                        match = name_score >= 0.6
+                    elif reason == 'phone':
+                        # Siblings share phones, so the child's name must agree too
+                        match = name_score >= NAME_MATCH_THRESHOLD and (
+                            same_dob or parent_score >= PARENT_MATCH_THRESHOLD)
+                    else:
+                        match = name_score >= NAME_MATCH_THRESHOLD and (
+                            parent_score >= PARENT_MATCH_THRESHOLD or same_family_phone)
+
+                    if match:
+                        union_find.union(a, b)
+                        pair = (min(a, b), max(a, b))
+                        reasons[a].add(reason)
+                        reasons[b].add(reason)
+                        scores[pair] = max(scores.get(pair, 0.0), name_score)
+
+    if not union_find.parent:
+        return pd.DataFrame(columns=['row', 'position', 'cluster_id', 'keep', 'match_reasons', 'score'])
+
+    clustered = sorted(union_find.parent)
+    roots = [union_find.find(r) for r in clustered]
+    best_score = defaultdict(float)
+    for (a, b), score in scores.items():
+        best_score[a] = max(best_score[a], score)
+        best_score[b] = max(best_score[b], score)
+
+    report = pd.DataFrame({
+        'row': df.index[clustered],
+        'position': clustered,
+        'root': roots,
+        'keep': [r == root for r, root in zip(clustered, roots)],
+        'match_reasons': [','.join(sorted(reasons[r])) for r in clustered],
+        'score': [round(best_score[r], 3) for r in clustered],
+    })
+    report['cluster_id'] = pd.factorize(report['root'])[0] + 1
+    return report[['row', 'position', 'cluster_id', 'keep', 'match_reasons', 'score']]
+
+
+def build_cluster_report(df: pd.DataFrame, clusters: pd.DataFrame,
+                         columns: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Cluster listing with the identifying fields of every member, for review."""
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    shown = [c for c in columns.values() if c in df.columns]
+    details = df.iloc[clusters['position']][shown].reset_index(drop=True)
+    report = pd.concat([clusters.drop(columns='position').reset_index(drop=True), details], axis=1)
+    if pd.api.types.is_integer_dtype(report['row']):
+        # Spreadsheet row numbers (header is row 1) are easier to find by hand
+        report.insert(1, 'excel_row', report['row'] + 2)
+    return report.sort_values(['cluster_id', 'keep'], ascending=[True, False])
+
+
+def merge_near_duplicates(df: pd.DataFrame, clusters: pd.DataFrame) -> pd.DataFrame:
+    """Keep the first row of every cluster, filling its blanks from the others."""
+    if clusters.empty:
+        return df
+
+    members = df.iloc[clusters['position']]
+    merged = members.groupby(clusters['cluster_id'].to_numpy(), sort=False).first()
+    survivors = clusters.loc[clusters['keep'], ['position', 'cluster_id']]
+
+    result = df.copy()
+    for col in merged.columns:
+        values = merged.loc[survivors['cluster_id'], col].to_numpy()
+        result.iloc[survivors['position'].to_numpy(), result.columns.get_loc(col)] = values
+
+    dropped = clusters.loc[~clusters['keep'], 'position'].to_numpy()
+    return result.drop(index=result.index[dropped])
+
+
+def summarise(clusters: pd.DataFrame) -> List[str]:
+    """Short human-readable lines for logs and reports."""
+    if clusters.empty:
+        return ['No near-duplicate students found']
+    n_clusters = clusters['cluster_id'].nunique()
+    n_extra = int((~clusters['keep']).sum())
+    by_reason = clusters['match_reasons'].str.split(',').explode().value_counts()
+    return [f"{n_clusters} near-duplicate clusters covering {len(clusters)} rows ({n_extra} redundant)"] + [
+        f"  matched on {reason}: {count} rows" for reason, count in by_reason.items()
+    ]
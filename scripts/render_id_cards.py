@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Batch ID-card renderer.
+
+Fills assets/card-template.png with each student's photo, name, father's
+name, class, phone and card number from scripts/students.sql, and lays the
+cards out several to an A4 page in print-ready PDFs (one per class).
+
+- The template, fonts and photo mask are loaded once per worker process
+  and cached.
+- Dari/Pashto text is shaped right-to-left: by Pillow itself when it is
+  built with libraqm, otherwise with arabic-reshaper + python-bidi.
+- Sheets are rendered on a process pool and come back as JPEG bytes. The
+  PDF embeds those JPEGs as they are (DCTDecode), so writing it costs no
+  re-encoding.
+
+Requires Pillow (pip install pillow).
+
+Usage:
+  python3 scripts/render_id_cards.py
+  python3 scripts/render_id_cards.py --class-id CLS25-1-00020 --photo-dir photos/
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from import_students_from_sql import read_sql_insert_rows, to_row_dict
+from sql_dump import read_insert_rows
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, features
+except ImportError:
+    sys.exit('render_id_cards.py requires Pillow (pip install pillow)')
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets')
+TEMPLATE_PATH = os.path.join(ASSETS_DIR, 'card-template.png')
+LATIN_FONT_PATH = os.path.join(ASSETS_DIR, 'Bahij_Yekan-Bold.ttf')
+DARI_FONT_PATH = os.path.join(ASSETS_DIR, 'static', 'NotoNaskhArabic-Bold.ttf')
+
+# Template geometry in template pixels (1085 x 1764)
+PHOTO_CENTER = (540, 460)
+PHOTO_RADIUS = 282
+# field -> (baseline y, right end of the writing line)
+FIELD_LINES = {
+    'name': (968, 900),
+    'father': (1090, 775),
+    'class': (1213, 870),
+    'phone': (1336, 705),
+    'card': (1459, 725),
+}
+LINE_LEFT = 50
+FONT_SIZE = 58
+# Bahij Yekan's Latin letters are small next to its Arabic ones
+LATIN_FONT_SCALE = 1.3
+
+# Cards are printed 54 mm wide (CR80), height follows the template
+CARD_WIDTH_MM = 54.0
+PAGE_SIZE_MM = (210.0, 297.0)
+PAGE_MARGIN_MM = 10.0
+CARD_GAP_MM = 4.0
+JPEG_QUALITY = 90
+
+_ARABIC_SCRIPT = re.compile(r'[؀-ۿݐ-ݿﭐ-﷿ﹰ-﻿]')
+HAS_RAQM = features.check('raqm')
+
+
+def mm_to_px(mm: float, dpi: int) -> int:
+    return int(round(mm / 25.4 * dpi))
+
+
+def shape_text(text: str) -> str:
+    """Text in the order the basic layout engine should draw it (raqm shapes by itself)."""
+    if HAS_RAQM or not _ARABIC_SCRIPT.search(text):
+        return text
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        raise RuntimeError('Dari text needs Pillow built with libraqm, or: pip install arabic-reshaper python-bidi')
+    return get_display(arabic_reshaper.reshape(text))
+
+
+@lru_cache(maxsize=None)
+def load_template(dpi: int) -> Tuple[Image.Image, float]:
+    """Template scaled to the printed card size, and the template -> card scale."""
+    with Image.open(TEMPLATE_PATH) as source:
+        # The rounded corners are transparent; print them on white
+        template = Image.new('RGB', source.size, 'white')
+        template.paste(source, mask=source.convert('RGBA'))
+    width = mm_to_px(CARD_WIDTH_MM, dpi)
+    scale = width / template.width
+    return template.resize((width, round(template.height * scale)), Image.LANCZOS), scale
+
+
+@lru_cache(maxsize=None)
+def load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    layout = ImageFont.Layout.RAQM if HAS_RAQM else ImageFont.Layout.BASIC
+    return ImageFont.truetype(path, size, layout_engine=layout)
+
+
+@lru_cache(maxsize=None)
+def circle_mask(diameter: int) -> Image.Image:
+    # Drawn at 4x and scaled down for a smooth edge
+    big = Image.new('L', (diameter * 4, diameter * 4), 0)
+    ImageDraw.Draw(big).ellipse((0, 0, diameter * 4 - 1, diameter * 4 - 1), fill=255)
+    return big.resize((diameter, diameter), Image.LANCZOS)
+
+
+def fitted_font(draw: ImageDraw.ImageDraw, text: str, max_width: int, size: int) -> ImageFont.FreeTypeFont:
+    if _ARABIC_SCRIPT.search(text):
+        path = DARI_FONT_PATH
+    else:
+        path, size = LATIN_FONT_PATH, int(size * LATIN_FONT_SCALE)
+    font = load_font(path, size)
+    while size > 12 and draw.textlength(text, font=font) > max_width:
+        size = int(size * 0.9)
+        font = load_font(path, size)
+    return font
+
+
+def render_card(card: Dict[str, Any], dpi: int) -> Image.Image:
+    template, scale = load_template(dpi)
+    image = template.copy()
+    draw = ImageDraw.Draw(image)
+
+    photo_path = card.get('photo')
+    if photo_path and os.path.isfile(photo_path):
+        diameter = round(PHOTO_RADIUS * 2 * scale)
+        try:
+            with Image.open(photo_path) as photo:
+                photo.draft('RGB', (diameter, diameter))  # JPEGs decode at reduced size
+                photo = photo.convert('RGB')
+                side = min(photo.size)
+                left, top = (photo.width - side) // 2, (photo.height - side) // 2
+                photo = photo.crop((left, top, left + side, top + side)).resize((diameter, diameter), Image.LANCZOS)
+        except OSError as e:
+            # A broken photo leaves the circle empty rather than failing the sheet
+            print(f"Skipping unreadable photo {photo_path}: {e}", file=sys.stderr)
+        else:
+            cx, cy = PHOTO_CENTER
+            image.paste(photo, (round(cx * scale) - diameter // 2, round(cy * scale) - diameter // 2),
+                        circle_mask(diameter))
+
+    for field, (baseline, right) in FIELD_LINES.items():
+        text = shape_text(str(card.get(field) or '').strip())
+        if not text:
+            continue
+        font = fitted_font(draw, text, round((right - LINE_LEFT - 20) * scale), round(FONT_SIZE * scale))
+        draw.text((round((right - 15) * scale), round(baseline * scale)), text, font=font,
+                  fill='white', anchor='rs')
+    return image
+
+
+def sheet_layout(dpi: int) -> Tuple[Tuple[int, int], List[Tuple[int, int]]]:
+    """Page size in pixels and the top-left corner of every card slot."""
+    template, _ = load_template(dpi)
+    page_w, page_h = (mm_to_px(mm, dpi) for mm in PAGE_SIZE_MM)
+    margin, gap = mm_to_px(PAGE_MARGIN_MM, dpi), mm_to_px(CARD_GAP_MM, dpi)
+    cols = max(1, (page_w - 2 * margin + gap) // (template.width + gap))
+    rows = max(1, (page_h - 2 * margin + gap) // (template.height + gap))
+    # Centre the grid on the page
+    left = (page_w - cols * template.width - (cols - 1) * gap) // 2
+    top = (page_h - rows * template.height - (rows - 1) * gap) // 2
+    slots = [(left + c * (template.width + gap), top + r * (template.height + gap))
+             for r in range(rows) for c in range(cols)]
+    return (page_w, page_h), slots
+
+
+def render_sheet(cards: List[Dict[str, Any]], dpi: int) -> bytes:
+    """One page of cards as JPEG bytes (runs in a worker process)."""
+    (page_w, page_h), slots = sheet_layout(dpi)
+    page = Image.new('RGB', (page_w, page_h), 'white')
+    for card, slot in zip(cards, slots):
+        page.paste(render_card(card, dpi), slot)
+    buffer = io.BytesIO()
+    page.save(buffer, 'JPEG', quality=JPEG_QUALITY, dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def write_jpeg_pdf(path: str, pages: Iterable[bytes], page_size_px: Tuple[int, int], dpi: int) -> int:
+    """Write a PDF with one full-page JPEG per page; returns the page count."""
+    width_pt, height_pt = (px * 72.0 / dpi for px in page_size_px)
+    offsets: List[int] = []
+    page_ids: List[int] = []
+
+    with open(path, 'wb') as f:
+        def start_object() -> int:
+            offsets.append(f.tell())
+            f.write(f'{len(offsets)} 0 obj\n'.encode())
+            return len(offsets)
+
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        # Objects 1 and 2 (catalog, page tree) are written last, once the pages are known
+        offsets.extend([0, 0])
+        for jpeg in pages:
+            image_id = start_object()
+            f.write(f'<< /Type /XObject /Subtype /Image /Width {page_size_px[0]} /Height {page_size_px[1]} '
+                    f'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\n'
+                    f'stream\n'.encode())
+            f.write(jpeg)
+            f.write(b'\nendstream\nendobj\n')
+            content = f'q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q'.encode()
+            content_id = start_object()
+            f.write(f'<< /Length {len(content)} >>\nstream\n'.encode() + content + b'\nendstream\nendobj\n')
+            page_ids.append(start_object())
+            f.write(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] '
+                    f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>\n'
+                    f'endobj\n'.encode())
+
+        offsets[0] = f.tell()
+        f.write(b'1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n')
+        offsets[1] = f.tell()
+        kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+        f.write(f'2 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>\nendobj\n'.encode())
+
+        xref = f.tell()
+        f.write(f'xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n'.encode())
+        f.write(''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode())
+        f.write(f'trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return len(page_ids)
+
+
+def load_class_names(path: Optional[str]) -> Dict[str, str]:
+    """Class ID -> 'Class 10 - A' from a classes.sql dump."""
+    if not path or not os.path.exists(path):
+        return {}
+    return {row[0]: f"{row[1]} - {row[2]}".strip(' -') for row in read_insert_rows(path, 'classes') if len(row) > 2}
+
+
+def build_cards(rows: List[Dict[str, Any]], class_names: Dict[str, str], photo_dir: str) -> List[Dict[str, Any]]:
+    cards = []
+    for row in rows:
+        photo = (row.get('photo') or '').strip()
+        class_id = (row.get('class_id') or '').strip()
+        cards.append({
+            'classId': class_id or 'no-class',
+            'name': f"{(row.get('name') or '').strip()} {(row.get('lastname') or '').strip()}".strip(),
+            'father': (row.get('father_name') or '').strip(),
+            'class': class_names.get(class_id, class_id),
+            'phone': (row.get('phone') or '').strip(),
+            # Students without a printed card number carry their school ID instead
+            'card': (row.get('card_number') or '').strip() or (row.get('id') or '').strip(),
+            'photo': os.path.join(photo_dir, os.path.basename(photo)) if photo and photo != '0' else None,
+        })
+    return cards
+
+
+def _warm_worker(dpi: int) -> None:
+    load_template(dpi)
+    circle_mask(round(PHOTO_RADIUS * 2 * load_template(dpi)[1]))
+
+
+def render_class_pdfs(cards: List[Dict[str, Any]], output_dir: str, dpi: int, workers: Optional[int]) -> Dict[str, int]:
+    """Render every class into `<output_dir>/<class id>.pdf`; returns pages per file."""
+    os.makedirs(output_dir, exist_ok=True)
+    page_size, slots = sheet_layout(dpi)
+    per_sheet = len(slots)
+    by_class: Dict[str, List[Dict[str, Any]]] = {}
+    for card in cards:
+        by_class.setdefault(card['classId'], []).append(card)
+
+    pages_written = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker, initargs=(dpi,)) as pool:
+        for class_id, class_cards in sorted(by_class.items()):
+            sheets = [class_cards[i:i + per_sheet] for i in range(0, len(class_cards), per_sheet)]
+            path = os.path.join(output_dir, f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', class_id)}.pdf")
+            pages = pool.map(render_sheet, sheets, [dpi] * len(sheets))
+            pages_written[path] = write_jpeg_pdf(path, pages, page_size, dpi)
+            print(f"{path}: {len(class_cards)} cards on {pages_written[path]} pages")
+    return pages_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render student ID cards into multi-up PDF sheets')
+    parser.add_argument('--sql-file', default=os.environ.get('SQL_FILE', './scripts/students.sql'))
+    parser.add_argument('--classes-file', default='./classes.sql', help='classes.sql dump for class names')
+    parser.add_argument('--class-id', action='append', help='Only render these classes (repeatable)')
+    parser.add_argument('--photo-dir', default=os.environ.get('PHOTO_DIR', './scripts/photos'))
+    parser.add_argument('--output-dir', '-o', default='./id-cards')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    rows = [to_row_dict(values) for values in read_sql_insert_rows(args.sql_file)]
+    if args.class_id:
+        wanted = set(args.class_id)
+        rows = [row for row in rows if (row.get('class_id') or '').strip() in wanted]
+    cards = build_cards(rows, load_class_names(args.classes_file), args.photo_dir)
+    if not cards:
+        print('No students to render')
+        return
+
+    started = time.perf_counter()
+    render_class_pdfs(cards, args.output_dir, args.dpi, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Rendered {len(cards)} cards in {elapsed:.1f}s ({len(cards) / elapsed * 60:.0f} cards/minute)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Shared retry scheduler for the importers.
+
+A request that fails in a way worth retrying (no response, a timeout, 429
+or a 502/503/504) is handed to a RetryQueue instead of being counted as
+failed. The queue keeps it in a delayed heap and a background thread sends
+it again when it is due, on its own worker pool, so the importer's send
+loop never waits for retries. Delays grow exponentially with full jitter:
+a random wait between 0 and min(RETRY_MAX_S, RETRY_BASE_S * 2**attempt),
+or the server's Retry-After if that is longer.
+
+After RETRY_MAX_ATTEMPTS attempts the request is written to a dead-letter
+JSONL file (RETRY_DEAD_LETTER_DIR/<name>.jsonl), one request per line, with
+its method, URL, JSON body, context and last error. `--replay` sends only
+those requests again; the ones that fail again go back to the file.
+
+Usage:
+  AUTH_TOKEN=... python3 scripts/retry_queue.py --replay scripts/dead-letters/students-sql.jsonl
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Configuration
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '5'))
+RETRY_BASE_S = float(os.environ.get('RETRY_BASE_S', '1'))
+RETRY_MAX_S = float(os.environ.get('RETRY_MAX_S', '60'))
+RETRY_WORKERS = int(os.environ.get('RETRY_WORKERS', '4'))
+RETRY_DEAD_LETTER_DIR = os.environ.get('RETRY_DEAD_LETTER_DIR', './scripts/dead-letters')
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+Request = Dict[str, Any]          # {'method', 'url', 'json'}
+Outcome = Callable[[Dict[str, Any], Optional[requests.Response], Optional[str]], None]
+
+
+def is_retryable(status: Optional[int]) -> bool:
+    """No response at all (status None), rate limiting, or a gateway error."""
+    return status is None or status in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff before attempt number `attempt + 1`."""
+    delay = random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempt)))
+    return max(delay, retry_after or 0)
+
+
+def retry_after_seconds(response: Optional[requests.Response]) -> Optional[float]:
+    value = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def dead_letter_path(name: str) -> str:
+    return os.path.join(RETRY_DEAD_LETTER_DIR, f"{name}.jsonl")
+
+
+def send_request(session: requests.Session, request: Request,
+                 timeout: float = 30) -> Tuple[Optional[requests.Response], Optional[str]]:
+    """(response, None), or (None, error text) when there was no response."""
+    try:
+        return session.request(request['method'], request['url'], json=request.get('json'), timeout=timeout), None
+    except requests.RequestException as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+class RetryQueue:
+    """Delayed retries on a background thread; exhausted requests go to the dead-letter file.
+
+    `on_result(context, response, error)` is called from a worker thread
+    once per submitted request: with error None and the response once it
+    went through (any non-retryable status), or with the last error (and
+    the last response, if there was one) when it was dead-lettered.
+    `prepare(context, request)` may rewrite a request just before each
+    retry (e.g. to link a sibling to a parent created since). With
+    `keep_failures` any request that does not end in a 2xx is
+    dead-lettered, not only the ones that ran out of attempts.
+    """
+
+    def __init__(self, session: requests.Session, dead_letter_file: str, on_result: Optional[Outcome] = None,
+                 prepare: Optional[Callable[[Dict[str, Any], Request], Request]] = None,
+                 log: Callable[[str], None] = print, max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 workers: int = RETRY_WORKERS, keep_failures: bool = False):
+        self.session = session
+        self.dead_letter_file = dead_letter_file
+        self.on_result = on_result
+        self.prepare = prepare
+        self.log = log
+        self.max_attempts = max_attempts
+        self.keep_failures = keep_failures
+        self.stats = {'queued': 0, 'recovered': 0, 'failed': 0, 'deadLettered': 0}
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._order = itertools.count()
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._thread = threading.Thread(target=self._schedule, daemon=True)
+        self._thread.start()
+
+    def submit(self, request: Request, context: Dict[str, Any], attempts: int = 1,
+               error: Optional[str] = None, response: Optional[requests.Response] = None) -> None:
+        """Queue a request that already failed `attempts` times; returns at once."""
+        entry = {'request': request, 'context': context, 'attempts': attempts, 'error': error}
+        with self._cond:
+            self._pending += 1
+            self.stats['queued'] += 1
+        self._requeue(entry, response)
+
+    def _requeue(self, entry: Dict[str, Any], response: Optional[requests.Response]) -> None:
+        if entry['attempts'] >= self.max_attempts:
+            self._dead_letter(entry, response)
+            return
+        due = time.monotonic() + backoff_delay(entry['attempts'] - 1, retry_after_seconds(response))
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._order), entry))
+            self._cond.notify_all()
+
+    def _schedule(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                due, _, entry = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+            self._pool.submit(self._attempt, entry)
+
+    def _attempt(self, entry: Dict[str, Any]) -> None:
+        try:
+            if self.prepare is not None:
+                entry['request'] = self.prepare(entry['context'], entry['request'])
+            response, error = send_request(self.session, entry['request'])
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+        entry['attempts'] += 1
+        status = response.status_code if response is not None else None
+        if is_retryable(status):
+            entry['error'] = error or f"HTTP {status}"
+            self._requeue(entry, response)
+            return
+        if self.keep_failures and not response.ok:
+            entry['error'] = f"HTTP {status}"
+            self._dead_letter(entry, response)
+            return
+        with self._cond:
+            self.stats['recovered' if response.ok else 'failed'] += 1
+        self._finish(entry, response, None)
+
+    def _dead_letter(self, entry: Dict[str, Any], response: Optional[requests.Response]) -> None:
+        record = {**entry, 'time': dt.datetime.now(dt.timezone.utc).isoformat()}
+        with self._file_lock:
+            os.makedirs(os.path.dirname(self.dead_letter_file) or '.', exist_ok=True)
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        with self._cond:
+            self.stats['deadLettered'] += 1
+        self.log(f"☠️ Gave up after {entry['attempts']} attempt(s) ({entry['error']}) -> {self.dead_letter_file}")
+        self._finish(entry, response, entry['error'])
+
+    def _finish(self, entry: Dict[str, Any], response: Optional[requests.Response], error: Optional[str]) -> None:
+        try:
+            if self.on_result is not None:
+                self.on_result(entry['context'], response, error)
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def drain(self) -> Dict[str, int]:
+        """Wait until every queued request has gone through or been dead-lettered."""
+        with self._cond:
+            if self._pending:
+                self.log(f"⏳ Waiting for {self._pending} queued retries...")
+            while self._pending:
+                self._cond.wait()
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+        return dict(self.stats)
+
+
+def read_dead_letters(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def replay(path: str, session: requests.Session, on_result: Optional[Outcome] = None,
+           log: Callable[[str], None] = print) -> Dict[str, int]:
+    """Send the requests of a dead-letter file again; those that fail again (any non-2xx) are written back to it."""
+    entries = read_dead_letters(path)
+    # Move the file aside first: requests that fail again are appended to a fresh one
+    replaying = f"{path}.replaying"
+    os.replace(path, replaying)
+    log(f"🔁 Replaying {len(entries)} dead-lettered requests from {path}")
+    queue = RetryQueue(session, path, on_result=on_result, log=log, keep_failures=True)
+    for entry in entries:
+        queue.submit(entry['request'], entry.get('context') or {}, attempts=0, error=entry.get('error'))
+    stats = queue.drain()
+    os.remove(replaying)
+    return stats
+
+
+def make_session(token: str, workers: int = RETRY_WORKERS) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+    if token:
+        session.headers['Authorization'] = f'Bearer {token}'
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-send the requests of a dead-letter file.')
+    parser.add_argument('--replay', required=True, help='Dead-letter JSONL file')
+    args = parser.parse_args()
+    if not os.path.exists(args.replay):
+        print(f"❌ No dead-letter file at {args.replay}")
+        return
+
+    from import_runs import RunLedger, created_ids
+    ledger = RunLedger(args.replay, 'replay')
+    results = {'created': 0, 'failed': 0}
+
+    def finished(context: Dict[str, Any], response: Optional[requests.Response], error: Optional[str]) -> None:
+        ok = error is None and response.status_code in (200, 201)
+        results['created' if ok else 'failed'] += 1
+        if ok and context.get('kind') == 'student':
+            # Students created by the replay can be rolled back like any run
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            ledger.record(created_ids(body, context.get('createsParent', False)), **{
+                key: value for key, value in context.items() if key in ('row', 'sqlId', 'name')})
+        label = context.get('name') or context.get('row') or ''
+        print(f"{'✅' if ok else '❌'} {label} -> {error or response.status_code}")
+
+    stats = replay(args.replay, make_session(os.environ.get('AUTH_TOKEN', '')), finished)
+    ledger.close()
+    print(f"Replay done. Succeeded: {results['created']}, failed: {results['failed']}, "
+          f"dead-lettered again: {stats['deadLettered']}. Run ledger -> {ledger.path}")
+
+
+if __name__ == '__main__':
+    main()
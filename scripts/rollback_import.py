@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Roll back a student import run: deletes every student the run recorded in
+its ledger (see import_runs.py) through DELETE /students/bulk/delete, then
+their user accounts and the parent users the run created that no longer
+have any students (DELETE /users/bulk/delete).
+
+- Students are deleted ROLLBACK_BATCH_SIZE per request, at most
+  ROLLBACK_WORKERS requests at a time.
+- The bulk student endpoint only deletes the first student of a request
+  (the controller answers for every item through the same response), so
+  its reply is not trusted: a student only counts as deleted once GET
+  /students/<id> returns 404, and the ones still there are deleted one at
+  a time through DELETE /students/<id>.
+- A student's user account is only deleted once the student is.
+- A parent is only deleted if this run created it and an authenticated
+  GET /students?parentId=<parent id> for the school comes back empty, so
+  siblings linked to it later (another run, sync_students.py) keep their
+  parent. A parent whose students cannot be confirmed that way is kept
+  and logged.
+- What was deleted is appended to RUN_LEDGER_DIR/rollbacks/<run id>.jsonl;
+  running the rollback again only retries what is left.
+
+Usage:
+  python3 scripts/rollback_import.py --list                       # runs with a ledger
+  AUTH_TOKEN=... python3 scripts/rollback_import.py --latest --dry-run
+  AUTH_TOKEN=... python3 scripts/rollback_import.py students-sql-20261019-034048-1234
+"""
+
+import argparse
+import json
+import os
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from import_runs import RUN_LEDGER_DIR, ledger_path, list_runs, read_ledger
+from import_students_from_sql import API_BASE_URL, AUTH_TOKEN, SCHOOL_ID, log_print
+
+
+# Configuration
+ROLLBACK_BATCH_SIZE = int(os.environ.get('ROLLBACK_BATCH_SIZE', '500'))
+ROLLBACK_WORKERS = int(os.environ.get('ROLLBACK_WORKERS', '4'))
+
+
+def make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=ROLLBACK_WORKERS, pool_maxsize=ROLLBACK_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+    if AUTH_TOKEN:
+        session.headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    return session
+
+
+def rollback_log_path(run_id: str) -> str:
+    return os.path.join(RUN_LEDGER_DIR, 'rollbacks', f"{run_id}.jsonl")
+
+
+def read_rollback_log(path: str) -> Dict[str, Set[int]]:
+    """Student, student user and parent user IDs earlier rollbacks of the run already deleted."""
+    done: Dict[str, Set[int]] = {'studentIds': set(), 'studentUserIds': set(), 'parentUserIds': set()}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                for key in done:
+                    done[key].update(int(i) for i in entry.get(key) or [])
+    return done
+
+
+def bulk_delete(session: requests.Session, path: str, key: str, ids: List[int]) -> Dict[str, Any]:
+    """DELETE one batch; returns the IDs the reply reports as deleted and the errors."""
+    try:
+        resp = session.delete(f"{API_BASE_URL}/{path}", data=json.dumps({key: ids}), timeout=600)
+        body = resp.json() if resp.content else {}
+    except (requests.RequestException, ValueError) as e:
+        return {'deleted': [], 'errors': [str(e)]}
+    if resp.status_code != 200 or not body.get('success', True):
+        return {'deleted': [], 'errors': [f"HTTP {resp.status_code} - {body.get('message') or body.get('error')}"]}
+    errors = (body.get('data') or {}).get('errors') or []
+    failed = {str(error.get('studentId', error.get('id'))) for error in errors if isinstance(error, dict)}
+    return {'deleted': [i for i in ids if str(i) not in failed],
+            'errors': [f"{error.get('studentId', error.get('id'))}: {error.get('error')}" if isinstance(error, dict)
+                       else str(error) for error in errors]}
+
+
+def is_deleted(session: requests.Session, item_path: str, item_id: int) -> bool:
+    """Whether GET <item_path>/<id> confirms the record is gone (404, or returned with deletedAt set)."""
+    try:
+        resp = session.get(f"{API_BASE_URL}/{item_path}/{item_id}", timeout=60)
+        if resp.status_code == 404:
+            return True
+        if resp.status_code != 200:
+            return False
+        data = resp.json().get('data') or {}
+    except (requests.RequestException, ValueError):
+        return False
+    record = data.get('student', data) if isinstance(data, dict) else {}
+    return bool(isinstance(record, dict) and record.get('deletedAt'))
+
+
+def delete_one(session: requests.Session, item_path: str, item_id: int) -> Optional[str]:
+    """DELETE <item_path>/<id>; the error, or None."""
+    try:
+        resp = session.delete(f"{API_BASE_URL}/{item_path}/{item_id}", timeout=60)
+    except requests.RequestException as e:
+        return str(e)
+    if resp.status_code in (200, 204, 404):
+        return None
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    return f"HTTP {resp.status_code} - {body.get('message') or body.get('error')}"
+
+
+def delete_batch(session: requests.Session, path: str, key: str, ids: List[int],
+                 item_path: Optional[str] = None) -> Dict[str, Any]:
+    """DELETE one batch; returns the IDs deleted and the errors.
+
+    With `item_path` the bulk reply is ignored: each ID is checked through
+    GET <item_path>/<id>, the ones still there are deleted one at a time and
+    checked again, and only confirmed IDs are returned as deleted.
+    """
+    outcome = bulk_delete(session, path, key, ids)
+    if item_path is None:
+        return outcome
+    deleted, errors = [], []
+    for item_id in ids:
+        if not is_deleted(session, item_path, item_id):
+            error = delete_one(session, item_path, item_id)
+            if error or not is_deleted(session, item_path, item_id):
+                errors.append(f"{item_id}: {error or 'still there after DELETE'}")
+                continue
+        deleted.append(item_id)
+    return {'deleted': deleted, 'errors': errors}
+
+
+def delete_in_batches(session: requests.Session, path: str, key: str, ids: List[int],
+                      log_file, log_key: str, item_path: Optional[str] = None) -> Dict[str, Any]:
+    """Delete `ids` in ROLLBACK_BATCH_SIZE batches, ROLLBACK_WORKERS at a time.
+
+    Each batch is logged under `log_key` as soon as it lands; see
+    delete_batch for `item_path`.
+    """
+    result = {'deleted': 0, 'failed': 0, 'errors': [], 'ids': []}
+    batches = [ids[start:start + ROLLBACK_BATCH_SIZE] for start in range(0, len(ids), ROLLBACK_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=ROLLBACK_WORKERS) as pool:
+        futures = {pool.submit(delete_batch, session, path, key, batch, item_path): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            outcome = future.result()
+            if outcome['deleted']:
+                log_file.write(json.dumps({log_key: outcome['deleted'],
+                                           'time': dt.datetime.now(dt.timezone.utc).isoformat()}) + '\n')
+                log_file.flush()
+            failed = len(batch) - len(outcome['deleted'])
+            result['deleted'] += len(outcome['deleted'])
+            result['ids'].extend(outcome['deleted'])
+            result['failed'] += failed
+            result['errors'].extend(outcome['errors'])
+            log_print(f"{'✅' if not failed else '⚠️'} {log_key}: {len(outcome['deleted'])} deleted, {failed} failed"
+                      + (f" ({outcome['errors'][0]})" if outcome['errors'] else ''))
+    return result
+
+
+def has_students(session: requests.Session, parent_id: int) -> Optional[bool]:
+    """Whether the parent record still has (undeleted) students in the school; None if that cannot be confirmed.
+
+    A 404 or any other failure is not taken as "no students", and neither
+    is a reply listing another parent's students (a server that ignores
+    the parentId filter).
+    """
+    try:
+        resp = session.get(f"{API_BASE_URL}/students",
+                           params={'parentId': parent_id, 'schoolId': SCHOOL_ID, 'page': 1, 'limit': 10}, timeout=60)
+        if resp.status_code != 200:
+            return None
+        students = resp.json().get('data')
+    except (requests.RequestException, ValueError):
+        return None
+    if not isinstance(students, list):
+        return None
+    for student in students:
+        linked = student.get('parentId') or (student.get('parent') or {}).get('id')
+        if str(linked) != str(parent_id):
+            return None
+    return bool(students)
+
+
+def orphaned_parents(session: requests.Session, parents: Dict[int, Optional[int]]) -> List[int]:
+    """User IDs of the parents (user ID -> parent record ID) confirmed to have no students left."""
+    def check(user_id: int) -> Optional[bool]:
+        return has_students(session, parents[user_id]) if parents[user_id] else None
+
+    with ThreadPoolExecutor(max_workers=ROLLBACK_WORKERS) as pool:
+        flags = list(pool.map(check, parents))
+    unknown = [user_id for user_id, busy in zip(parents, flags) if busy is None]
+    if unknown:
+        log_print(f"⚠️ Keeping {len(unknown)} parents whose students could not be checked "
+                  f"(user IDs {', '.join(map(str, unknown[:10]))}{', ...' if len(unknown) > 10 else ''})")
+    return [user_id for user_id, busy in zip(parents, flags) if busy is False]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete everything a student import run created.')
+    parser.add_argument('run', nargs='?', help='Run ID (see --list) or ledger file')
+    parser.add_argument('--latest', action='store_true', help='Roll back the most recent run')
+    parser.add_argument('--list', action='store_true', help='List the recorded runs')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would be deleted')
+    args = parser.parse_args()
+
+    runs = list_runs()
+    if args.list:
+        for run in runs:
+            log_print(f"{run.get('runId')}: {run['students']} students from {run.get('source')} "
+                      f"(started {run.get('startTime')})")
+        if not runs:
+            log_print(f"No run ledgers in {RUN_LEDGER_DIR}")
+        return
+    if args.latest:
+        if not runs:
+            log_print(f"❌ No run ledgers in {RUN_LEDGER_DIR}")
+            return
+        path = runs[-1]['path']
+    elif args.run:
+        path = ledger_path(args.run)
+    else:
+        parser.error('give a run ID, --latest or --list')
+    if not os.path.exists(path):
+        log_print(f"❌ No ledger at {path}")
+        return
+
+    header, entries = read_ledger(path)
+    run_id = header.get('runId') or os.path.splitext(os.path.basename(path))[0]
+    log_file_path = rollback_log_path(run_id)
+    done = read_rollback_log(log_file_path)
+    student_ids = list(dict.fromkeys(int(e['studentId']) for e in entries if int(e['studentId']) not in done['studentIds']))
+    student_user_ids = {int(e['studentId']): int(e['userId']) for e in entries if e.get('userId')
+                        and int(e['userId']) not in done['studentUserIds']}
+    # Parent user ID -> parent record ID, which students link to
+    parent_user_ids: Dict[int, Optional[int]] = {}
+    for e in entries:
+        if e.get('parentUserId') and int(e['parentUserId']) not in done['parentUserIds']:
+            parent_id = int(e['parentId']) if e.get('parentId') else None
+            parent_user_ids[int(e['parentUserId'])] = parent_user_ids.get(int(e['parentUserId'])) or parent_id
+    log_print(f"↩️ Run {run_id} ({header.get('source')}): {len(entries)} students recorded, "
+              f"{len(done['studentIds'])} already rolled back; {len(student_ids)} students, "
+              f"{len(student_user_ids)} student users and up to {len(parent_user_ids)} parents to delete")
+    if args.dry_run:
+        log_print('Dry run; nothing deleted')
+        return
+    if not AUTH_TOKEN:
+        log_print('❌ Set AUTH_TOKEN: the bulk delete endpoints need an admin token')
+        return
+
+    session = make_session()
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+    with open(log_file_path, 'a', encoding='utf-8') as log_file:
+        students = delete_in_batches(session, 'students/bulk/delete', 'studentIds', student_ids,
+                                     log_file, 'studentIds', item_path='students')
+        # Only the accounts of students that are confirmed gone (now or by an earlier rollback)
+        gone = done['studentIds'] | set(students['ids'])
+        users = delete_in_batches(session, 'users/bulk/delete', 'userIds',
+                                  [user_id for student_id, user_id in student_user_ids.items() if student_id in gone],
+                                  log_file, 'studentUserIds')
+        orphans = orphaned_parents(session, parent_user_ids) if parent_user_ids else []
+        log_print(f"👪 {len(orphans)} of {len(parent_user_ids)} parents created by the run have no students left")
+        parents = delete_in_batches(session, 'users/bulk/delete', 'userIds', orphans, log_file, 'parentUserIds')
+
+    log_print(f"Rollback done. Students deleted: {students['deleted']} (failed {students['failed']}), "
+              f"student users deleted: {users['deleted']} (failed {users['failed']}), parents deleted: {parents['deleted']} (failed {parents['failed']}). Log -> {log_file_path}")
+
+
+if __name__ == '__main__':
+    main()
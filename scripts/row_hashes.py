@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Per-row content hashes for incremental re-cleaning.
+
+Every source row gets a stable key and a hash of its normalised content.
+The key comes from the sheet's student ID or admission number, else the
+tazkira number; names are only used for rows that have neither, since a
+corrected spelling would otherwise turn a changed row into a new one.
+Comparing both against the state saved by the last run tells which rows
+are new, changed, unchanged or gone.
+"""
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+
+# Columns holding an identifier the school assigned, first one present wins
+ID_FIELDS = ['Student_ID*', 'Student_ID', 'ID', 'Admission_No*', 'Admission_No', 'Admission_Number']
+TAZKIRA_FIELD = 'Student_Tazkira_No'
+# Only for rows without an ID or tazkira number
+NAME_FIELDS = ['Student_First_Name*', 'Student_Last_Name*', 'Parent_First_Name*']
+
+# Version 1 keyed every row on names plus tazkira
+STATE_VERSION = 2
+
+
+def normalise_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Text view of the frame that ignores whitespace, case of blanks and float '.0'."""
+    text = df.astype('string').fillna('')
+    for col in text.columns:
+        values = text[col].str.strip().str.replace(r'^(-?\d+)\.0$', r'\1', regex=True)
+        text[col] = values.mask(values.str.lower().isin(['nan', 'none', 'nat', '<na>']), '')
+    return text
+
+
+def _hash_rows(text: pd.DataFrame) -> pd.Series:
+    hashes = pd.util.hash_pandas_object(text, index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def row_keys(df: pd.DataFrame) -> pd.Series:
+    """Stable key per row; repeated identities are told apart by occurrence."""
+    id_fields = [f for f in ID_FIELDS if f in df.columns]
+    name_fields = [f for f in NAME_FIELDS if f in df.columns]
+    tazkira = [TAZKIRA_FIELD] if TAZKIRA_FIELD in df.columns else []
+    if not (id_fields or tazkira or name_fields):
+        # Nothing identifies rows; fall back to their position in the sheet
+        return pd.Series([f"row-{i}" for i in range(len(df))], index=df.index)
+    text = normalise_frame(df[id_fields + tazkira + name_fields])
+    identity = pd.Series('', index=df.index, dtype=object)
+    for prefix, fields in (('id', id_fields), ('tazkira', tazkira)):
+        for field in fields:
+            fill = (identity == '') & (text[field] != '')
+            identity[fill] = prefix + ':' + text.loc[fill, field]
+    if name_fields:
+        names = text[name_fields].apply(lambda col: col.str.casefold()).agg('\x1f'.join, axis=1)
+        identity = identity.where(identity != '', 'name:' + names)
+    keys = _hash_rows(identity.to_frame())
+    occurrence = keys.groupby(keys, sort=False).cumcount()
+    return keys.where(occurrence == 0, keys + '-' + occurrence.astype(str))
+
+
+def content_hashes(df: pd.DataFrame) -> pd.Series:
+    """Hash of every normalised cell in the row (columns in sorted order)."""
+    text = normalise_frame(df[sorted(df.columns, key=str)])
+    return _hash_rows(text)
+
+
+def load_state(path: str) -> Dict[str, dict]:
+    """Rows recorded by the last run: key -> {'hash', 'student_username', 'parent_username'}."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"{path} was written with different row keys (version {state.get('version')}); "
+                         f"remove it to start over (every row then counts as new)")
+    return state.get('rows', {})
+
+
+def save_state(path: str, rows: Dict[str, dict], source: str = '') -> None:
+    """Write the state atomically so an interrupted run keeps the previous one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'source': source, 'rows': rows}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def pending_path(path: str) -> str:
+    """Where a cleaning run leaves its state until the delta has been imported."""
+    return f"{os.path.splitext(path)[0]}.pending.json"
+
+
+def commit_pending(path: str) -> bool:
+    """Make the pending state the current one; False if there is none."""
+    pending = pending_path(path)
+    if not os.path.exists(pending):
+        return False
+    os.replace(pending, path)
+    return True
+
+
+def diff_rows(keys: pd.Series, hashes: pd.Series, state: Dict[str, dict]) -> Tuple[pd.Series, List[str]]:
+    """Change type per row ('new', 'changed', 'unchanged') and keys no longer present."""
+    previous = pd.Series({key: entry.get('hash') for key, entry in state.items()}, dtype=object)
+    old_hash = keys.map(previous)
+    change = pd.Series('unchanged', index=keys.index, dtype=object)
+    change[old_hash.isna()] = 'new'
+    change[old_hash.notna() & (old_hash != hashes)] = 'changed'
+    removed = sorted(set(state) - set(keys))
+    return change, removed
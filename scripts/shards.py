@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Splitting one big import over several importer processes.
+
+`--shard i/N` gives each process a fixed part of the dump: a family goes to
+shard crc32(key of its first row) mod N, so every run (and every host)
+puts the same rows in the same shard and siblings always share one. The N
+processes are started by hand, each with its own i.
+
+With a lease directory (LEASE_DIR, any directory the workers share, e.g.
+over NFS) the workers split the rows between themselves instead. The
+families are cut into chunks of about LEASE_CHUNK_ROWS rows, and a worker
+claims one chunk at a time by creating its lease file exclusively:
+
+  <LEASE_DIR>/<job>/chunk-000012.lease   owner, token and expiry; renewed while held
+  <LEASE_DIR>/<job>/chunk-000012.rows    every row created so far: key, tab, its parent's ID
+  <LEASE_DIR>/<job>/chunk-000012.done    the chunk is finished
+
+A lease that was not renewed for LEASE_TTL_S seconds (the worker died) is
+taken over by the next worker that scans it. The new owner skips the rows
+listed in the .rows file, so rows are not posted twice, and links their
+siblings to the parents recorded there. Workers keep
+scanning until every chunk is done, so the chunks of a worker that died
+are picked up.
+Both modes can be combined; each shard then has its own job directory.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Configuration
+LEASE_DIR = os.environ.get('LEASE_DIR', '')
+LEASE_CHUNK_ROWS = int(os.environ.get('LEASE_CHUNK_ROWS', '500'))
+LEASE_TTL_S = float(os.environ.get('LEASE_TTL_S', '120'))
+
+Shard = Tuple[int, int]           # (i, N) with 1 <= i <= N
+
+
+def parse_shard(text: str) -> Shard:
+    """'2/4' -> (2, 4); raises ValueError for anything else."""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {text!r}") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {text!r}: i must be between 1 and N")
+    return index, count
+
+
+def shard_of(key: Any, count: int) -> int:
+    """1-based shard of a row key; crc32, not hash(), so it is the same in every process."""
+    return zlib.crc32(str(key).encode('utf-8')) % count + 1
+
+
+def shard_label(shard: Optional[Shard]) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}" if shard else ''
+
+
+def select_shard(keys: List[Any], roots: List[int], shard: Shard) -> List[int]:
+    """Positions of the rows in `shard`; a row goes where its family's first row (`roots`) goes."""
+    return [position for position, root in enumerate(roots) if shard_of(keys[root], shard[1]) == shard[0]]
+
+
+def chunk_rows(positions: Iterable[int], roots: List[int], size: int = LEASE_CHUNK_ROWS) -> Dict[int, List[int]]:
+    """Positions per chunk number, whole families per chunk, in row order."""
+    chunks: Dict[int, List[int]] = {}
+    for position in positions:
+        chunks.setdefault(roots[position] // size, []).append(position)
+    return dict(sorted(chunks.items()))
+
+
+def job_name(source: str, keys: List[Any], shard: Optional[Shard] = None) -> str:
+    """Lease directory name for one dump: file name plus a checksum of its row keys."""
+    checksum = zlib.crc32('\n'.join(str(key) for key in keys).encode('utf-8'))
+    name = f"{os.path.splitext(os.path.basename(source))[0]}-{checksum:08x}"
+    return f"{name}-{shard_label(shard)}" if shard else name
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease:
+    """One claimed chunk: its rows, the rows already created, and a lost flag set if another worker took it.
+
+    The chunk is marked done once the send loop is through it (`finish`)
+    and none of its rows are still waiting in the retry queue.
+    """
+
+    def __init__(self, store: 'LeaseStore', chunk: int, rows: List[int], token: str,
+                 created: Dict[str, Optional[int]]):
+        self.store = store
+        self.chunk = chunk
+        self.rows = rows
+        self.token = token
+        # Row key -> parent ID of the rows earlier owners created
+        self.created = created
+        self.lost = False
+        self._outstanding = 0
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def mark(self, key: Any, parent_id: Optional[int] = None) -> None:
+        """Record that the row with `key` was created (linked to `parent_id`)."""
+        with self._lock:
+            with open(self.store.path(self.chunk, 'rows'), 'a', encoding='utf-8') as f:
+                f.write(f"{key}\t{parent_id or ''}\n")
+
+    def retrying(self) -> None:
+        with self._lock:
+            self._outstanding += 1
+
+    def retried(self) -> None:
+        with self._lock:
+            self._outstanding -= 1
+            ready = self._finished and not self._outstanding
+        if ready:
+            self.store.complete(self)
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finished = True
+            ready = not self._outstanding
+        if ready:
+            self.store.complete(self)
+
+
+class LeaseStore:
+    """Chunk leases in a shared directory; see the module docstring."""
+
+    def __init__(self, directory: str, chunks: Dict[int, List[int]], log: Callable[[str], None] = print,
+                 ttl: float = LEASE_TTL_S, owner: Optional[str] = None):
+        self.directory = directory
+        self.chunks = chunks
+        self.log = log
+        self.ttl = ttl
+        self.owner = owner or worker_id()
+        self.held: Dict[int, Lease] = {}
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._heartbeat = threading.Thread(target=self._renew_loop, daemon=True)
+        self._heartbeat.start()
+
+    def path(self, chunk: int, kind: str) -> str:
+        return os.path.join(self.directory, f"chunk-{chunk:06d}.{kind}")
+
+    def _read(self, chunk: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(chunk, 'lease'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _record(self, token: str) -> str:
+        return json.dumps({'owner': self.owner, 'token': token, 'expires': time.time() + self.ttl})
+
+    def _create(self, chunk: int, token: str) -> bool:
+        """Create the lease file; False if it already exists (O_EXCL, so only one worker wins)."""
+        try:
+            fd = os.open(self.path(chunk, 'lease'), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self._record(token))
+        return True
+
+    def _take_over(self, chunk: int, expired: Dict[str, Any], token: str) -> bool:
+        """Replace an expired lease; only one of several workers racing for it wins."""
+        path = self.path(chunk, 'lease')
+        stale = f"{path}.{self.owner}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        try:
+            with open(stale, 'r', encoding='utf-8') as f:
+                moved = json.load(f)
+        except (OSError, ValueError):
+            moved = {}
+        if moved != expired:
+            # Renewed or taken over since we read it: put it back unless the slot was refilled
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        return self._create(chunk, token)
+
+    def _claim(self, chunk: int) -> Optional[Lease]:
+        token = uuid.uuid4().hex
+        if not self._create(chunk, token):
+            lease = self._read(chunk)
+            if lease is None or lease.get('expires', 0) > time.time() or not self._take_over(chunk, lease, token):
+                return None
+            self.log(f"🔓 Took over chunk {chunk} from {lease.get('owner')} (lease expired)")
+        if os.path.exists(self.path(chunk, 'done')):
+            # Finished between our scan and the claim
+            os.remove(self.path(chunk, 'lease'))
+            return None
+        created: Dict[str, Optional[int]] = {}
+        try:
+            with open(self.path(chunk, 'rows'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, _, parent_id = line.rstrip('\n').partition('\t')
+                    if key:
+                        created[key] = int(parent_id) if parent_id.isdigit() else None
+        except OSError:
+            pass
+        lease = Lease(self, chunk, self.chunks[chunk], token, created)
+        with self._held_lock:
+            self.held[chunk] = lease
+        return lease
+
+    def claim_all(self) -> Iterator[Lease]:
+        """Claim chunks one at a time until every chunk is done (by this worker or another)."""
+        while True:
+            pending = [chunk for chunk in self.chunks if not os.path.exists(self.path(chunk, 'done'))
+                       and chunk not in self.held]
+            if not pending:
+                return
+            claimed = False
+            for chunk in pending:
+                lease = self._claim(chunk)
+                if lease is not None:
+                    claimed = True
+                    yield lease
+            if not claimed:
+                self.log(f"⏳ {len(pending)} chunks leased by other workers; waiting in case one of them stops")
+                time.sleep(min(self.ttl / 2, 30))
+
+    def complete(self, lease: Lease) -> None:
+        """Mark the chunk done and drop the lease (unless another worker took it meanwhile)."""
+        with self._held_lock:
+            self.held.pop(lease.chunk, None)
+        if lease.lost:
+            return
+        with open(self.path(lease.chunk, 'done'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'owner': self.owner, 'rows': len(lease.rows), 'time': time.time()}))
+        self.release(lease)
+
+    def release(self, lease: Lease) -> None:
+        """Give the chunk back without finishing it; the next worker continues from its .rows file."""
+        with self._held_lock:
+            self.held.pop(lease.chunk, None)
+        current = self._read(lease.chunk)
+        if current is not None and current.get('token') == lease.token:
+            try:
+                os.remove(self.path(lease.chunk, 'lease'))
+            except FileNotFoundError:
+                pass
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            with self._held_lock:
+                leases = list(self.held.values())
+            for lease in leases:
+                current = self._read(lease.chunk)
+                if current is None or current.get('token') != lease.token:
+                    if not lease.lost:
+                        lease.lost = True
+                        self.log(f"⚠️ Lost the lease on chunk {lease.chunk}; leaving it to "
+                                 f"{(current or {}).get('owner', 'another worker')}")
+                    continue
+                tmp = f"{self.path(lease.chunk, 'lease')}.{self.owner}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(self._record(lease.token))
+                os.replace(tmp, self.path(lease.chunk, 'lease'))
+
+    def close(self) -> None:
+        self._stop.set()
+        self._heartbeat.join()
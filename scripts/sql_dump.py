@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Minimal reader for phpMyAdmin/mysqldump INSERT statements.
+
+Shared by the SQL importer (students.sql), the cleaner's class checks
+(classes.sql) and the multi-table loader (import_dump.py), so dumps are
+parsed the same way everywhere. The file is read line by line in one pass;
+rows of every table are yielded as they are reached.
+"""
+
+import re
+from typing import Any, Iterator, List, Optional, Tuple
+
+_CREATE_HEADER = re.compile(r"\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\(", re.IGNORECASE)
+_COLUMN_LINE = re.compile(r"\s*`(\w+)`\s")
+_INSERT_HEADER = re.compile(
+    r"\s*INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.IGNORECASE)
+# Quoted strings (backslash escapes), punctuation, and runs of anything else.
+# A quote with no closing quote on the line matches nothing: the string goes on.
+_TOKEN = re.compile(r"""'[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"|[(),;]|[^'"(),;]+""", re.DOTALL)
+
+Row = Tuple[str, Optional[List[str]], List[Any]]
+
+
+def _normalize(v: str) -> Any:
+    if v.upper() == 'NULL':
+        return None
+    if len(v) >= 2 and v[0] in ("'", '"') and v[-1] == v[0]:
+        s = v[1:-1]
+        s = s.replace('\\"', '"').replace("\\'", "'")
+        return s
+    # numbers (keep as string if leading zeros important; here safe to keep string for dates etc.)
+    return v if re.search(r"[^0-9.-]", v) else (int(v) if re.fullmatch(r"-?\d+", v) else float(v))
+
+
+def iter_insert_rows(sql_path: str) -> Iterator[Row]:
+    """(table, column names, values) for every row of every INSERT in the dump.
+
+    Column names come from the INSERT's column list, or from the table's
+    CREATE TABLE when the INSERT has none (plain mysqldump output); None if
+    neither is in the file. `--` comment lines between tuples are skipped.
+    """
+    create_columns = {}
+    creating = None
+    table = None
+    columns = None
+    depth = 0
+    values: List[str] = []
+    buf: List[str] = []
+    carry = ''
+    with open(sql_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if table is None:
+                if creating is not None:
+                    column = _COLUMN_LINE.match(line)
+                    if column:
+                        create_columns[creating].append(column.group(1))
+                    elif line.lstrip().startswith(')'):
+                        creating = None
+                    continue
+                header = _CREATE_HEADER.match(line)
+                if header:
+                    creating = header.group(1)
+                    create_columns[creating] = []
+                    continue
+                header = _INSERT_HEADER.match(line)
+                if not header:
+                    continue
+                table = header.group(1)
+                columns = ([c.strip().strip('`') for c in header.group(2).split(',')] if header.group(2)
+                           else create_columns.get(table))
+                text = line[header.end():]
+            elif not carry and depth == 0 and line.lstrip().startswith('--'):
+                continue
+            else:
+                text = carry + line
+                carry = ''
+
+            pos = 0
+            while pos < len(text):
+                token = _TOKEN.match(text, pos)
+                if token is None:
+                    carry = text[pos:]
+                    break
+                t = token.group()
+                pos = token.end()
+                if depth == 0:
+                    if t == '(':
+                        depth, values, buf = 1, [], []
+                    elif t == ';':
+                        table = None
+                        break
+                elif t == '(':
+                    depth += 1
+                    buf.append(t)
+                elif t == ')':
+                    depth -= 1
+                    if depth:
+                        buf.append(t)
+                        continue
+                    if buf or values:
+                        values.append(''.join(buf).strip())
+                    yield table, columns, [_normalize(v) for v in values]
+                elif t == ',' and depth == 1:
+                    values.append(''.join(buf).strip())
+                    buf = []
+                else:
+                    buf.append(t)
+
+
+def read_insert_rows(sql_path: str, table: str) -> List[List[Any]]:
+    """Parse INSERT INTO `<table>` ... VALUES (...), (...); into list of row value lists.
+    Robustly handles quoted strings, escaped quotes, NULL, and numbers.
+    """
+    return [values for name, _, values in iter_insert_rows(sql_path) if name.lower() == table.lower()]
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Diff/sync planner for re-imports: compares a source (students.sql dump or a
+cleaned workbook) with the students already on the server and applies only
+the difference.
+
+- The server side is a paged snapshot of GET /students (pages fetched
+  concurrently), indexed once.
+- Source rows and server students are matched with hash joins on stable
+  keys, strongest first: student tazkira, real phone number (generated
+  placeholder phones are ignored), then folded student + parent names. A key
+  value shared by several rows on either side is ambiguous and not used;
+  rows that repeat every key (duplicates in the dump) pair up in order.
+- Matched students get an update with only the fields that differ; source
+  rows without a match are created; server students without a source row
+  are deleted (only with --delete), but only in the classes the source
+  has students in, so one class's workbook does not empty the rest of
+  the school. More than SYNC_MAX_DELETES deletes need --max-deletes.
+- The plan is written to SYNC_PLAN_FILE. With --apply it is sent through
+  POST /students/bulk/create, PUT /students/bulk/update and
+  DELETE /students/bulk/delete, SYNC_BATCH_SIZE students per request.
+  Those endpoints currently answer with the first student's response
+  instead of a count, so what was applied is read back from a fresh
+  snapshot: whatever the next plan still wants to change was not applied.
+
+New students join their family's existing parent when a sibling is already
+on the server. For a new family only the first child is created in the
+first pass; a second pass links its siblings to the parent it created.
+
+Usage:
+  AUTH_TOKEN=... python3 scripts/sync_students.py --file scripts/students.sql          # plan only
+  AUTH_TOKEN=... python3 scripts/sync_students.py --file Student_Data_Cleaned.xlsx --apply [--delete]
+"""
+
+import argparse
+import json
+import os
+import re
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from families import link_to_parent, name_key, phone_key, tazkira_key
+from import_students_from_sql import API_BASE_URL, AUTH_TOKEN, SCHOOL_ID, SQL_FILE_PATH, log_print
+
+
+# Configuration
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', '200'))
+SNAPSHOT_WORKERS = int(os.environ.get('SNAPSHOT_WORKERS', '8'))
+SYNC_PLAN_FILE = os.environ.get('SYNC_PLAN_FILE', './scripts/sync-students-plan.json')
+# --delete refuses to remove more students than this unless --max-deletes allows it
+SYNC_MAX_DELETES = int(os.environ.get('SYNC_MAX_DELETES', '50'))
+PAGE_SIZE = 100  # GET /students caps `limit` at 100
+
+# Student fields compared and updated as they are
+STUDENT_FIELDS = [
+    'classId', 'tazkiraNo', 'nationality', 'religion', 'previousSchool', 'admissionDate',
+    'originAddress', 'originCity', 'originProvince',
+    'currentAddress', 'currentCity', 'currentState', 'currentProvince',
+]
+# User fields: (column, key in the create/update payload, key in GET /students)
+USER_FIELDS = [
+    ('firstName', 'firstName', 'firstName'),
+    ('lastName', 'lastName', 'lastName'),
+    ('phone', 'phone', 'phone'),
+    ('gender', 'gender', 'gender'),
+    ('birthDate', 'dateOfBirth', 'birthDate'),
+]
+DATE_FIELDS = {'admissionDate', 'user.birthDate'}
+# Join keys, strongest first; `record` (all of them) pairs up exact duplicates
+MATCH_KEYS = ['tazkira', 'phone', 'name', 'record']
+
+# Placeholder phones the importers generate (+93 and eight digits) are not identities
+GENERATED_PHONE = re.compile(r'^\+937\d{7}$')
+
+
+def make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=SNAPSHOT_WORKERS, pool_maxsize=SNAPSHOT_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+    if AUTH_TOKEN:
+        session.headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    return session
+
+
+def fetch_students_page(session: requests.Session, page: int) -> Tuple[List[Dict[str, Any]], int]:
+    resp = session.get(f"{API_BASE_URL}/students",
+                       params={'page': page, 'limit': PAGE_SIZE, 'schoolId': SCHOOL_ID}, timeout=60)
+    resp.raise_for_status()
+    body = resp.json()
+    pagination = (body.get('meta') or {}).get('pagination') or body.get('pagination') or {}
+    return body.get('data') or [], int(pagination.get('totalPages') or 1)
+
+
+def fetch_snapshot(session: requests.Session) -> List[Dict[str, Any]]:
+    """Every server student of the school: page 1 first, then the rest in parallel."""
+    students, pages = fetch_students_page(session, 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as pool:
+            for page_students, _ in pool.map(lambda page: fetch_students_page(session, page), range(2, pages + 1)):
+                students.extend(page_students)
+    return students
+
+
+def source_from_sql(path: str, class_ids: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], pd.Series]:
+    """API payloads and family roots for a students.sql dump, built as the SQL importer builds them."""
+    from import_students_from_sql import (assign_usernames, group_families, map_sql_row_to_api,
+                                          normalise_row_dates, read_sql_insert_rows, to_row_dict)
+    rows = [to_row_dict(values) for values in read_sql_insert_rows(path)]
+    usernames = assign_usernames(rows)
+    normalise_row_dates(rows)
+    payloads = [map_sql_row_to_api(row, idx, usernames[idx], class_ids) for idx, row in enumerate(rows)]
+    return payloads, group_families(rows)
+
+
+def source_from_excel(path: str) -> Tuple[List[Dict[str, Any]], pd.Series]:
+    """API payloads and family roots for a cleaned workbook, built as the Excel importer builds them."""
+    from import_students_from_excel import group_families, prepare_dataframe, transform_excel_row_to_api_payload
+    df = prepare_dataframe(pd.read_excel(path))
+    payloads = [transform_excel_row_to_api_payload(row, idx) for idx, (_, row) in enumerate(df.iterrows())]
+    return payloads, group_families(df).reset_index(drop=True)
+
+
+def comparable(values: pd.Series, column: str) -> pd.Series:
+    """Stripped text for comparison; dates cut to the day; NA for blanks."""
+    text = values.astype('string').str.strip()
+    if column in DATE_FIELDS:
+        text = text.str[:10]
+    return text.mask(text.isin(['', 'nan', 'None', 'NaT']))
+
+
+def student_frame(records: List[Dict[str, Any]], server: bool) -> pd.DataFrame:
+    """Compared fields and key parts of payloads (server=False) or GET /students records."""
+    flat = []
+    for record in records:
+        user = record.get('user') or {}
+        parent_user = (record.get('parent') or {}).get('user') or {}
+        row = {field: record.get(field) for field in STUDENT_FIELDS}
+        for column, payload_key, server_key in USER_FIELDS:
+            row[f'user.{column}'] = user.get(server_key if server else payload_key)
+        row['parentFirstName'] = parent_user.get('firstName')
+        row['parentLastName'] = parent_user.get('lastName')
+        if server:
+            row['id'] = record.get('id')
+            row['parentId'] = record.get('parentId') or (record.get('parent') or {}).get('id')
+        flat.append(row)
+    columns = STUDENT_FIELDS + [f'user.{column}' for column, _, _ in USER_FIELDS] + ['parentFirstName', 'parentLastName']
+    frame = pd.DataFrame(flat, dtype=object, columns=columns + (['id', 'parentId'] if server else []))
+    for column in frame.columns:
+        frame[column] = comparable(frame[column], column)
+    frame['user.phone'] = frame['user.phone'].mask(frame['user.phone'].str.match(GENERATED_PHONE.pattern, na=False))
+    frame['user.tazkiraNo'] = pd.Series(
+        [(record.get('user') or {}).get('tazkiraNo') for record in records], index=frame.index, dtype='string')
+    return frame
+
+
+def match_keys(frame: pd.DataFrame) -> pd.DataFrame:
+    keys = pd.DataFrame({
+        'tazkira': tazkira_key(frame['tazkiraNo'].fillna(frame['user.tazkiraNo'])),
+        'phone': phone_key(frame['user.phone']),
+        'name': name_key(frame['user.firstName'], frame['user.lastName'],
+                         frame['parentFirstName'], frame['parentLastName']),
+    })
+    record = keys['tazkira'].fillna('') + '|' + keys['phone'].fillna('') + '|' + keys['name'].fillna('')
+    keys['record'] = record.where(keys.notna().any(axis=1))
+    return keys
+
+
+def occurrence_key(values: pd.Series) -> pd.Series:
+    """Key value plus its occurrence number, so repeated rows pair up in order."""
+    return values + '#' + values.groupby(values, sort=False).cumcount().astype('string')
+
+
+def match_students(source_keys: pd.DataFrame, server_keys: pd.DataFrame) -> Tuple[pd.Series, Dict[str, int]]:
+    """Server position matched to each source row (NA if none), and how many each key matched."""
+    matched = pd.Series(pd.NA, index=source_keys.index, dtype='Int64')
+    free = pd.Series(True, index=server_keys.index)
+    counts = {}
+    for key in MATCH_KEYS:
+        left = source_keys.loc[matched.isna(), key].dropna()
+        right = server_keys.loc[free, key].dropna()
+        if key == 'record':
+            left, right = occurrence_key(left), occurrence_key(right)
+        else:
+            # A value held by more than one row on either side does not identify a student
+            left = left[~left.duplicated(keep=False)]
+            right = right[~right.duplicated(keep=False)]
+        hits = left.map(pd.Series(right.index, index=right.to_numpy())).dropna().astype('int64')
+        matched[hits.index] = hits
+        free[hits.to_numpy()] = False
+        counts[key] = int(len(hits))
+    return matched, counts
+
+
+def update_data(source_row: pd.Series, server_row: pd.Series, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """PUT data with the fields whose source value differs from the server's."""
+    data: Dict[str, Any] = {}
+    for field in STUDENT_FIELDS:
+        if pd.notna(source_row[field]) and source_row[field] != server_row[field]:
+            data[field] = payload.get(field)
+    user = {}
+    for column, payload_key, _ in USER_FIELDS:
+        value = source_row[f'user.{column}']
+        if pd.notna(value) and value != server_row[f'user.{column}']:
+            user[payload_key] = payload['user'].get(payload_key)
+    if user:
+        data['user'] = user
+    return data
+
+
+def plan_updates(payloads: List[Dict[str, Any]],
+                 server_students: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Updates for source rows that should already exist (an incremental delta's changed rows).
+
+    Returns the updates (empty `data` if the server is already up to date)
+    and the rows no server student matched.
+    """
+    source = student_frame(payloads, server=False)
+    server = student_frame(server_students, server=True)
+    matched, _ = match_students(match_keys(source), match_keys(server))
+    updates = [{'row': int(row), 'id': int(server.at[position, 'id']),
+                'data': update_data(source.loc[row], server.loc[position], payloads[row])}
+               for row, position in matched.dropna().items()]
+    return updates, [int(row) for row in matched.index[matched.isna()]]
+
+
+def plan_sync(payloads: List[Dict[str, Any]], roots: pd.Series,
+              server_students: List[Dict[str, Any]]) -> Dict[str, Any]:
+    source = student_frame(payloads, server=False)
+    server = student_frame(server_students, server=True)
+    matched, matched_by = match_students(match_keys(source), match_keys(server))
+
+    plan: Dict[str, Any] = {'creates': [], 'updates': [], 'deletes': [], 'deferred': [],
+                            'unchanged': 0, 'outsideSource': 0, 'matchedBy': matched_by}
+    family_parent: Dict[int, Optional[str]] = {}
+    for row, position in matched.dropna().items():
+        parent_id = server.at[position, 'parentId']
+        if pd.notna(parent_id):
+            family_parent.setdefault(int(roots.iloc[row]), parent_id)
+        data = update_data(source.loc[row], server.loc[position], payloads[row])
+        if data:
+            plan['updates'].append({'row': int(row), 'id': int(server.at[position, 'id']), 'data': data})
+        else:
+            plan['unchanged'] += 1
+
+    for row in matched.index[matched.isna()]:
+        root = int(roots.iloc[row])
+        payload = payloads[row]
+        if family_parent.get(root):
+            payload = link_to_parent(payload, int(family_parent[root]))
+        elif root in family_parent:
+            # The family's first child is created in this pass; link this one in the next
+            plan['deferred'].append(int(row))
+            continue
+        else:
+            family_parent[root] = None
+        plan['creates'].append({'row': int(row), 'payload': payload})
+
+    # Only students of the source's classes can be missing from it; the rest of the school is not ours to judge
+    unmatched = server[~server.index.isin(matched.dropna())]
+    in_scope = unmatched['classId'].isin(set(source['classId'].dropna()))
+    plan['deletes'] = [int(student_id) for student_id in unmatched.loc[in_scope, 'id']]
+    plan['outsideSource'] = int((~in_scope).sum())
+    return plan
+
+
+def send_batches(session: requests.Session, method: str, path: str, key: str,
+                 items: List[Any], done_key: str) -> Dict[str, Any]:
+    """Send `items` as {key: batch} requests; returns the counts the server reported, and errors.
+
+    A reply without a `done_key` count (the bulk endpoints reply with the
+    first student's own response) is counted as unconfirmed, not as done.
+    """
+    result = {'done': 0, 'failed': 0, 'unconfirmed': 0, 'errors': []}
+    for start in range(0, len(items), SYNC_BATCH_SIZE):
+        batch = items[start:start + SYNC_BATCH_SIZE]
+        label = f"{path} {start + 1}-{start + len(batch)} of {len(items)}"
+        try:
+            resp = session.request(method, f"{API_BASE_URL}/students/{path}", data=json.dumps({key: batch}),
+                                   timeout=600)
+            body = resp.json() if resp.content else {}
+        except (requests.RequestException, ValueError) as e:
+            resp, body = None, {'message': str(e)}
+        if resp is None or resp.status_code not in (200, 201):
+            result['failed'] += len(batch)
+            message = f"HTTP {resp.status_code if resp is not None else '-'} - {body.get('message')}"
+            result['errors'].append(f"{label}: {message}")
+            log_print(f"❌ {label}: {message}")
+            continue
+        data = body.get('data') or {}
+        if done_key not in data:
+            result['unconfirmed'] += len(batch)
+            log_print(f"⚠️ {label}: no {done_key} count in the reply; checking against a fresh snapshot")
+            continue
+        done = int(data[done_key])
+        failed = int(data.get('failed', len(batch) - done))
+        result['done'] += done
+        result['failed'] += failed
+        result['errors'].extend(str(error.get('error', error)) if isinstance(error, dict) else str(error)
+                                for error in data.get('errors') or [])
+        log_print(f"{'✅' if not failed else '⚠️'} {label}: {done} {done_key}, {failed} failed")
+    return result
+
+
+def apply_plan(session: requests.Session, plan: Dict[str, Any], delete: bool) -> Dict[str, Any]:
+    summary = {
+        'created': send_batches(session, 'POST', 'bulk/create', 'students',
+                                [item['payload'] for item in plan['creates']], 'created'),
+        'updated': send_batches(session, 'PUT', 'bulk/update', 'updates',
+                                [{'id': item['id'], 'data': item['data']} for item in plan['updates']], 'updated'),
+    }
+    if delete:
+        summary['deleted'] = send_batches(session, 'DELETE', 'bulk/delete', 'studentIds', plan['deletes'], 'deleted')
+    return summary
+
+
+def confirm(plan: Dict[str, Any], after: Dict[str, Any], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Done/failed per kind as the server shows it: what `after` (planned from a fresh snapshot) still wants failed."""
+    pending_creates = {item['row'] for item in after['creates']} | set(after['deferred'])
+    pending_updates = {item['row'] for item in after['updates']}
+    pending_deletes = set(after['deletes'])
+    outcome = {
+        'created': [item['row'] in pending_creates for item in plan['creates']],
+        'updated': [item['row'] in pending_updates for item in plan['updates']],
+    }
+    if 'deleted' in summary:
+        outcome['deleted'] = [student_id in pending_deletes for student_id in plan['deletes']]
+    for kind, still_pending in outcome.items():
+        reported = summary[kind]
+        failed = sum(still_pending)
+        if failed > reported['failed']:
+            reported['errors'].append(f"{failed - reported['failed']} not applied although the reply "
+                                      f"did not report them as failed")
+        reported['done'], reported['failed'] = len(still_pending) - failed, failed
+    return summary
+
+
+def describe(plan: Dict[str, Any]) -> str:
+    matched = ', '.join(f"{count} by {key}" for key, count in plan['matchedBy'].items())
+    return (f"{len(plan['creates'])} to create, {len(plan['updates'])} to update, "
+            f"{plan['unchanged']} unchanged, {len(plan['deletes'])} only on the server "
+            f"({plan['outsideSource']} more in classes the source does not cover), "
+            f"{len(plan['deferred'])} siblings for a second pass (matched {matched})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan and apply a student re-import as creates/updates/deletes.')
+    parser.add_argument('--file', default=SQL_FILE_PATH, help='students.sql dump or cleaned workbook (.xlsx)')
+    parser.add_argument('--apply', action='store_true', help='Send the plan through the bulk endpoints')
+    parser.add_argument('--delete', action='store_true',
+                        help='With --apply, also delete server students that are not in the source')
+    parser.add_argument('--max-deletes', type=int, default=SYNC_MAX_DELETES,
+                        help='Refuse --delete when the plan deletes more students than this')
+    parser.add_argument('--plan-file', default=SYNC_PLAN_FILE, help='Where to write the plan (JSON)')
+    args = parser.parse_args()
+
+    if not AUTH_TOKEN:
+        log_print('❌ Set AUTH_TOKEN: listing and bulk endpoints need an admin token')
+        return
+
+    log_print(f"Reading source: {args.file}")
+    is_excel = args.file.lower().endswith(('.xlsx', '.xls'))
+    payloads, roots = source_from_excel(args.file) if is_excel else source_from_sql(args.file)
+    log_print(f"{len(payloads)} source students")
+
+    session = make_session()
+    passes = 2 if args.apply else 1
+    plan = None
+    for number in range(1, passes + 1):
+        if plan is None:
+            server_students = fetch_snapshot(session)
+            log_print(f"📥 Snapshot: {len(server_students)} students on the server")
+            plan = plan_sync(payloads, roots, server_students)
+        log_print(f"📋 Plan: {describe(plan)}")
+        if number == 1:
+            with open(args.plan_file, 'w', encoding='utf-8') as f:
+                json.dump({'createdAt': dt.datetime.now(dt.timezone.utc).isoformat(), 'source': args.file, **plan},
+                          f, indent=2, ensure_ascii=False, default=str)
+            log_print(f"Plan -> {args.plan_file}")
+        if not args.apply:
+            log_print('Dry run; pass --apply to send it')
+            return
+        if args.delete and len(plan['deletes']) > args.max_deletes:
+            log_print(f"❌ The plan deletes {len(plan['deletes'])} students (limit {args.max_deletes}); check "
+                      f"{args.plan_file} and rerun with --max-deletes {len(plan['deletes'])} if that is intended")
+            return
+        summary = apply_plan(session, plan, args.delete)
+        # The bulk replies cannot be trusted; the next snapshot shows what actually changed
+        server_students = fetch_snapshot(session)
+        log_print(f"📥 Snapshot after applying: {len(server_students)} students on the server")
+        after = plan_sync(payloads, roots, server_students)
+        summary = confirm(plan, after, summary)
+        log_print('Applied: ' + ', '.join(f"{kind} {result['done']} (failed {result['failed']})"
+                                          for kind, result in summary.items()))
+        for kind, result in summary.items():
+            for error in result['errors'][:5]:
+                log_print(f"   {kind}: {error}")
+        if not plan['deferred']:
+            break
+        plan = after
+
+
+if __name__ == '__main__':
+    main()
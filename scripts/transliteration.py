@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Dari/Pashto name normalisation and Latin transliteration.
+
+Two str.translate tables are built once at import time:
+
+- FOLD folds Arabic code points to their Persian forms, turns ZWNJ into a
+  space and drops tatweel and diacritics. Used for dedupe keys.
+- LATIN does the same folding and maps every Dari/Pashto letter and digit
+  to Latin in the same pass. Used for usernames.
+
+Full names repeat a lot, so the per-name functions are LRU-cached and the
+Series helpers translate each distinct name once.
+"""
+
+from functools import lru_cache
+import re
+
+import pandas as pd
+
+
+# Arabic code points that Persian keyboards type differently
+ARABIC_TO_PERSIAN = {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+}
+
+# ZWNJ separates the parts of compound names; ZWJ, tatweel and harakat carry no letters
+JOINERS = {'‌': ' ', '‍': None, 'ـ': None, **{chr(c): None for c in range(0x064B, 0x0660)}}
+
+DIGITS = dict(zip('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789'))
+
+# Persian letters plus the Pashto additions, in a plain romanisation
+PERSIAN_TO_LATIN = {
+    'ا': 'a', 'ب': 'b', 'پ': 'p', 'ت': 't', 'ث': 's', 'ج': 'j', 'چ': 'ch', 'ح': 'h',
+    'خ': 'kh', 'د': 'd', 'ذ': 'z', 'ر': 'r', 'ز': 'z', 'ژ': 'zh', 'س': 's', 'ش': 'sh',
+    'ص': 's', 'ض': 'z', 'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'q',
+    'ک': 'k', 'گ': 'g', 'ل': 'l', 'م': 'm', 'ن': 'n', 'و': 'o', 'ه': 'h', 'ی': 'i',
+    'ء': '',
+    # Pashto
+    'ټ': 't', 'ډ': 'd', 'ړ': 'r', 'ږ': 'zh', 'ښ': 'sh', 'ګ': 'g', 'ڼ': 'n',
+    'ې': 'e', 'ۍ': 'ai', 'ځ': 'dz', 'څ': 'ts', 'ڇ': 'ch',
+}
+
+
+def _build_tables():
+    fold = {**ARABIC_TO_PERSIAN, **JOINERS, **DIGITS}
+    latin = dict(fold)
+    for source, target in fold.items():
+        if target:
+            latin[source] = PERSIAN_TO_LATIN.get(target, target)
+    for letter, roman in PERSIAN_TO_LATIN.items():
+        latin[letter] = roman
+    return str.maketrans(fold), str.maketrans(latin)
+
+
+FOLD, LATIN = _build_tables()
+
+_SPACES = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+NAME_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def fold_name(name: str) -> str:
+    """Dedupe key for a name: Persian letters, casefolded, no punctuation or extra spaces."""
+    folded = _PUNCTUATION.sub('', name.translate(FOLD).casefold())
+    return _SPACES.sub(' ', folded).strip()
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def latin_name(name: str) -> str:
+    """Lowercase Latin rendering of a Dari/Pashto (or already Latin) name."""
+    return _SPACES.sub(' ', name.translate(LATIN).lower()).strip()
+
+
+def _per_unique(values: pd.Series, func) -> pd.Series:
+    """Apply a str -> str function once per distinct value; NA becomes ''."""
+    codes, uniques = pd.factorize(values.astype('string').fillna(''))
+    mapped = pd.Index([func(value) for value in uniques], dtype=object)
+    return pd.Series(mapped.take(codes), index=values.index, dtype=object)
+
+
+def fold_series(names: pd.Series) -> pd.Series:
+    return _per_unique(names, fold_name)
+
+
+def latin_series(names: pd.Series) -> pd.Series:
+    return _per_unique(names, latin_name)
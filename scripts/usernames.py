@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Username generation shared by the Excel cleaner and the student importers.
+
+Usernames are built column-wise with pandas string operations and made
+unique across the whole dataset in a single pass, so every stage of the
+workflow produces the same ASCII `first_last_suffix[_n]` format. Dari and
+Pashto names are transliterated to Latin first (see transliteration.py).
+"""
+
+from typing import Iterable, Optional, Set
+
+import pandas as pd
+
+from transliteration import latin_series
+
+
+def slugify_names(names: pd.Series, default: str) -> pd.Series:
+    """Transliterate names to Latin and reduce them to `[a-z0-9_]` username parts."""
+    slug = (
+        latin_series(names)
+        .astype('string')
+        .str.replace(r'\s+', '_', regex=True)
+        .str.replace(r'[^a-z0-9_]', '', regex=True)
+        .str.replace(r'_+', '_', regex=True)
+        .str.strip('_')
+    )
+    slug = slug.mask(slug.isin(['', 'nan', 'none']), default)
+    return slug.astype(object)
+
+
+def resolve_collisions(candidates: pd.Series, taken: Optional[Set[str]] = None) -> pd.Series:
+    """Make every candidate unique within the series and against `taken`.
+
+    The first occurrence of a name keeps it, later occurrences get `_2`,
+    `_3`, ... appended. Rows whose name is already in `taken` are numbered
+    one by one, in row order, after the names taken earlier. `taken` is
+    updated in place.
+    """
+    taken = taken if taken is not None else set()
+    if candidates.empty:
+        return candidates.astype(object)
+    rank = candidates.groupby(candidates, sort=False).cumcount()
+    result = candidates.where(rank == 0, candidates + '_' + (rank + 1).astype(str))
+
+    clashes = candidates.isin(taken) | result.isin(taken) | result.duplicated(keep='first')
+    if clashes.any():
+        used = set(result[~clashes])
+        used.update(taken)
+        next_suffix = {}
+        fixed = []
+        for base in candidates[clashes]:
+            if base not in used:
+                name = base
+            else:
+                n = next_suffix.get(base, 2)
+                name = f"{base}_{n}"
+                while name in used:
+                    n += 1
+                    name = f"{base}_{n}"
+                next_suffix[base] = n + 1
+            used.add(name)
+            fixed.append(name)
+        result = result.copy()
+        result[clashes] = fixed
+
+    taken.update(result)
+    return result
+
+
+def build_usernames(first_names: pd.Series, last_names: pd.Series, suffix: str,
+                    taken: Optional[Set[str]] = None,
+                    default_first: str = 'user', default_last: str = 'user') -> pd.Series:
+    """Build unique `first_last_suffix` usernames for whole columns at once."""
+    first = slugify_names(first_names, default_first)
+    last = slugify_names(last_names, default_last)
+    candidates = first + '_' + last + '_' + suffix
+    return resolve_collisions(candidates.reset_index(drop=True), taken).set_axis(first_names.index)
+
+
+def fill_usernames(existing: Optional[pd.Series], first_names: pd.Series, last_names: pd.Series,
+                   suffix: str, taken: Optional[Set[str]] = None, **defaults) -> pd.Series:
+    """Keep usernames already present in `existing`, generate the missing ones.
+
+    Provided usernames are reserved first so generated ones never shadow them.
+    """
+    taken = taken if taken is not None else set()
+    if existing is None:
+        return build_usernames(first_names, last_names, suffix, taken, **defaults)
+
+    provided = existing.astype('string').str.strip()
+    missing = provided.isna() | provided.str.lower().isin(['', 'nan', 'none'])
+    taken.update(provided[~missing])
+    result = provided.astype(object).where(~missing)
+    if missing.any():
+        result[missing] = build_usernames(
+            first_names[missing], last_names[missing], suffix, taken, **defaults
+        )
+    return result
+
+
+def usernames_for_rows(first_names: Iterable[Optional[str]], last_names: Iterable[Optional[str]],
+                       suffix: str, taken: Optional[Set[str]] = None, **defaults) -> list:
+    """List-in/list-out wrapper for importers that do not work on DataFrames."""
+    first = pd.Series(list(first_names), dtype=object)
+    last = pd.Series(list(last_names), dtype=object)
+    return build_usernames(first, last, suffix, taken, **defaults).tolist()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Declarative validation rules for cleaned student sheets.
+
+Every rule is evaluated as one boolean mask over the whole DataFrame and
+each failing cell becomes a row of the issues table (Excel row, column,
+rule, severity, value). Rows with errors can then be held back before the
+import, so they never cost an API round-trip.
+"""
+
+import datetime as dt
+import os
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from sql_dump import read_insert_rows
+
+
+class Rule(NamedTuple):
+    name: str
+    column: str
+    severity: str  # 'error' rows are dropped before import, 'warning' rows are kept
+    message: str
+    # check(df, context) -> boolean Series, True where the row breaks the rule
+    check: Callable[[pd.DataFrame, dict], pd.Series]
+    # Extra columns the check reads; the rule is skipped when any is missing
+    needs: tuple = ()
+
+
+def _text(series: pd.Series) -> pd.Series:
+    text = series.astype('string').str.strip()
+    return text.mask(text.str.lower().isin(['', 'nan', 'none', 'nat', '<na>']))
+
+
+def _dates(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(_text(series), errors='coerce', format='%Y-%m-%d')
+
+
+def required(column: str, severity: str = 'warning',
+             message: str = 'required value missing; a default will be filled in') -> Rule:
+    return Rule('required', column, severity, message, lambda df, ctx: _text(df[column]).isna())
+
+
+def matches(name: str, column: str, pattern: str, message: str, severity: str = 'error') -> Rule:
+    """Non-blank values must match `pattern` in full."""
+    def check(df, ctx):
+        text = _text(df[column])
+        return text.notna() & ~text.str.fullmatch(pattern).fillna(False)
+    return Rule(name, column, severity, message, check)
+
+
+def date_parsed(column: str, severity: str = 'error') -> Rule:
+    """Values present in the source sheet must survive date cleaning."""
+    def check(df, ctx):
+        source = ctx.get('source')
+        if source is None or column not in source.columns:
+            return pd.Series(False, index=df.index)
+        original = _text(source[column].reindex(df.index))
+        return original.notna() & _dates(df[column]).isna()
+    return Rule('date_unparseable', column, severity, 'date could not be read', check)
+
+
+def date_between(column: str, earliest: str, latest_days_ahead: int = 0, severity: str = 'error') -> Rule:
+    """Dates must fall between `earliest` and today (+ `latest_days_ahead`)."""
+    def check(df, ctx):
+        latest = pd.Timestamp(ctx.get('today', dt.date.today())) + pd.Timedelta(days=latest_days_ahead)
+        dates = _dates(df[column])
+        return dates.notna() & ((dates < pd.Timestamp(earliest)) | (dates > latest))
+    return Rule('date_range', column, severity, f'date outside {earliest} .. today', check)
+
+
+def date_before(name: str, earlier: str, later: str, message: str, severity: str = 'error') -> Rule:
+    """When both dates are present, `earlier` must come before `later`."""
+    def check(df, ctx):
+        first, second = _dates(df[earlier]), _dates(df[later])
+        return first.notna() & second.notna() & (first >= second)
+    return Rule(name, earlier, severity, message, check, needs=(later,))
+
+
+def known_class(column: str, severity: str = 'error') -> Rule:
+    """Class IDs must exist in the known class list (by trailing number, as the importers map them)."""
+    def check(df, ctx):
+        text = _text(df[column])
+        numbers = pd.to_numeric(text.str.extract(r'(\d+)\s*$', expand=False), errors='coerce')
+        invalid = text.notna() & numbers.isna()
+        known = ctx.get('known_classes')
+        if known:
+            invalid |= numbers.notna() & ~numbers.isin(known)
+        return invalid
+    return Rule('unknown_class', column, severity, 'class does not exist', check)
+
+
+REQUIRED_FIELDS = [
+    'Student_First_Name*', 'Student_Last_Name*', 'Student_Gender*', 'Student_Date_of_Birth*',
+    'Parent_First_Name*', 'Parent_Last_Name*', 'Parent_Gender*', 'Parent_Birth_Date*',
+    'Admission_Date*', 'Student_Phone*', 'Parent_Phone*',
+]
+
+# Phones after _clean_phones: a '+' and the country code plus subscriber number
+PHONE_PATTERN = r'\+\d{10,13}'
+# e-Tazkira (1400-0900-41671) or the digits of a paper tazkira
+TAZKIRA_PATTERN = r'\d{4}-\d{4}-\d{5}|\d{4,10}'
+
+DEFAULT_RULES: List[Rule] = (
+    [required(column) for column in REQUIRED_FIELDS]
+    + [matches('phone_format', column, PHONE_PATTERN, 'phone is not +<country code><number>')
+       for column in ('Student_Phone*', 'Parent_Phone*')]
+    + [date_parsed(column) for column in ('Student_Date_of_Birth*', 'Parent_Birth_Date*', 'Admission_Date*')]
+    + [
+        date_between('Student_Date_of_Birth*', '1950-01-01'),
+        date_between('Parent_Birth_Date*', '1900-01-01'),
+        date_between('Admission_Date*', '1990-01-01', latest_days_ahead=365),
+        date_before('dob_after_admission', 'Student_Date_of_Birth*', 'Admission_Date*',
+                    'student born on or after the admission date'),
+        date_before('parent_younger_than_student', 'Parent_Birth_Date*', 'Student_Date_of_Birth*',
+                    'parent born on or after the student', severity='warning'),
+        known_class('Class_ID*'),
+    ]
+    + [matches('tazkira_format', column, TAZKIRA_PATTERN, 'tazkira number is not 1234-5678-12345 or 4-10 digits',
+               severity='warning')
+       for column in ('Student_Tazkira_No', 'Parent_Tazkira_No')]
+)
+
+
+def load_known_classes(path: str) -> Set[int]:
+    """Class numbers from a classes.sql dump, or from a text/CSV file with one ID per line."""
+    if path.lower().endswith('.sql'):
+        ids = [row[0] for row in read_insert_rows(path, 'classes') if row]
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            ids = [line.split(',')[0].strip() for line in f if line.strip()]
+    numbers = pd.to_numeric(pd.Series(ids, dtype='string').str.extract(r'(\d+)\s*$', expand=False),
+                            errors='coerce')
+    return set(numbers.dropna().astype(int))
+
+
+ISSUE_COLUMNS = ['excel_row', 'column', 'rule', 'severity', 'value', 'message']
+
+
+def evaluate(df: pd.DataFrame, rules: Optional[Iterable[Rule]] = None,
+             context: Optional[Dict] = None) -> pd.DataFrame:
+    """One row per failing cell; `excel_row` counts the header as row 1."""
+    context = context or {}
+    parts = []
+    for rule in (DEFAULT_RULES if rules is None else rules):
+        if rule.column not in df.columns or any(col not in df.columns for col in rule.needs):
+            continue
+        mask = rule.check(df, context).fillna(False).to_numpy(dtype=bool)
+        positions = np.flatnonzero(mask)
+        if not len(positions):
+            continue
+        rows = df.index[positions]
+        values = _text(df[rule.column].iloc[positions])
+        source = context.get('source')
+        if source is not None and rule.column in source.columns:
+            # Show what was typed when cleaning blanked the cell (e.g. unreadable dates)
+            values = values.fillna(_text(source[rule.column].reindex(rows)))
+        parts.append(pd.DataFrame({
+            'excel_row': rows + 2 if pd.api.types.is_integer_dtype(df.index) else rows,
+            'column': rule.column,
+            'rule': rule.name,
+            'severity': rule.severity,
+            'value': values.fillna('').to_numpy(),
+            'message': rule.message,
+        }))
+    if not parts:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    return pd.concat(parts, ignore_index=True).sort_values(['excel_row', 'column'], kind='stable')
+
+
+def error_rows(df: pd.DataFrame, issues: pd.DataFrame) -> pd.Series:
+    """Boolean mask of rows in `df` with at least one error."""
+    bad = issues.loc[issues['severity'] == 'error', 'excel_row']
+    rows = df.index + 2 if pd.api.types.is_integer_dtype(df.index) else df.index
+    return pd.Series(np.isin(rows, bad.to_numpy()), index=df.index)
+
+
+def write_issues(issues: pd.DataFrame, path: str) -> None:
+    """CSV by default, JSON records when the path ends in .json."""
+    if os.path.splitext(path)[1].lower() == '.json':
+        issues.to_json(path, orient='records', force_ascii=False, indent=2)
+    else:
+        issues.to_csv(path, index=False, encoding='utf-8')
+
+
+def summarise(issues: pd.DataFrame) -> List[str]:
+    """Short human-readable lines for logs and reports."""
+    if issues.empty:
+        return ['No validation issues found']
+    errors = issues[issues['severity'] == 'error']
+    lines = [f"{len(issues)} issues ({len(errors)} errors in {errors['excel_row'].nunique()} rows)"]
+    counts = issues.groupby(['severity', 'rule', 'column'], sort=True).size()
+    lines += [f"  {severity} {rule} [{column}]: {count}" for (severity, rule, column), count in counts.items()]
+    return lines
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Post-import verification: checks that what the source says was imported is
+actually on the server, field by field.
+
+- The server side is the same paged GET /students snapshot sync_students.py
+  takes (pages fetched concurrently).
+- Source rows are found on the server by the studentId the run log recorded
+  for them; rows the log has no ID for (failed rows, Excel imports) are
+  matched on tazkira, phone and names like sync_students.py does. That also
+  finds students the server created while answering with an error.
+- Expected and stored fields are normalised the same way and hashed per row;
+  only rows whose hashes differ are compared field by field. Fields the
+  source leaves blank are not checked; parent names are compared folded.
+
+The report goes to VERIFY_REPORT_FILE; the exit code is 1 when students are
+missing or differ.
+
+Usage:
+  AUTH_TOKEN=... python3 scripts/verify_import.py                          # students.sql + its import log
+  AUTH_TOKEN=... python3 scripts/verify_import.py --remap scripts/import-dump-remap.json
+  AUTH_TOKEN=... python3 scripts/verify_import.py --file Student_Data_Cleaned.xlsx --log import-students-from-excel-log.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from families import value_key
+from import_students_from_sql import AUTH_TOKEN, LOG_FILE, SQL_FILE_PATH, log_print
+from sync_students import (STUDENT_FIELDS, USER_FIELDS, fetch_snapshot, make_session, match_keys,
+                           match_students, source_from_excel, source_from_sql, student_frame)
+from transliteration import fold_series
+
+
+# Configuration
+VERIFY_REPORT_FILE = os.environ.get('VERIFY_REPORT_FILE', './scripts/verify-import-report.json')
+# Mismatches printed to the console (all of them go to the report)
+SHOW_MISMATCHES = int(os.environ.get('SHOW_MISMATCHES', '20'))
+
+COMPARED_FIELDS = STUDENT_FIELDS + [f'user.{column}' for column, _, _ in USER_FIELDS] + ['parentFirstName', 'parentLastName']
+# Siblings share the parent created with the first child's spelling of the names
+FOLDED_FIELDS = ['parentFirstName', 'parentLastName']
+
+
+def read_run_log(path: Optional[str]) -> Dict[int, Dict[str, Any]]:
+    """Source row (0-based) -> its entry in a student import log ({} without a usable log)."""
+    if not path:
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            log = json.load(f)
+    except (OSError, ValueError) as e:
+        log_print(f"⚠️ Cannot read run log {path} ({e}); matching every row on keys")
+        return {}
+    entries = {int(entry['index']) - 1: entry for entry in log.get('details') or [] if entry.get('index')}
+    if not entries:
+        log_print(f"⚠️ {path} has no per-row details; matching every row on keys")
+    return entries
+
+
+def row_hashes(frame: pd.DataFrame) -> pd.Series:
+    """Canonical per-row hash of the compared fields (blank fields hash alike)."""
+    return pd.util.hash_pandas_object(frame[COMPARED_FIELDS].fillna('\x00'), index=False)
+
+
+def locate(source: pd.DataFrame, server: pd.DataFrame,
+           entries: Dict[int, Dict[str, Any]]) -> pd.DataFrame:
+    """Server position and how it was found for every source row."""
+    positions = pd.Series(server.index, index=pd.to_numeric(server['id']).astype('Int64').to_numpy())
+    logged = pd.Series({row: entry.get('studentId') for row, entry in entries.items()
+                        if entry.get('success') and entry.get('studentId')}, dtype='Int64')
+    found = pd.DataFrame({'position': pd.Series(pd.NA, index=source.index, dtype='Int64'),
+                          'via': pd.Series(pd.NA, index=source.index, dtype='string')})
+    by_id = logged[logged.isin(positions.index)]
+    found.loc[by_id.index, 'position'] = positions[by_id.to_numpy()].to_numpy()
+    found.loc[by_id.index, 'via'] = 'studentId'
+
+    # Rows without a logged ID are looked up among the server students nobody claimed
+    open_rows = source.index[~source.index.isin(logged.index)]
+    free = server.index[~server.index.isin(found['position'].dropna())]
+    source_keys, server_keys = match_keys(source.loc[open_rows]), match_keys(server.loc[free])
+    matched, _ = match_students(source_keys, server_keys)
+    hits = matched.dropna()
+    found.loc[hits.index, 'position'] = hits.to_numpy()
+    found.loc[hits.index, 'via'] = 'keys'
+    return found
+
+
+def verify(payloads: List[Dict[str, Any]], server_students: List[Dict[str, Any]],
+           entries: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    source = student_frame(payloads, server=False)
+    server = student_frame(server_students, server=True)
+    found = locate(source, server, entries)
+    for frame in (source, server):
+        for field in FOLDED_FIELDS:
+            frame[field] = value_key(fold_series(frame[field]))
+
+    present = found['position'].dropna()
+    expected = source.loc[present.index, COMPARED_FIELDS]
+    stored = server.loc[present.to_numpy(), COMPARED_FIELDS].set_axis(present.index)
+    stored = stored.where(expected.notna())
+    differs = row_hashes(expected) != row_hashes(stored)
+
+    report: Dict[str, Any] = {'verified': int((~differs).sum()), 'mismatched': [], 'missing': [],
+                              'notCreated': 0, 'createdDespiteError': []}
+    for row in differs.index[differs.to_numpy()]:
+        fields = {field: {'expected': expected.at[row, field], 'stored': stored.at[row, field]}
+                  for field in COMPARED_FIELDS
+                  if pd.notna(expected.at[row, field]) and expected.at[row, field] != stored.at[row, field]}
+        report['mismatched'].append({'row': int(row) + 1, 'studentId': int(server.at[int(present[row]), 'id']),
+                                     'sqlId': entries.get(row, {}).get('sqlId'), 'fields': fields})
+
+    for row in source.index:
+        entry = entries.get(row, {})
+        if pd.notna(found.at[row, 'position']):
+            if entry and not entry.get('success'):
+                report['createdDespiteError'].append({'row': int(row) + 1, 'sqlId': entry.get('sqlId'),
+                                                      'studentId': int(server.at[int(found.at[row, 'position']), 'id'])})
+        elif entry.get('success') or not entries:
+            # The log says it was created (or there is no log): it should be there
+            report['missing'].append({'row': int(row) + 1, 'sqlId': entry.get('sqlId'),
+                                      'studentId': entry.get('studentId')})
+        else:
+            report['notCreated'] += 1
+    report['foundByKeys'] = int((found['via'] == 'keys').sum())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check imported students against the source, field by field.')
+    parser.add_argument('--file', default=SQL_FILE_PATH, help='students.sql dump or cleaned workbook (.xlsx)')
+    parser.add_argument('--log', default=LOG_FILE, help='Run log of the import (details with studentId per row)')
+    parser.add_argument('--remap', help="import_dump.py's ID remap file, for the class IDs it assigned")
+    parser.add_argument('--report-file', default=VERIFY_REPORT_FILE, help='Where to write the report (JSON)')
+    args = parser.parse_args()
+
+    if not AUTH_TOKEN:
+        log_print('❌ Set AUTH_TOKEN: listing students needs an admin token')
+        return
+
+    log_print(f"Reading source: {args.file}")
+    if args.file.lower().endswith(('.xlsx', '.xls')):
+        payloads, _ = source_from_excel(args.file)
+    else:
+        class_ids = None
+        if args.remap:
+            with open(args.remap, 'r', encoding='utf-8') as f:
+                class_ids = json.load(f).get('classes') or None
+        payloads, _ = source_from_sql(args.file, class_ids)
+    entries = read_run_log(args.log)
+    log_print(f"{len(payloads)} source students; run log has {len(entries)} rows")
+
+    server_students = fetch_snapshot(make_session())
+    log_print(f"📥 Snapshot: {len(server_students)} students on the server")
+    report = verify(payloads, server_students, entries)
+
+    for item in report['mismatched'][:SHOW_MISMATCHES]:
+        diffs = '; '.join(f"{field}: {value['expected']!r} != {value['stored']!r}" for field, value in item['fields'].items())
+        log_print(f"❌ Row {item['row']} (student {item['studentId']}): {diffs}")
+    if len(report['mismatched']) > SHOW_MISMATCHES:
+        log_print(f"… {len(report['mismatched']) - SHOW_MISMATCHES} more mismatches in the report")
+    for item in report['createdDespiteError']:
+        log_print(f"⚠️ Row {item['row']} failed in the log but is on the server as student {item['studentId']}")
+
+    with open(args.report_file, 'w', encoding='utf-8') as f:
+        json.dump({'checkedAt': dt.datetime.now(dt.timezone.utc).isoformat(), 'source': args.file,
+                   'log': args.log, 'serverStudents': len(server_students), **report},
+                  f, indent=2, ensure_ascii=False, default=str)
+    log_print(f"Verified: {report['verified']}, Mismatched: {len(report['mismatched'])}, "
+              f"Missing: {len(report['missing'])}, Not created: {report['notCreated']}, "
+              f"Created despite error: {len(report['createdDespiteError'])}. Report -> {args.report_file}")
+    if report['mismatched'] or report['missing']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
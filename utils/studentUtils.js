@@ -483,6 +483,11 @@ export const buildStudentSearchQuery = (filters) => {
     query.sectionId = filters.sectionId;
   }
 
+  // Filter by parent (siblings of a family)
+  if (filters.parentId) {
+    query.parentId = BigInt(filters.parentId);
+  }
+
   // Filter by branch
   if (filters.branchId) {
     query.branchId = filters.branchId;